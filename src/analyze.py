@@ -0,0 +1,189 @@
+import sys
+import os
+import math
+import argparse
+import multiprocessing
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import aubio
+
+from pitch_tracker import PitchTracker, HopAnalyzer
+from ring_buffer import RESULT_DTYPE
+from median_filter import median_filter
+from note_segmenter import NoteEvent, segment_notes
+from settings import read_settings, CONFIG_PATH
+
+AUDIO_EXTENSIONS = (".wav", ".flac")
+
+CHUNK_LENGTH = 60.0     # in seconds
+
+
+def find_audio_files(paths):
+    result = []
+
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, filenames in os.walk(path):
+                for filename in sorted(filenames):
+                    if filename.lower().endswith(AUDIO_EXTENSIONS):
+                        result.append(os.path.join(root, filename))
+        else:
+            result.append(path)
+
+    return result
+
+
+def get_num_hops(path, sample_rate, hop_size):
+    source = aubio.source(path, samplerate=sample_rate, hop_size=hop_size)
+    num_hops = source.duration // hop_size
+    source.close()
+
+    return num_hops
+
+
+def get_warmup_hops(hop_size, buffer_size):
+    # Number of hops after which the detectors no longer depend on where they were started.
+    # Chunks are started this many hops early and the extra results are thrown away.
+    return 2 * int(math.ceil(buffer_size / hop_size))
+
+
+def analyze_chunk(path,
+                  first_hop,
+                  num_hops,
+                  sample_rate,
+                  hop_size,
+                  buffer_size,
+                  pitch_detection_method,
+                  onset_detection_method,
+                  silence_threshold):
+
+    analyze_hop = HopAnalyzer(sample_rate,
+                              hop_size,
+                              buffer_size,
+                              pitch_detection_method,
+                              onset_detection_method,
+                              silence_threshold)
+
+    start_hop = max(0, first_hop - get_warmup_hops(hop_size, buffer_size))
+
+    source = aubio.source(path, samplerate=sample_rate, hop_size=hop_size)
+    source.seek(start_hop * hop_size)
+
+    # The whole chunk is read first and analyzed in one batch (see HopAnalyzer.analyze_batch)
+    hops = np.zeros((first_hop + num_hops - start_hop, hop_size), dtype=np.float32)
+    num_read = 0
+    while num_read < len(hops):
+        samples, read = source()
+        if read < hop_size:
+            break
+
+        hops[num_read] = samples
+        num_read += 1
+
+    source.close()
+
+    results = analyze_hop.analyze_batch(hops[:num_read])[first_hop - start_hop:]
+
+    # Like a live run, every hop is stamped with the time its last sample arrived
+    analysis_results = np.zeros(len(results), dtype=RESULT_DTYPE)
+    for i, (pitch, volume, confidence, onset) in enumerate(results):
+        timestamp = (first_hop + i + 1) * hop_size / sample_rate
+        analysis_results[i] = (timestamp, pitch, volume, confidence, onset, timestamp)
+
+    return analysis_results
+
+
+def analyze_files(paths, pitch_tracker, executor, chunk_length=CHUNK_LENGTH):
+    chunk_hops = max(1, int(math.ceil(chunk_length * pitch_tracker.sample_rate / pitch_tracker.hop_size)))
+
+    # Split every file into chunks, so that a single long file can use all workers as well
+    futures = {}
+    for path in paths:
+        num_hops = get_num_hops(path, pitch_tracker.sample_rate, pitch_tracker.hop_size)
+
+        futures[path] = [executor.submit(analyze_chunk,
+                                         path,
+                                         first_hop,
+                                         min(chunk_hops, num_hops - first_hop),
+                                         pitch_tracker.sample_rate,
+                                         pitch_tracker.hop_size,
+                                         pitch_tracker.buffer_size,
+                                         pitch_tracker.pitch_detection_method,
+                                         pitch_tracker.onset_detection_method,
+                                         pitch_tracker.silence_threshold) for first_hop in range(0, num_hops, chunk_hops)]
+
+    for path in paths:
+        chunks = [future.result() for future in futures[path]]
+        if chunks:
+            analysis_results = np.concatenate(chunks)
+        else:
+            analysis_results = np.zeros(0, dtype=RESULT_DTYPE)
+
+        # Same filter a live run applies in get_analysis_results
+        analysis_results["pitch"] = median_filter(analysis_results["pitch"], pitch_tracker.filter_window_len)
+
+        yield path, analysis_results
+
+
+def save_analysis_results(filename, analysis_results):
+    np.savetxt(filename,
+               np.column_stack([analysis_results[name] for name in analysis_results.dtype.names]),
+               fmt="%.6f",
+               delimiter=",",
+               header=",".join(analysis_results.dtype.names),
+               comments="")
+
+
+def save_note_events(filename, events):
+    np.savetxt(filename,
+               np.array(events, dtype=np.float64).reshape(-1, len(NoteEvent._fields)),
+               fmt="%.6f",
+               delimiter=",",
+               header=",".join(NoteEvent._fields),
+               comments="")
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Offline pitch analysis of audio recordings")
+    parser.add_argument("paths", nargs="+", help="Audio files or directories containing WAV/FLAC files")
+    parser.add_argument("--output-dir", default=".", help="Directory the CSV files are written to")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes (default: number of cores)")
+    parser.add_argument("--chunk-length", type=float, default=CHUNK_LENGTH, help="Length of the chunks files are split into (in seconds)")
+    parser.add_argument("--config", default=CONFIG_PATH, help="Configuration file")
+    args = parser.parse_args(argv)
+
+    settings = read_settings(args.config)
+
+    # Only used for deriving hop size and filter length the same way a live run does
+    pitch_tracker = PitchTracker(device_index=None,
+                                 filter_window=settings["filter_window"],
+                                 silence_threshold=settings["silence_threshold"],
+                                 onset_detection_method=settings["onset_detection_method"],
+                                 pitch_detection_method=settings["pitch_detection_method"])
+
+    paths = find_audio_files(args.paths)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        for path, analysis_results in analyze_files(paths, pitch_tracker, executor, args.chunk_length):
+            name = os.path.join(args.output_dir, os.path.splitext(os.path.basename(path))[0])
+            save_analysis_results(name + ".csv", analysis_results)
+
+            # Same segmentation a live run does in PitchTracker.update
+            events = segment_notes(analysis_results, pitch_tracker.hop_size, pitch_tracker.sample_rate, settings["standard_pitch"])
+            save_note_events(name + ".notes.csv", events)
+
+            print("{path}: {num_hops} hops, {num_events} notes -> {filename}".format(path=path,
+                                                                                     num_hops=len(analysis_results),
+                                                                                     num_events=len(events),
+                                                                                     filename=name + ".csv"))
+
+
+if __name__ == "__main__":
+    # Pyinstaller fix
+    multiprocessing.freeze_support()
+
+    main(sys.argv[1:])
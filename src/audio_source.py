@@ -0,0 +1,449 @@
+import time
+import threading
+import collections
+
+import numpy as np
+
+import signals
+
+# Counters shared with the main process (see PitchTracker.stats)
+STAT_NAMES = ("input_overflows",     # Input overflows reported by PortAudio
+              "input_underflows",    # Input underflows reported by PortAudio
+              "buffer_overruns",     # Times the analysis fell behind by more than the capture buffer
+              "dropped_frames",      # Frames lost to any of the above
+              "gap_hops")            # Hops marked as gaps in the results
+INPUT_OVERFLOWS, INPUT_UNDERFLOWS, BUFFER_OVERRUNS, DROPPED_FRAMES, GAP_HOPS = range(len(STAT_NAMES))
+
+# Device index that selects a SignalSource instead of an audio device
+SYNTHETIC_INPUT = -1
+
+
+# pyaudio (and aubio) are only imported by the processes that open a source, which
+# keeps them out of the startup of the UI process
+pyaudio = None
+_pyaudio = None
+
+
+def get_pyaudio():
+    # One PyAudio instance per process, created when the first device is opened
+    global _pyaudio, pyaudio
+
+    if _pyaudio is None:
+        import pyaudio
+        _pyaudio = pyaudio.PyAudio()
+
+    return _pyaudio
+
+
+def terminate_pyaudio():
+    global _pyaudio
+
+    if _pyaudio is not None:
+        _pyaudio.terminate()
+        _pyaudio = None
+
+
+class AudioSource():
+    """
+    Interface of the inputs tracking_process reads from. A source is created
+    in the main process and passed to the tracking process, so everything
+    that cannot be pickled (streams, threads, files) is only set up by
+    open(). Once open, read_hops() returns the sample clock frame of the first
+    hop and a (num_hops, hop_size) float32 array of hops, or a
+    (num_hops, hop_size, channels) array for sources with several channels.
+    `start_time` is the wall clock time of frame 0.
+    """
+
+    channels = 1
+
+    def open(self, sample_rate, hop_size, stats):
+        self.sample_rate = sample_rate
+        self.hop_size = hop_size
+        self.stats = stats
+        self.start_time = None
+
+
+    def read_hops(self, timeout=None):
+        raise NotImplementedError()
+
+
+    def as_hops(self, frames, num_hops):
+        # Interleaved frames as hops, every channel is a strided view of `frames`
+        hops = frames.reshape(num_hops, self.hop_size, self.channels)
+
+        return hops[:, :, 0] if self.channels == 1 else hops
+
+
+    def close(self):
+        pass
+
+
+    @property
+    def exhausted(self):
+        # True once a finite source has nothing left to read
+        return False
+
+
+class BlockingMicrophone(AudioSource):
+    """
+    Reads one hop at a time with a blocking PyAudio read.
+    """
+
+    def __init__(self, device_index, channels=1):
+        self.device_index = device_index
+        self.channels = channels
+        self.stream = None
+
+
+    def open(self, sample_rate, hop_size, stats):
+        super().open(sample_rate, hop_size, stats)
+        self.frame_clock = 0
+
+        pa = get_pyaudio()
+        self.stream = pa.open(format=pyaudio.paFloat32,
+                              channels=self.channels,
+                              rate=self.sample_rate,
+                              input=True,
+                              frames_per_buffer=self.hop_size,
+                              input_device_index=self.device_index)
+        self.stream_start_time = self.stream.get_time()
+        self.start_time = time.time() - self.stream.get_input_latency()
+
+
+    def read_hops(self, timeout=None):
+        # Returns the clock frame of the first hop and the hops. Only a timeout of 0
+        # is supported, it returns no hops instead of waiting for the device.
+        if timeout == 0 and self.stream.get_read_available() < self.hop_size:
+            return self.frame_clock, self.as_hops(np.zeros(0, dtype=np.float32), 0)
+
+        try:
+            data = self.stream.read(self.hop_size, exception_on_overflow=True)
+        except IOError:
+            # The data of an overflowing read is lost, estimate how much from the stream clock.
+            # Frames still waiting in PortAudio's buffer were not lost, they are read next.
+            self.stats[INPUT_OVERFLOWS] += 1
+
+            elapsed_frames = int(round((self.stream.get_time() - self.stream_start_time) * self.sample_rate))
+            missing = max(self.hop_size, elapsed_frames - self.stream.get_read_available() - self.frame_clock)
+
+            self.stats[DROPPED_FRAMES] += missing
+            self.frame_clock += missing
+
+            return self.frame_clock, self.as_hops(np.zeros(0, dtype=np.float32), 0)
+
+        frame = self.frame_clock
+        self.frame_clock += self.hop_size
+
+        return frame, self.as_hops(np.frombuffer(data, dtype=np.float32), 1)
+
+
+    def close(self):
+        self.stream.close()
+        self.stream = None
+
+
+class CallbackMicrophone(AudioSource):
+    """
+    Captures audio in PyAudio's callback thread into a preallocated buffer.
+    read_hops() returns all complete hops captured since the previous call at
+    once, so the analysis can catch up after a hiccup instead of losing input.
+
+    Like ResultRingBuffer, every frame is stored twice (at i and i + capacity),
+    so any range of up to `capacity` frames is one contiguous slice and the
+    hops can be returned as views without copying. Frames of several channels
+    stay interleaved, the channels of the returned hops are strided views.
+
+    Frames lost on the way (input overflows, or the reader falling behind by
+    more than MAX_BACKLOG of the buffer) advance the frame clock without being
+    stored, so the reader can tell where the gaps are.
+    """
+
+    BUFFER_LENGTH = 2.0     # in seconds
+    MAX_BACKLOG = 0.5       # Fraction of the buffer a read returns at most, the rest is headroom for the callback
+    REANCHOR_RATE = 0.05    # Fraction of the deviation from the ADC clock absorbed per callback
+
+    def __init__(self, device_index, channels=1):
+        self.device_index = device_index
+        self.channels = channels
+        self.stream = None
+
+
+    def open(self, sample_rate, hop_size, stats):
+        super().open(sample_rate, hop_size, stats)
+
+        num_hops = int(np.ceil(CallbackMicrophone.BUFFER_LENGTH * sample_rate / hop_size))
+        self.capacity = num_hops * hop_size
+        self.buffer = np.zeros((2 * self.capacity, self.channels), dtype=np.float32)
+
+        self.frames_written = 0
+        self.frames_read = 0
+        self.data_available = threading.Condition()
+
+        # (buffer frame, number of missing frames before it)
+        self.gaps = collections.deque()
+        self.missing_frames = 0
+
+        # Difference between the frame clock and frames_read
+        self.clock_offset = 0
+
+        # The ADC time of frame `adc_anchor_frame`, both set by the first callback that reports
+        # one. The anchor follows slow drift between the ADC timebase and the sample clock.
+        self.adc_anchor_time = None
+        self.adc_anchor_frame = 0.0
+
+        pa = get_pyaudio()
+        self.stream = pa.open(format=pyaudio.paFloat32,
+                              channels=self.channels,
+                              rate=self.sample_rate,
+                              input=True,
+                              frames_per_buffer=self.hop_size,
+                              input_device_index=self.device_index,
+                              stream_callback=self.callback)
+
+
+    def callback(self, in_data, frame_count, time_info, status):
+        if status & pyaudio.paInputOverflow:
+            self.stats[INPUT_OVERFLOWS] += 1
+        if status & pyaudio.paInputUnderflow:
+            self.stats[INPUT_UNDERFLOWS] += 1
+
+        missing = 0
+        adc_time = time_info.get("input_buffer_adc_time", 0.0)
+
+        if self.start_time is None:
+            # The first callback may come before open() returned the stream
+            latency = self.stream.get_input_latency() if self.stream is not None else 0.0
+            self.start_time = time.time() - latency - frame_count / self.sample_rate
+
+        # Some host APIs report 0 until the stream is running
+        if adc_time > 0.0:
+            received_frames = self.frames_written + self.missing_frames
+
+            if self.adc_anchor_time is None:
+                self.adc_anchor_time = adc_time
+                self.adc_anchor_frame = float(received_frames)
+            else:
+                # Compare the sample clock of the device with the number of frames received.
+                # Gaps come in whole buffers, smaller deviations are jitter or drift.
+                deviation = self.adc_anchor_frame + (adc_time - self.adc_anchor_time) * self.sample_rate - received_frames
+                if deviation >= self.hop_size // 2:
+                    missing = int(round(deviation))
+                else:
+                    self.adc_anchor_frame -= CallbackMicrophone.REANCHOR_RATE * deviation
+
+        self.write(np.frombuffer(in_data, dtype=np.float32).reshape(-1, self.channels), missing)
+
+        return (None, pyaudio.paContinue)
+
+
+    def write(self, samples, missing=0):
+        # `samples` has one row per frame
+        samples = samples[-self.capacity:]
+        start = self.frames_written % self.capacity
+
+        # Both copies may wrap around the end of their half
+        first = min(len(samples), 2 * self.capacity - start - self.capacity)
+        self.buffer[start:start + len(samples)] = samples
+        self.buffer[start + self.capacity:start + self.capacity + first] = samples[:first]
+        self.buffer[:len(samples) - first] = samples[first:]
+
+        with self.data_available:
+            if missing > 0:
+                self.gaps.append((self.frames_written, missing))
+                self.missing_frames += missing
+                self.stats[DROPPED_FRAMES] += missing
+
+            self.frames_written += len(samples)
+            self.data_available.notify()
+
+
+    def read_hops(self, timeout=None):
+        # Returns the clock frame of the first hop and the hops. Hops returned by
+        # one call are always contiguous on the clock.
+        with self.data_available:
+            self.data_available.wait_for(lambda: self.frames_written - self.frames_read >= self.hop_size, timeout)
+            frames_written = self.frames_written
+
+            # The hops are views into the buffer, so they must not be overwritten while they are
+            # analyzed. Skip the oldest whole hops beyond the backlog, the clock moves on with them.
+            max_backlog = int(CallbackMicrophone.MAX_BACKLOG * self.capacity) // self.hop_size * self.hop_size
+            if frames_written - self.frames_read > max_backlog:
+                overrun = -(-(frames_written - max_backlog - self.frames_read) // self.hop_size) * self.hop_size
+                self.frames_read += overrun
+                self.stats[BUFFER_OVERRUNS] += 1
+                self.stats[DROPPED_FRAMES] += overrun
+
+            # Gaps up to the next hop shift the clock, a later one ends the batch there
+            end = frames_written
+            while self.gaps:
+                position, missing = self.gaps[0]
+                if position - self.frames_read < self.hop_size:
+                    self.gaps.popleft()
+                    self.clock_offset += missing
+                else:
+                    end = position
+                    break
+
+        num_hops = (end - self.frames_read) // self.hop_size
+        start = self.frames_read % self.capacity
+
+        frame = self.frames_read + self.clock_offset
+        hops = self.as_hops(self.buffer[start:start + num_hops * self.hop_size], num_hops)
+        self.frames_read += num_hops * self.hop_size
+
+        return frame, hops
+
+
+    def close(self):
+        self.stream.stop_stream()
+        self.stream.close()
+        self.stream = None
+
+
+class GeneratedSource(AudioSource):
+    """
+    Base class of sources that produce samples on demand. Paced sources make
+    a hop available when the wall clock passes its last sample, like a device
+    without input latency would. Unpaced ones return up to MAX_UNPACED_HOPS
+    hops per read, as fast as they are consumed.
+    """
+
+    MAX_UNPACED_HOPS = 64
+
+    def __init__(self, paced=True):
+        self.paced = paced
+        self.finished = False
+
+
+    def open(self, sample_rate, hop_size, stats):
+        super().open(sample_rate, hop_size, stats)
+        self.frame_clock = 0
+        self.finished = False
+        self.start_time = time.time()
+
+
+    def read_samples(self, num_samples):
+        # Returns up to `num_samples` samples, fewer only at the end of the source
+        raise NotImplementedError()
+
+
+    @property
+    def exhausted(self):
+        return self.finished
+
+
+    def read_hops(self, timeout=None):
+        # Returns the clock frame of the first hop and the hops
+        if self.paced:
+            due_frame = int((time.time() - self.start_time) * self.sample_rate)
+            if due_frame < self.frame_clock + self.hop_size:
+                wait = (self.frame_clock + self.hop_size - due_frame) / self.sample_rate
+                time.sleep(wait if timeout is None else min(wait, timeout))
+                due_frame = int((time.time() - self.start_time) * self.sample_rate)
+
+            num_hops = max(0, (due_frame - self.frame_clock) // self.hop_size)
+        else:
+            num_hops = GeneratedSource.MAX_UNPACED_HOPS
+
+        samples = self.read_samples(num_hops * self.hop_size)
+        if len(samples) < num_hops * self.hop_size:
+            self.finished = True
+
+        num_hops = len(samples) // self.hop_size
+        hops = samples[:num_hops * self.hop_size].reshape(num_hops, self.hop_size)
+
+        frame = self.frame_clock
+        self.frame_clock += num_hops * self.hop_size
+
+        return frame, hops
+
+
+class SignalSource(GeneratedSource):
+    """
+    Deterministic test signal from the generators in signals.py, looped
+    unless `loop` is False.
+    """
+
+    def __init__(self, signal="melody", duration=4.0, loop=True, paced=True):
+        super().__init__(paced)
+        self.signal = signal
+        self.duration = duration
+        self.loop = loop
+
+
+    def open(self, sample_rate, hop_size, stats):
+        super().open(sample_rate, hop_size, stats)
+        self.samples, _ = signals.SIGNALS[self.signal](self.duration, sample_rate)
+        self.position = 0
+
+
+    def read_samples(self, num_samples):
+        if self.loop:
+            positions = (self.position + np.arange(num_samples)) % len(self.samples)
+            self.position = (self.position + num_samples) % len(self.samples)
+
+            return self.samples[positions]
+
+        samples = self.samples[self.position:self.position + num_samples]
+        self.position += len(samples)
+
+        return samples
+
+
+class FileSource(GeneratedSource):
+    """
+    Plays an audio file (WAV, or anything else aubio can read), resampled to
+    the sample rate of the tracker.
+    """
+
+    def __init__(self, path, paced=True, loop=False):
+        super().__init__(paced)
+        self.path = path
+        self.loop = loop
+        self.source = None
+
+
+    def open(self, sample_rate, hop_size, stats):
+        super().open(sample_rate, hop_size, stats)
+
+        import aubio
+        self.source = aubio.source(self.path, samplerate=sample_rate, hop_size=hop_size)
+
+
+    def read_samples(self, num_samples):
+        blocks = []
+        remaining = num_samples
+        rewound = False
+
+        while remaining > 0:
+            samples, read = self.source()
+            # aubio reuses the buffer it returns
+            blocks.append(samples[:min(read, remaining)].copy())
+            remaining -= len(blocks[-1])
+
+            if read < self.hop_size:
+                # An empty file ends even when looping
+                if not self.loop or (rewound and read == 0):
+                    break
+
+                self.source.seek(0)
+                rewound = True
+            else:
+                rewound = False
+
+        return np.concatenate(blocks) if blocks else np.zeros(0, dtype=np.float32)
+
+
+    def close(self):
+        self.source.close()
+        self.source = None
+
+
+def create_microphone(device_index, callback_capture=True, channels=1):
+    if device_index == SYNTHETIC_INPUT:
+        return SignalSource()
+
+    if callback_capture:
+        return CallbackMicrophone(device_index, channels)
+
+    return BlockingMicrophone(device_index, channels)
@@ -0,0 +1,335 @@
+import sys
+import os
+import time
+import json
+import argparse
+import platform
+import subprocess
+
+import numpy as np
+
+from pitch_tracker import PitchTracker, HopAnalyzer
+from ring_buffer import ResultRingBuffer
+from median_filter import StreamingMedianFilter
+import signals
+from profiling import latency_percentiles
+from session_recording import SessionReader
+from audio_source import SignalSource
+
+PITCH_DETECTION_METHODS = ["default", "yin", "yinfft", "yinfast", "mcomb", "fcomb", "schmitt", "specacf", "numpy_yin"]
+BUFFER_SIZES = [2048, 4096]
+HOP_SIZES = [256, 512, 675]
+BATCH_SIZES = [1, 64]       # Hops per HopAnalyzer call, more than one is what offline analysis and catching up do
+
+SAMPLE_RATE = 44100
+SIGNAL_DURATION = 10.0      # in seconds, per signal
+SILENCE_THRESHOLD = -60.0
+
+GROSS_ERROR = 50.0          # in cents
+
+
+def pitch_error(pitches, ground_truth):
+    voiced = ground_truth > 0.0
+    detected = pitches > 0.0
+    both = voiced & detected
+
+    result = {"voiced_hops": int(np.count_nonzero(voiced)),
+              "voiced_recall": float(np.count_nonzero(both) / max(1, np.count_nonzero(voiced))),
+              "unvoiced_false_alarms": float(np.count_nonzero(detected & ~voiced) / max(1, np.count_nonzero(~voiced)))}
+
+    if np.any(both):
+        cents = np.abs(1200.0 * np.log2(pitches[both] / ground_truth[both]))
+        result["median_error_cents"] = float(np.median(cents))
+        result["p95_error_cents"] = float(np.percentile(cents, 95))
+        result["gross_error_rate"] = float(np.count_nonzero(cents > GROSS_ERROR) / len(cents))
+
+    return result
+
+
+def run_detection(samples, sample_rate, hop_size, buffer_size, method, silence_threshold, batch_size=1):
+    # Durations are per hop, for batches the duration of the batch divided by its size
+    analyze_hop = HopAnalyzer(sample_rate, hop_size, buffer_size, method, None, silence_threshold)
+
+    num_hops = len(samples) // hop_size
+    pitches = np.zeros(num_hops)
+    durations = np.zeros(num_hops)
+
+    if batch_size > 1:
+        hops = samples[:num_hops * hop_size].reshape(num_hops, hop_size).astype(np.float32)
+        for i in range(0, num_hops, batch_size):
+            start = time.perf_counter()
+            results = analyze_hop.analyze_batch(hops[i:i + batch_size])
+            durations[i:i + batch_size] = (time.perf_counter() - start) / len(results)
+            pitches[i:i + batch_size] = [pitch for pitch, _, _, _ in results]
+
+        return pitches, durations
+
+    for i in range(num_hops):
+        hop = samples[i * hop_size:(i + 1) * hop_size]
+
+        start = time.perf_counter()
+        pitches[i], _, _, _ = analyze_hop(hop)
+        durations[i] = time.perf_counter() - start
+
+    return pitches, durations
+
+
+def benchmark_detection(methods, buffer_sizes, hop_sizes, duration, sample_rate, silence_threshold, batch_sizes=(1,)):
+    results = []
+
+    test_signals = {name: generate(duration, sample_rate) for name, generate in signals.SIGNALS.items()}
+
+    for method in methods:
+        for buffer_size in buffer_sizes:
+            for hop_size in hop_sizes:
+                if hop_size > buffer_size:
+                    continue
+
+                for batch_size in batch_sizes:
+                    for signal_name, (samples, frequencies) in test_signals.items():
+                        pitches, durations = run_detection(samples, sample_rate, hop_size, buffer_size, method, silence_threshold, batch_size)
+                        ground_truth = signals.hop_ground_truth(frequencies, hop_size, buffer_size)
+
+                        result = {"method": method,
+                                  "buffer_size": buffer_size,
+                                  "hop_size": hop_size,
+                                  "batch_size": batch_size,
+                                  "signal": signal_name,
+                                  "hops": len(pitches),
+                                  "hops_per_second": float(len(durations) / np.sum(durations)),
+                                  "realtime_factor": float((len(durations) * hop_size / sample_rate) / np.sum(durations)),
+                                  "latency_ms": latency_percentiles(durations),
+                                  "accuracy": pitch_error(pitches, ground_truth)}
+                        results.append(result)
+
+                        print("{method:>9} buffer={buffer_size:<5} hop={hop_size:<4} batch={batch_size:<3} {signal:<13} {hops_per_second:>10.0f} hops/s".format(**result))
+
+    return results
+
+
+def benchmark_pipeline(duration, sample_rate, silence_threshold):
+    # Throughput of the complete tracking process, fed as fast as it can analyze
+    pitch_tracker = PitchTracker(sample_rate=sample_rate,
+                                 silence_threshold=silence_threshold,
+                                 source=SignalSource("sine_sweep", duration=10.0, paced=False))
+
+    pitch_tracker.start_tracking()
+    time.sleep(duration)
+    stats = pitch_tracker.stats()
+    profile = pitch_tracker.profile()
+    pitch_tracker.stop_tracking()
+
+    return {"duration": duration,
+            "hops_per_second": stats["hops"] / duration,
+            "realtime_factor": stats["hops"] * pitch_tracker.hop_size / sample_rate / duration,
+            "stats": stats,
+            "stages_ms": profile}
+
+
+def create_offline_tracker(analysis_window, filter_window, sample_rate, silence_threshold):
+    # A tracker whose result buffer is filled by the benchmark instead of a tracking process
+    pitch_tracker = PitchTracker(device_index=None,
+                                 sample_rate=sample_rate,
+                                 analysis_window=analysis_window,
+                                 filter_window=filter_window,
+                                 silence_threshold=silence_threshold)
+
+    pitch_tracker.analysis_results = ResultRingBuffer(pitch_tracker.analysis_window_len)
+    pitch_tracker.median_filter = StreamingMedianFilter(pitch_tracker.filter_window_len, pitch_tracker.analysis_window_len)
+
+    return pitch_tracker
+
+
+def generate_analysis_results(pitch_tracker, duration):
+    samples = np.concatenate([signals.vibrato(duration / 2, pitch_tracker.sample_rate)[0],
+                              signals.sine_sweep(duration / 2, pitch_tracker.sample_rate)[0]])
+
+    analyze_hop = HopAnalyzer(pitch_tracker.sample_rate,
+                              pitch_tracker.hop_size,
+                              pitch_tracker.buffer_size,
+                              pitch_tracker.pitch_detection_method,
+                              pitch_tracker.onset_detection_method,
+                              pitch_tracker.silence_threshold)
+
+    hop_size = pitch_tracker.hop_size
+    num_hops = len(samples) // hop_size
+
+    timestamps = [(i + 1) * hop_size / pitch_tracker.sample_rate for i in range(num_hops)]
+
+    return [(timestamps[i], *analyze_hop(samples[i * hop_size:(i + 1) * hop_size]), timestamps[i]) for i in range(num_hops)]
+
+
+def benchmark_filter(pitch_tracker, analysis_results, num_frames, hops_per_frame):
+    ring = pitch_tracker.analysis_results
+
+    # Start with a full window
+    for record in analysis_results[:pitch_tracker.analysis_window_len]:
+        ring.append(record)
+
+    durations = []
+    position = pitch_tracker.analysis_window_len
+    for _ in range(num_frames):
+        for _ in range(hops_per_frame):
+            ring.append(analysis_results[position % len(analysis_results)])
+            position += 1
+
+        start = time.perf_counter()
+        pitch_tracker.snapshot()
+        durations.append(time.perf_counter() - start)
+
+    return {"analysis_window_len": pitch_tracker.analysis_window_len,
+            "filter_window_len": pitch_tracker.filter_window_len,
+            "hops_per_frame": hops_per_frame,
+            "frames": num_frames,
+            "latency_ms": latency_percentiles(durations)}
+
+
+def benchmark_render(pitch_tracker, analysis_results, num_frames, hops_per_frame, resolution, standard_pitch=440.0):
+    # Render into an offscreen surface without opening a window
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+    import pygame
+    from ui import PitchTrackerGraph
+
+    pygame.init()
+
+    screen = pygame.Surface(resolution)
+    graph = PitchTrackerGraph(screen, (0, 0, *resolution), standard_pitch)
+
+    ring = pitch_tracker.analysis_results
+
+    durations = []
+    position = ring.sequence
+    frame_time = 1.0 / 60.0
+    for _ in range(num_frames):
+        for _ in range(hops_per_frame):
+            ring.append(analysis_results[position % len(analysis_results)])
+            position += 1
+
+        start = time.perf_counter()
+        graph.run(frame_time)
+        graph.render(pitch_tracker)
+        durations.append(time.perf_counter() - start)
+
+    pygame.quit()
+
+    return {"resolution": list(resolution),
+            "hops_per_frame": hops_per_frame,
+            "frames": num_frames,
+            "latency_ms": latency_percentiles(durations),
+            "stages_ms": graph.profiler.summary(),
+            "frames_per_second": float(len(durations) / np.sum(durations))}
+
+
+def benchmark_startup(num_runs, command=None, timeout=60.0):
+    # Launches the UI on the synthetic input until it has drawn its first pitch.
+    # `command` is the app to launch, e.g. a bundled executable, main.py by default
+    if command is None:
+        command = [sys.executable, "main.py"]
+
+    timings = {"time_to_first_pixel": [], "time_to_first_pitch": []}
+    for _ in range(num_runs):
+        env = dict(os.environ)
+        env.setdefault("SDL_VIDEODRIVER", "dummy")
+        env["PITCH_TRACKER_LAUNCH_TIME"] = repr(time.time())
+
+        output = subprocess.run(command + ["--device", "-1", "--exit-after-first-pitch"], 
+                                env=env, 
+                                stdout=subprocess.PIPE, 
+                                universal_newlines=True, 
+                                timeout=timeout).stdout
+
+        for line in output.splitlines():
+            name, _, value = line.partition(":")
+            if name in timings:
+                timings[name].append(float(value.split()[0]))
+
+    return {"command": command,
+            "runs": num_runs,
+            **{name + "_s": {"median": float(np.median(values)), "max": float(np.max(values))} if values else None
+               for name, values in timings.items()}}
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Headless benchmark of the pitch tracking pipeline")
+    parser.add_argument("--methods", nargs="+", default=PITCH_DETECTION_METHODS)
+    parser.add_argument("--buffer-sizes", nargs="+", type=int, default=BUFFER_SIZES)
+    parser.add_argument("--hop-sizes", nargs="+", type=int, default=HOP_SIZES)
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=BATCH_SIZES, help="Hops per analyzer call")
+    parser.add_argument("--duration", type=float, default=SIGNAL_DURATION, help="Length of every test signal (in seconds)")
+    parser.add_argument("--analysis-window", type=float, default=10.0, help="Analysis window (in seconds)")
+    parser.add_argument("--filter-window", type=float, default=0.05, help="Filter window (in seconds)")
+    parser.add_argument("--frames", type=int, default=600, help="Number of frames for the filter and render benchmarks")
+    parser.add_argument("--resolution", nargs=2, type=int, default=[1024, 768])
+    parser.add_argument("--skip-render", action="store_true", help="Do not benchmark PitchTrackerGraph.render")
+    parser.add_argument("--startup-runs", type=int, default=3, help="Number of launches for the startup benchmark (0 to skip it)")
+    parser.add_argument("--startup-command", nargs="+", default=None, help="App to launch for the startup benchmark, e.g. a bundled executable")
+    parser.add_argument("--session", default=None, help="Session recording to take the results for the filter and render benchmarks from")
+    parser.add_argument("--output", default="benchmark_results.json", help="JSON file the results are written to")
+    args = parser.parse_args(argv)
+
+    results = {"timestamp": time.time(),
+               "platform": platform.platform(),
+               "python": platform.python_version(),
+               "sample_rate": SAMPLE_RATE}
+
+    print("Pitch detection")
+    print("---------------")
+    results["detection"] = benchmark_detection(args.methods,
+                                               args.buffer_sizes,
+                                               args.hop_sizes,
+                                               args.duration,
+                                               SAMPLE_RATE,
+                                               SILENCE_THRESHOLD,
+                                               args.batch_sizes)
+
+    print()
+    print("Pipeline")
+    print("--------")
+    results["pipeline"] = benchmark_pipeline(args.duration, SAMPLE_RATE, SILENCE_THRESHOLD)
+    print("tracking_process: {hops_per_second:.0f} hops/s ({realtime_factor:.1f}x real time)".format(**results["pipeline"]))
+
+    pitch_tracker = create_offline_tracker(args.analysis_window, args.filter_window, SAMPLE_RATE, SILENCE_THRESHOLD)
+    if args.session is not None:
+        # Recorded results instead of synthetic ones, detection is not run again
+        reader = SessionReader(args.session)
+        analysis_results = list(reader.results(0, len(reader)))
+    else:
+        analysis_results = generate_analysis_results(pitch_tracker, 2 * args.analysis_window)
+
+    # Roughly the number of hops arriving per frame at 60 FPS
+    hops_per_frame = max(1, int(round(SAMPLE_RATE / pitch_tracker.hop_size / 60.0)))
+
+    print()
+    print("Filter")
+    print("------")
+    results["filter"] = benchmark_filter(pitch_tracker, analysis_results, args.frames, hops_per_frame)
+    print("PitchTracker.snapshot: {p50:.3f} ms (p50), {p99:.3f} ms (p99)".format(**results["filter"]["latency_ms"]))
+
+    if not args.skip_render:
+        print()
+        print("Rendering")
+        print("---------")
+        results["render"] = benchmark_render(pitch_tracker, analysis_results, args.frames, hops_per_frame, tuple(args.resolution))
+        print("PitchTrackerGraph.render: {p50:.3f} ms (p50), {p99:.3f} ms (p99)".format(**results["render"]["latency_ms"]))
+
+    pitch_tracker.analysis_results.close()
+
+    if args.startup_runs > 0:
+        print()
+        print("Startup")
+        print("-------")
+        results["startup"] = benchmark_startup(args.startup_runs, args.startup_command)
+        for name in ("time_to_first_pixel", "time_to_first_pitch"):
+            timing = results["startup"][name + "_s"]
+            print("{}: {}".format(name, "{median:.3f} s (median), {max:.3f} s (max)".format(**timing) if timing else "not reached"))
+
+    with open(args.output, "wt") as f:
+        json.dump(results, f, indent=2)
+
+    print()
+    print("Results written to", args.output)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
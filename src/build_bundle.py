@@ -1,4 +1,5 @@
 import os
+import argparse
 import subprocess
 import shutil
 import main
@@ -11,12 +12,21 @@ README_FILE = "README.txt"
 DIRS_TO_COPY = ["resources"]
 FILES_TO_COPY = ["config.cfg", README_FILE, "LICENSE.txt"]
 
+parser = argparse.ArgumentParser(description="Builds the PitchTracker bundle")
+parser.add_argument("--onedir", action="store_true", 
+                    help="Bundle into a directory instead of a single executable. Starts faster, "
+                         "since nothing has to be extracted to a temporary directory on every launch")
+args = parser.parse_args()
+
+# With --onedir the executable lives in its own directory next to its libraries
+APP_DIR = os.path.join(DIST_DIR, "PitchTracker") if args.onedir else DIST_DIR
+
 # Remove dist directory if it exists
 if os.path.exists(DIST_DIR):
     shutil.rmtree(DIST_DIR)
 
 # Run pyinstaller
-PYINSTALLER_COMMAND = ["pyinstaller", "--onefile", "--noconsole", "--icon", "icon.ico", "--name", "PitchTracker", "main.py"]
+PYINSTALLER_COMMAND = ["pyinstaller", "--onedir" if args.onedir else "--onefile", "--noconsole", "--icon", "icon.ico", "--name", "PitchTracker", "main.py"]
 print("Runing pyinstaller using command:", " ".join(PYINSTALLER_COMMAND))
 subprocess.call(PYINSTALLER_COMMAND)
 
@@ -33,12 +43,12 @@ for d in DIRS_TO_COPY:
     name = os.path.basename(d)
     print("Copying directory '{d}'...".format(d=d))
 
-    target_dir = os.path.join(DIST_DIR, name)
+    target_dir = os.path.join(APP_DIR, name)
     shutil.copytree(d, target_dir)
 
 for f in FILES_TO_COPY:
     print("Copying file '{f}'...".format(f=f))
-    shutil.copy2(f, DIST_DIR)
+    shutil.copy2(f, APP_DIR)
 
 zip_filename = 'PitchTracker_{version}'.format(version=main.VERSION)
 shutil.make_archive(zip_filename, 'zip', DIST_DIR)
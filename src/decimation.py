@@ -0,0 +1,53 @@
+import numpy as np
+
+
+def decimate_min_max(columns, values, valid):
+    """
+    Reduces a curve to at most two points per pixel column and run of valid
+    samples: the smallest and the largest value, in their original order.
+    The first invalid sample after every run is kept as well, so that breaks
+    in the curve survive. Returns the indices of the samples to keep.
+    """
+    columns = np.asarray(columns)
+    values = np.asarray(values)
+    valid = np.asarray(valid, dtype=bool)
+
+    num_samples = len(values)
+    if num_samples == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    indices = np.flatnonzero(valid)
+
+    # Invalid samples that end a run, or that the curve starts with
+    breaks = np.flatnonzero(~valid[1:] & valid[:-1]) + 1
+    if not valid[0]:
+        breaks = np.concatenate(([0], breaks))
+
+    if len(indices) == 0:
+        return breaks
+
+    # Groups of valid samples in the same column and the same run
+    run_ids = np.cumsum(~valid)[indices]
+    group_columns = columns[indices]
+    starts = np.flatnonzero((np.diff(group_columns) != 0) | (np.diff(run_ids) != 0)) + 1
+    starts = np.concatenate(([0], starts))
+    lengths = np.diff(np.concatenate((starts, [len(indices)])))
+
+    group_values = values[indices]
+    positions = np.arange(len(indices))
+
+    minimums = np.minimum.reduceat(group_values, starts)
+    maximums = np.maximum.reduceat(group_values, starts)
+
+    # First occurrence of the minimum and maximum of every group
+    argmins = np.minimum.reduceat(np.where(group_values == np.repeat(minimums, lengths), positions, len(indices)), starts)
+    argmaxs = np.minimum.reduceat(np.where(group_values == np.repeat(maximums, lengths), positions, len(indices)), starts)
+
+    first = np.minimum(argmins, argmaxs)
+    second = np.maximum(argmins, argmaxs)
+
+    keep = np.column_stack((first, second)).ravel()
+    keep = keep[np.concatenate(([True], np.diff(keep) != 0))]
+
+    # Kept samples are valid and breaks are not, so there are no duplicates
+    return np.sort(np.concatenate((indices[keep], breaks)))
@@ -0,0 +1,67 @@
+import json
+
+import numpy as np
+
+import note_helper
+
+# One pitch frame per hop. The binary format is the raw little-endian record
+# without padding (26 bytes), a note of -1 and NaN cents mark unvoiced frames.
+FRAME_DTYPE = np.dtype([("timestamp", "<f8"),
+                        ("pitch", "<f4"),
+                        ("note", "<i2"),
+                        ("cents", "<f4"),
+                        ("volume", "<f4"),
+                        ("confidence", "<f4")])
+
+
+def results_to_frames(results, standard_pitch=440.0):
+    # `results` is an AnalysisSnapshot or a structured array of analysis results
+    if hasattr(results, "pitches"):
+        timestamps, pitches, volumes, confidences = results.timestamps, results.pitches, results.volumes, results.confidences
+    else:
+        timestamps, pitches, volumes, confidences = results["timestamp"], results["pitch"], results["volume"], results["confidence"]
+
+    frames = np.zeros(len(pitches), dtype=FRAME_DTYPE)
+    frames["timestamp"] = timestamps
+    frames["pitch"] = pitches
+    frames["volume"] = volumes
+    frames["confidence"] = confidences
+
+    notes = note_helper.frequencies_to_notes(pitches, standard_pitch)
+    voiced = notes >= 0
+
+    frames["note"] = notes
+    frames["cents"] = np.nan
+
+    # Deviation from the nearest note
+    frames["cents"][voiced] = 1200.0 * np.log2(np.asarray(pitches)[voiced] / note_helper.notes_to_frequencies(notes[voiced], standard_pitch))
+
+    return frames
+
+
+def encode_ndjson(frames):
+    lines = []
+    for timestamp, pitch, note, cents, volume, confidence in frames.tolist():
+        voiced = note >= 0
+        lines.append(json.dumps({"timestamp": round(timestamp, 6),
+                                 "pitch": round(pitch, 3) if voiced else None,
+                                 "note": note_helper.value_to_note_name(note) if voiced else None,
+                                 "cents": round(cents, 2) if voiced else None,
+                                 "volume": round(volume, 2) if np.isfinite(volume) else None,
+                                 "confidence": round(confidence, 4)}))
+
+    return "".join(line + "\n" for line in lines).encode("utf-8")
+
+
+def encode_binary(frames):
+    return frames.astype(FRAME_DTYPE, copy=False).tobytes()
+
+
+def decode_binary(data):
+    return np.frombuffer(data, dtype=FRAME_DTYPE)
+
+
+ENCODERS = {
+    "ndjson": encode_ndjson,
+    "binary": encode_binary,
+}
@@ -0,0 +1,138 @@
+import sys
+import time
+import argparse
+import multiprocessing
+
+import numpy as np
+
+from pitch_tracker import PitchTracker
+from audio_source import FileSource
+from settings import read_settings, CONFIG_PATH
+import frame_format
+
+DEFAULT_BATCH_SIZE = 16         # in frames
+DEFAULT_FLUSH_INTERVAL = 0.1    # in seconds
+
+
+class FrameStream():
+    """
+    Writes the finalized frames of a running PitchTracker to a binary file
+    object. Frames are collected until `batch_size` of them are pending or the
+    oldest pending one waited `flush_interval` seconds, then encoded and
+    written at once.
+    """
+
+    def __init__(self, pitch_tracker, output, encode, standard_pitch=440.0,
+                 batch_size=DEFAULT_BATCH_SIZE, flush_interval=DEFAULT_FLUSH_INTERVAL):
+        self.pitch_tracker = pitch_tracker
+        self.output = output
+        self.encode = encode
+        self.standard_pitch = standard_pitch
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self.next_sequence = 0
+        self.pending = []
+        self.num_pending = 0
+        self.pending_since = None
+
+
+    def poll(self, final=False):
+        # `final` also emits the last hops, whose filtered pitch would change if more followed
+        results = self.pitch_tracker.get_new_results(self.next_sequence, final)
+        self.next_sequence = results.sequence
+
+        if len(results.pitches) > 0:
+            if self.num_pending == 0:
+                self.pending_since = time.monotonic()
+
+            self.pending.append(frame_format.results_to_frames(results, self.standard_pitch))
+            self.num_pending += len(results.pitches)
+
+        if self.num_pending >= self.batch_size or (self.num_pending > 0 and time.monotonic() - self.pending_since >= self.flush_interval):
+            self.flush()
+
+
+    def flush(self):
+        if self.num_pending == 0:
+            return
+
+        self.output.write(self.encode(np.concatenate(self.pending)))
+        self.output.flush()
+
+        self.pending = []
+        self.num_pending = 0
+
+
+    def run(self, duration=None):
+        # Polls about once per hop until `duration` seconds have passed (forever if None)
+        # or the source is exhausted
+        poll_interval = min(self.flush_interval, self.pitch_tracker.hop_size / self.pitch_tracker.sample_rate)
+        end_time = None if duration is None else time.monotonic() + duration
+
+        while end_time is None or time.monotonic() < end_time:
+            time.sleep(poll_interval)
+
+            running = self.pitch_tracker.is_running()
+            self.poll(final=not running)
+
+            if not running:
+                break
+
+        self.flush()
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Streams pitch frames without a user interface")
+    parser.add_argument("--format", choices=sorted(frame_format.ENCODERS), default="ndjson")
+    parser.add_argument("--output", default="-", help="File the frames are written to ('-' for stdout)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Frames written at once")
+    parser.add_argument("--flush-interval", type=float, default=DEFAULT_FLUSH_INTERVAL, help="Longest time a frame is held back (in seconds)")
+    parser.add_argument("--duration", type=float, default=None, help="Stop after this many seconds (default: run until interrupted)")
+    parser.add_argument("--device", type=int, default=None, help="Input device index (default: from the configuration)")
+    parser.add_argument("--file", default=None, help="Play this audio file instead of using an input device")
+    parser.add_argument("--unpaced", action="store_true", help="Read --file as fast as it can be analyzed instead of in real time")
+    parser.add_argument("--config", default=CONFIG_PATH, help="Configuration file")
+    args = parser.parse_args(argv)
+
+    settings = read_settings(args.config)
+    device_index = settings["device_index"] if args.device is None else args.device
+
+    pitch_tracker = PitchTracker(device_index=device_index,
+                                 analysis_window=settings["analysis_window"],
+                                 filter_window=settings["filter_window"],
+                                 silence_threshold=settings["silence_threshold"],
+                                 onset_detection_method=settings["onset_detection_method"],
+                                 pitch_detection_method=settings["pitch_detection_method"],
+                                 standard_pitch=settings["standard_pitch"],
+                                 source=FileSource(args.file, paced=not args.unpaced) if args.file else None)
+
+    output = sys.stdout.buffer if args.output == "-" else open(args.output, "wb")
+
+    stream = FrameStream(pitch_tracker,
+                         output,
+                         frame_format.ENCODERS[args.format],
+                         settings["standard_pitch"],
+                         args.batch_size,
+                         args.flush_interval)
+
+    pitch_tracker.start_tracking()
+
+    try:
+        stream.run(args.duration)
+    except (KeyboardInterrupt, BrokenPipeError):
+        pass
+    finally:
+        pitch_tracker.stop_tracking()
+
+        if output is not sys.stdout.buffer:
+            output.close()
+
+        print(pitch_tracker.stats(), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    # Pyinstaller fix
+    multiprocessing.freeze_support()
+
+    main(sys.argv[1:])
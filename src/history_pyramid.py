@@ -0,0 +1,141 @@
+import numpy as np
+
+# A bucket of consecutive hops. `timestamp` is the one of its last hop, the pitches
+# are taken over its voiced hops only (0 Hz if there are none), `voiced` is the
+# fraction of voiced hops and `volume` the loudest hop (in dB).
+HISTORY_DTYPE = np.dtype([("timestamp", np.float64),
+                          ("min_pitch", np.float64),
+                          ("max_pitch", np.float64),
+                          ("median_pitch", np.float64),
+                          ("voiced", np.float64),
+                          ("volume", np.float64)])
+
+
+def reduce_buckets(buckets):
+    # Merges every row of the (num_buckets, n) array `buckets` into one bucket.
+    # The median of merged buckets is the median of their medians.
+    voiced = buckets["voiced"] > 0.0
+    num_voiced = np.count_nonzero(voiced, axis=1)
+    rows = np.arange(len(buckets))
+
+    result = np.zeros(len(buckets), dtype=HISTORY_DTYPE)
+    result["timestamp"] = buckets["timestamp"][:, -1]
+    result["voiced"] = buckets["voiced"].mean(axis=1)
+    result["volume"] = buckets["volume"].max(axis=1)
+    result["min_pitch"] = np.where(voiced, buckets["min_pitch"], np.inf).min(axis=1)
+    result["max_pitch"] = np.where(voiced, buckets["max_pitch"], -np.inf).max(axis=1)
+
+    # Unvoiced entries are sorted to the end, the median is taken over the first num_voiced
+    medians = np.sort(np.where(voiced, buckets["median_pitch"], np.inf), axis=1)
+    lower = medians[rows, np.maximum(num_voiced - 1, 0) // 2]
+    upper = medians[rows, num_voiced // 2]
+    result["median_pitch"] = (lower + upper) / 2.0
+
+    unvoiced = num_voiced == 0
+    for name in ("min_pitch", "max_pitch", "median_pitch"):
+        result[name][unvoiced] = 0.0
+
+    return result
+
+
+class HistoryPyramid():
+    """
+    Downsampled history of the analysis results with bounded memory. Level k
+    holds the last `level_len` buckets of base_hops * factor**k hops each, so
+    every level covers `factor` times the duration of the previous one with
+    the same number of buckets. Hops are added in batches as they are
+    finalized; every level is only touched once per `factor` buckets of the
+    level below, so the cost per hop is O(1) amortized.
+    """
+
+    BASE_HOPS = 4
+    FACTOR = 4
+    LEVEL_LEN = 4096
+    NUM_LEVELS = 5
+
+    def __init__(self, hop_time, base_hops=BASE_HOPS, factor=FACTOR, level_len=LEVEL_LEN, num_levels=NUM_LEVELS):
+        self.hop_time = hop_time
+        self.base_hops = base_hops
+        self.factor = factor
+        self.level_len = level_len
+        self.num_levels = num_levels
+
+        self.levels = [np.zeros(level_len, dtype=HISTORY_DTYPE) for _ in range(num_levels)]
+
+        self.reset()
+
+
+    def reset(self):
+        # Total number of buckets written to every level
+        self.counts = [0] * self.num_levels
+
+        # Hops and buckets waiting until there are enough of them for a bucket of the next level
+        self.pending = [np.zeros(0, dtype=HISTORY_DTYPE) for _ in range(self.num_levels + 1)]
+
+
+    def bucket_duration(self, level):
+        # in seconds
+        return self.base_hops * self.factor**level * self.hop_time
+
+
+    def update(self, timestamps, pitches, volumes):
+        # Adds consecutive hops, a hop being a bucket of its own
+        hops = np.zeros(len(pitches), dtype=HISTORY_DTYPE)
+        hops["timestamp"] = timestamps
+        hops["voiced"] = pitches > 0.0
+        hops["volume"] = volumes
+        for name in ("min_pitch", "max_pitch", "median_pitch"):
+            hops[name] = np.maximum(pitches, 0.0)
+
+        self._add(-1, hops)
+
+
+    def _add(self, level, buckets):
+        # Adds buckets of `level` (-1 for hops) to the pending ones and merges whatever is complete
+        pending = np.concatenate((self.pending[level + 1], buckets))
+        n = self.base_hops if level < 0 else self.factor
+
+        num_complete = len(pending) // n
+        self.pending[level + 1] = pending[num_complete * n:]
+
+        if num_complete == 0 or level + 1 == self.num_levels:
+            return
+
+        merged = reduce_buckets(pending[:num_complete * n].reshape(num_complete, n))
+        self._append(level + 1, merged)
+        self._add(level + 1, merged)
+
+
+    def _append(self, level, buckets):
+        # Only the last level_len of them are kept
+        num_buckets = len(buckets)
+        buckets = buckets[-self.level_len:]
+        indices = (self.counts[level] + num_buckets - len(buckets) + np.arange(len(buckets))) % self.level_len
+
+        self.levels[level][indices] = buckets
+        self.counts[level] += num_buckets
+
+
+    def select_level(self, duration, max_buckets):
+        # The finest level that shows `duration` seconds with at most `max_buckets` buckets
+        for level in range(self.num_levels):
+            if duration / self.bucket_duration(level) <= max_buckets:
+                return level
+
+        return self.num_levels - 1
+
+
+    def latest_timestamp(self, level=0):
+        if self.counts[level] == 0:
+            return None
+
+        return float(self.levels[level][(self.counts[level] - 1) % self.level_len]["timestamp"])
+
+
+    def buckets(self, level, start_time):
+        # Copy of the buckets of `level` that end after `start_time`, oldest first
+        count = min(self.counts[level], self.level_len)
+        indices = (self.counts[level] - count + np.arange(count)) % self.level_len
+        buckets = self.levels[level][indices]
+
+        return buckets[buckets["timestamp"] > start_time]
@@ -0,0 +1,140 @@
+import sys
+import os
+import time
+import json
+import argparse
+
+from pitch_tracker import PitchTracker
+from audio_source import SignalSource
+from profiling import StageProfiler
+
+LATENCY_STAGES = ("buffer_fill", "detection", "ipc", "render", "total")
+
+
+class LatencyMonitor():
+    """
+    Audio-to-display latency of the newest hop on every frame that shows a new
+    one, split into:
+
+    - buffer_fill: the span of audio the detector looks at (buffer_size / sample_rate),
+      a pitch change needs up to that long to dominate the result
+    - detection: from the capture of the last sample of the hop until its result was published
+    - ipc: from publishing until the main process read the results
+    - render: from reading the results until the frame was on screen, including the
+      wait for the next frame
+    """
+
+    def __init__(self, pitch_tracker, history_len=512):
+        self.buffer_fill = pitch_tracker.buffer_size / pitch_tracker.sample_rate
+        self.profiler = StageProfiler(LATENCY_STAGES, history_len)
+
+        self.last_sequence = 0
+
+
+    def record(self, snapshot, read_time, display_time):
+        # `snapshot` was taken at `read_time` and shown at `display_time` (wall clock time)
+        if snapshot is None or len(snapshot.timestamps) == 0 or snapshot.sequence <= self.last_sequence:
+            return
+
+        self.last_sequence = snapshot.sequence
+
+        captured = float(snapshot.timestamps[-1])
+        published = float(snapshot.publish_times[-1])
+
+        detection = published - captured
+        ipc = read_time - published
+        render = display_time - read_time
+
+        self.profiler.record("buffer_fill", self.buffer_fill)
+        self.profiler.record("detection", detection)
+        self.profiler.record("ipc", ipc)
+        self.profiler.record("render", render)
+        self.profiler.record("total", self.buffer_fill + detection + ipc + render)
+
+
+    def summary(self):
+        return self.profiler.summary()
+
+
+def self_test(duration, resolution, target_fps, buffer_size, lowest_frequency, analysis_window, filter_window):
+    # Runs the tracker on a synthetic input and renders into a window without showing it
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+    import pygame
+    from ui import PitchTrackerGraph, PitchTrackerUI
+
+    pygame.init()
+    screen = pygame.display.set_mode(resolution)
+
+    pitch_tracker = PitchTracker(source=SignalSource(),
+                                 buffer_size=buffer_size,
+                                 analysis_window=analysis_window,
+                                 filter_window=filter_window,
+                                 silence_threshold=-60.0,
+                                 lowest_frequency=lowest_frequency)
+    pitch_tracker.start_tracking()
+
+    graph = PitchTrackerGraph(screen, (0, 0, *resolution), 440.0)
+    monitor = LatencyMonitor(pitch_tracker)
+    clock = pygame.time.Clock()
+
+    try:
+        end_time = time.time() + duration
+        while time.time() < end_time:
+            pygame.event.pump()
+
+            graph.run(clock.get_time() / 1000.0)
+
+            screen.fill(PitchTrackerUI.BACKGROUND_COLOR)
+            graph.render(pitch_tracker)
+
+            clock.tick(target_fps)
+            pygame.display.update()
+
+            monitor.record(graph.snapshot, graph.snapshot_time, time.time())
+    finally:
+        pitch_tracker.stop_tracking()
+        pygame.quit()
+
+    return {"buffer_size": pitch_tracker.buffer_size,
+            "hop_size": pitch_tracker.hop_size,
+            "sample_rate": pitch_tracker.sample_rate,
+            "target_fps": target_fps,
+            "latency_ms": monitor.summary()}
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Audio-to-display latency self-test on a synthetic input")
+    parser.add_argument("--duration", type=float, default=10.0, help="Length of the test (in seconds)")
+    parser.add_argument("--fps", type=int, default=60, help="Target FPS")
+    parser.add_argument("--buffer-size", type=int, default=4096)
+    parser.add_argument("--lowest-frequency", type=float, default=65.4064, help="Determines the hop size (in Hz)")
+    parser.add_argument("--analysis-window", type=float, default=10.0, help="Analysis window (in seconds)")
+    parser.add_argument("--filter-window", type=float, default=0.05, help="Filter window (in seconds)")
+    parser.add_argument("--resolution", nargs=2, type=int, default=[1024, 768])
+    parser.add_argument("--output", default="latency_results.json", help="JSON file the results are written to")
+    args = parser.parse_args(argv)
+
+    results = self_test(args.duration,
+                        tuple(args.resolution),
+                        args.fps,
+                        args.buffer_size,
+                        args.lowest_frequency,
+                        args.analysis_window,
+                        args.filter_window)
+
+    print("buffer_size={buffer_size} hop_size={hop_size} target_fps={target_fps}".format(**results))
+    print("{stage:<12}{p50:>10}{p90:>10}{p99:>10}".format(stage="ms", p50="p50", p90="p90", p99="p99"))
+    for stage, summary in results["latency_ms"].items():
+        if summary["count"] > 0:
+            print("{stage:<12}{p50:>10.2f}{p90:>10.2f}{p99:>10.2f}".format(stage=stage, **summary))
+
+    with open(args.output, "wt") as f:
+        json.dump(results, f, indent=2)
+
+    print()
+    print("Results written to", args.output)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,205 @@
+import heapq
+
+import numpy as np
+
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+# Samples deviating from the local median by more than this factor are replaced by it
+MAX_FACTOR = 1.5
+
+
+def median_filter(pitches, filter_window_len, max_factor=MAX_FACTOR):
+    # Vectorized version of the outlier filter for whole arrays. Sample i is
+    # compared to the median of pitches[i - filter_window_len:i + filter_window_len].
+    # Negative samples stand in for lost hops (see pitch_tracker.GAP_PITCH), the runs
+    # between them are filtered separately and the gaps are kept as they are.
+    pitches = np.asarray(pitches, dtype=np.float64)
+    filtered_pitches = pitches.copy()
+
+    gaps = np.flatnonzero(pitches < 0.0)
+    if len(gaps) > 0:
+        for start, end in zip(np.concatenate(([0], gaps + 1)), np.concatenate((gaps, [len(pitches)]))):
+            filtered_pitches[start:end] = median_filter(pitches[start:end], filter_window_len, max_factor)
+
+        return filtered_pitches
+
+    num_samples = len(pitches)
+    num_filtered = num_samples - 2 * filter_window_len
+
+    if filter_window_len <= 0 or num_filtered <= 0:
+        return filtered_pitches
+
+    windows = sliding_window_view(pitches, 2 * filter_window_len)[:num_filtered]
+    medians = np.median(windows, axis=1)
+
+    center = pitches[filter_window_len:num_samples - filter_window_len]
+    outliers = (center < medians / max_factor) | (center > medians * max_factor)
+
+    filtered_pitches[filter_window_len:num_samples - filter_window_len] = np.where(outliers, medians, center)
+
+    return filtered_pitches
+
+
+class SlidingMedian():
+    """
+    Median of a sliding window in O(log W) per update, using two heaps with
+    lazy deletion. `low` is a max-heap (stored negated), `high` a min-heap.
+    """
+
+    def __init__(self):
+        self.low = []
+        self.high = []
+        self.low_size = 0
+        self.high_size = 0
+        self.delayed = {}
+
+
+    def __len__(self):
+        return self.low_size + self.high_size
+
+
+    def _prune(self, heap, sign):
+        while heap:
+            value = sign * heap[0]
+            if value not in self.delayed:
+                break
+
+            self.delayed[value] -= 1
+            if self.delayed[value] == 0:
+                del self.delayed[value]
+
+            heapq.heappop(heap)
+
+
+    def _balance(self):
+        if self.low_size > self.high_size + 1:
+            heapq.heappush(self.high, -heapq.heappop(self.low))
+            self.low_size -= 1
+            self.high_size += 1
+            self._prune(self.low, -1)
+        elif self.low_size < self.high_size:
+            heapq.heappush(self.low, -heapq.heappop(self.high))
+            self.low_size += 1
+            self.high_size -= 1
+            self._prune(self.high, 1)
+
+
+    def add(self, value):
+        if not self.low or value <= -self.low[0]:
+            heapq.heappush(self.low, -value)
+            self.low_size += 1
+        else:
+            heapq.heappush(self.high, value)
+            self.high_size += 1
+
+        self._balance()
+
+
+    def remove(self, value):
+        self.delayed[value] = self.delayed.get(value, 0) + 1
+
+        if value <= -self.low[0]:
+            self.low_size -= 1
+            if value == -self.low[0]:
+                self._prune(self.low, -1)
+        else:
+            self.high_size -= 1
+            if value == self.high[0]:
+                self._prune(self.high, 1)
+
+        self._balance()
+
+
+    def median(self):
+        if self.low_size > self.high_size:
+            return -self.low[0]
+
+        # Same arithmetic as np.median for an even number of samples
+        return (-self.low[0] + self.high[0]) / 2.0
+
+
+class StreamingMedianFilter():
+    """
+    Incremental version of median_filter() for a stream of samples that is
+    observed through a sliding window. Only samples that arrived since the
+    previous call are processed, filtered values are cached by their absolute
+    sequence number. Like median_filter(), a negative sample (a gap) starts a
+    new run, so gaps never take part in a median.
+    """
+
+    def __init__(self, filter_window_len, analysis_window_len, max_factor=MAX_FACTOR):
+        self.filter_window_len = filter_window_len
+        self.analysis_window_len = analysis_window_len
+        self.max_factor = max_factor
+
+        self.filtered = np.zeros(analysis_window_len, dtype=np.float64)
+        self.reset(0)
+
+
+    def reset(self, sequence):
+        self.median = SlidingMedian()
+        self.history = [0.0] * (2 * self.filter_window_len)
+        self.next_sequence = sequence
+
+
+    def _push(self, pitch):
+        reference_len = 2 * self.filter_window_len
+        sequence = self.next_sequence
+        slot = sequence % reference_len
+
+        # Stays unfiltered unless its reference window is completed
+        self.filtered[sequence % self.analysis_window_len] = pitch
+
+        if pitch < 0.0:
+            # Like at the end of a window, the last W samples before the gap stay unfiltered
+            if len(self.median) == reference_len:
+                center = sequence - self.filter_window_len
+                self.filtered[center % self.analysis_window_len] = self.history[center % reference_len]
+
+            self.reset(sequence + 1)
+            return
+
+        if len(self.median) == reference_len:
+            self.median.remove(self.history[slot])
+
+        self.history[slot] = pitch
+        self.median.add(pitch)
+        self.next_sequence += 1
+
+        if len(self.median) == reference_len:
+            # The reference window [center - W, center + W) is complete
+            center = sequence - self.filter_window_len + 1
+            value = self.history[center % reference_len]
+            median = self.median.median()
+
+            if value < median / self.max_factor or value > median * self.max_factor:
+                value = median
+
+            self.filtered[center % self.analysis_window_len] = value
+
+
+    def __call__(self, sequence, pitches):
+        # `pitches` are the raw samples of the window ending at `sequence`
+        pitches = np.asarray(pitches, dtype=np.float64)
+        filtered_pitches = pitches.copy()
+
+        num_samples = len(pitches)
+        first_sequence = sequence - num_samples
+
+        if self.filter_window_len <= 0 or num_samples - 2 * self.filter_window_len <= 0:
+            return filtered_pitches
+
+        # Start over if samples were skipped or the stream was restarted
+        if self.next_sequence < first_sequence or self.next_sequence > sequence:
+            self.reset(first_sequence)
+
+        for pitch in pitches[self.next_sequence - first_sequence:].tolist():
+            self._push(pitch)
+
+        # Like median_filter(), samples closer than W to either end of the window stay unfiltered
+        indices = np.arange(first_sequence + self.filter_window_len,
+                            sequence - self.filter_window_len) % self.analysis_window_len
+        filtered_pitches[self.filter_window_len:num_samples - self.filter_window_len] = self.filtered[indices]
+
+        return filtered_pitches
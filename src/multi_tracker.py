@@ -0,0 +1,416 @@
+import os
+import time
+import queue
+
+import numpy as np
+
+from multiprocessing import Process, Event, Queue, RawArray
+
+from ring_buffer import ResultRingBuffer
+from median_filter import StreamingMedianFilter
+from pitch_tracker import PitchTracker, HopAnalyzer, GAP_PITCH
+from audio_source import create_microphone, terminate_pyaudio, STAT_NAMES, GAP_HOPS, BUFFER_OVERRUNS, DROPPED_FRAMES
+
+AUDIO_BUFFER_LENGTH = 2.0   # Audio kept per input for the workers (in seconds)
+
+
+def create_audio_dtype(hop_size):
+    # One hop of one input. Gap records stand in for hops lost during capture.
+    return np.dtype([("timestamp", np.float64),
+                     ("gap", np.bool_),
+                     ("samples", np.float32, (hop_size,))])
+
+
+def capture_process(sources,
+                    inputs,
+                    sample_rate,
+                    hop_size,
+                    audio_rings,
+                    stats,
+                    stop,
+                    finished):
+
+    # All devices are read by this one process, so there is only one PyAudio
+    # instance. `inputs` is a list of (source index, channel).
+    for source, source_stats in zip(sources, stats):
+        source.open(sample_rate, hop_size, source_stats)
+
+    expected_frames = [0] * len(sources)
+    source_inputs = [[(i, channel) for i, (source_index, channel) in enumerate(inputs) if source_index == s] for s in range(len(sources))]
+
+    # With several sources a read must not wait for one while the others have data
+    timeout = 0.1 if len(sources) == 1 else 0.0
+    idle_time = hop_size / sample_rate / 4
+
+    while not stop.is_set() and not all(source.exhausted for source in sources):
+        idle = True
+
+        for s, source in enumerate(sources):
+            if source.exhausted:
+                continue
+
+            frame, hops = source.read_hops(timeout)
+
+            # Frames lost in between are marked with gap records, at most a buffer full
+            if frame >= expected_frames[s] + hop_size:
+                num_gaps = (frame - expected_frames[s]) // hop_size
+                for i in range(max(0, num_gaps - audio_rings[0].window_len), num_gaps):
+                    timestamp = source.start_time + (expected_frames[s] + (i + 1) * hop_size) / sample_rate
+                    for input_index, _ in source_inputs[s]:
+                        audio_rings[input_index].append((timestamp, True, 0.0))
+
+            # Deinterleaving is free, every channel is a strided view of the hops
+            for input_index, channel in source_inputs[s]:
+                samples = hops if hops.ndim == 2 else hops[:, :, channel]
+                for i in range(len(samples)):
+                    timestamp = source.start_time + (frame + (i + 1) * hop_size) / sample_rate
+                    audio_rings[input_index].append((timestamp, False, samples[i]))
+
+            if len(hops) > 0:
+                idle = False
+
+            expected_frames[s] = max(expected_frames[s], frame + len(hops) * hop_size)
+
+        if idle and timeout == 0.0:
+            time.sleep(idle_time)
+
+    for source in sources:
+        source.close()
+    terminate_pyaudio()
+
+    for audio_ring in audio_rings:
+        audio_ring.close()
+
+    finished.set()
+
+
+def detection_worker(input_indices,
+                     sample_rate,
+                     hop_size,
+                     buffer_size,
+                     pitch_detection_method,
+                     onset_detection_method,
+                     silence_threshold,
+                     tolerance,
+                     audio_rings,
+                     analysis_results,
+                     stats,
+                     profilers,
+                     control,
+                     stop,
+                     finished,
+                     data_ready):
+
+    # Analyzes the inputs in `input_indices`, every one with its own detector state.
+    # The other arguments are lists with one entry per input.
+    analyzers = {}
+    for i in input_indices:
+        analyzers[i] = HopAnalyzer(sample_rate,
+                                   hop_size,
+                                   buffer_size,
+                                   pitch_detection_method,
+                                   onset_detection_method,
+                                   silence_threshold)
+        if tolerance is not None:
+            analyzers[i].set_tolerance(tolerance)
+
+    next_sequences = {i: 0 for i in input_indices}
+    hop_time = hop_size / sample_rate
+
+    while not stop.is_set():
+        # Apply settings changed by the main process, for one input or for all of them
+        while True:
+            try:
+                input_index, command, value = control.get_nowait()
+            except queue.Empty:
+                break
+
+            for i in input_indices if input_index is None else [input_index]:
+                if command == "silence_threshold":
+                    analyzers[i].set_silence(value)
+                elif command == "tolerance":
+                    analyzers[i].set_tolerance(value)
+                elif command == "pitch_detection_method":
+                    analyzers[i].set_pitch_detection_method(value)
+
+        # Checked before reading, so that nothing written before the end is missed
+        capture_finished = finished.is_set()
+        idle = True
+
+        for i in input_indices:
+            start = time.perf_counter()
+            sequence, hops = audio_rings[i].read_since(next_sequences[i])
+            if len(hops) == 0:
+                continue
+
+            profilers[i].record("audio_read", time.perf_counter() - start)
+            idle = False
+
+            # Hops overwritten before this worker got to them
+            lost = sequence - next_sequences[i] - len(hops)
+            next_sequences[i] = sequence
+
+            if lost > 0:
+                stats[i][BUFFER_OVERRUNS] += 1
+                stats[i][DROPPED_FRAMES] += lost * hop_size
+
+            gaps = hops["gap"]
+            results = iter(analyzers[i].analyze_batch(hops["samples"][~gaps], profilers[i]))
+
+            start = time.perf_counter()
+            published = time.time()
+
+            for k in range(max(0, lost - analysis_results[i].window_len), lost):
+                analysis_results[i].append((hops["timestamp"][0] - (lost - k) * hop_time, GAP_PITCH, -np.inf, 0.0, 0.0, published))
+
+            for timestamp, gap in zip(hops["timestamp"].tolist(), gaps.tolist()):
+                if gap:
+                    analysis_results[i].append((timestamp, GAP_PITCH, -np.inf, 0.0, 0.0, published))
+                else:
+                    analysis_results[i].append((timestamp, *next(results), published))
+
+            stats[i][GAP_HOPS] += lost + int(np.count_nonzero(gaps))
+            profilers[i].record("publish", time.perf_counter() - start)
+
+            data_ready.set()
+
+        if idle:
+            if capture_finished:
+                break
+
+            time.sleep(hop_time / 4)
+
+    for i in input_indices:
+        audio_rings[i].close()
+        analysis_results[i].close()
+
+
+class InputControl():
+    """
+    Control queue of one input, as seen by its PitchTracker. Commands are
+    tagged with the input so that the worker applies them to it alone.
+    """
+
+    def __init__(self, control, input_index):
+        self.control = control
+        self.input_index = input_index
+
+
+    def put(self, item):
+        command, value = item
+        self.control.put((self.input_index, command, value))
+
+
+class MultiPitchTracker():
+    """
+    Tracks several inputs at once, e.g. the channels of a multichannel
+    interface or separate devices. One process captures all sources, so
+    there is a single PyAudio instance, and hands every input its own audio
+    ring buffer. The pitch detection runs in a pool of worker processes, one
+    per core at most, every input being analyzed by one of them.
+
+    `trackers` holds one PitchTracker per input with its own result ring
+    buffer, filter, counters and profiler. They are driven by this object
+    and only used to read the results, e.g. by a PitchTrackerGraph.
+    """
+
+    def __init__(self, inputs,                    # List of (AudioSource, channel)
+                       buffer_size=4096,
+                       sample_rate=44100,
+                       analysis_window=30,        # in seconds
+                       filter_window=0.2,         # in seconds
+                       silence_threshold=-50,     # in dB
+                       lowest_frequency=65.4064,  # in Hz
+                       num_workers=None,          # Defaults to the number of cores
+                       onset_detection_method=None,
+                       standard_pitch=440.0,
+                       pitch_detection_method="default"):
+
+        if len(inputs) == 0:
+            raise ValueError("At least one input is required!")
+
+        # Sources are opened once, however many of their channels are tracked
+        self.sources = []
+        self.inputs = []
+        for source, channel in inputs:
+            indices = [i for i, s in enumerate(self.sources) if s is source]
+            if not indices:
+                self.sources.append(source)
+                indices = [len(self.sources) - 1]
+
+            self.inputs.append((indices[0], channel))
+
+        self.trackers = [PitchTracker(buffer_size=buffer_size,
+                                      sample_rate=sample_rate,
+                                      analysis_window=analysis_window,
+                                      filter_window=filter_window,
+                                      silence_threshold=silence_threshold,
+                                      lowest_frequency=lowest_frequency,
+                                      source=source,
+                                      onset_detection_method=onset_detection_method,
+                                      standard_pitch=standard_pitch,
+                                      pitch_detection_method=pitch_detection_method) for source, _ in inputs]
+
+        first = self.trackers[0]
+        self.sample_rate = first.sample_rate
+        self.buffer_size = first.buffer_size
+        self.hop_size = first.hop_size
+        self.silence_threshold = silence_threshold
+        self.pitch_detection_method = first.pitch_detection_method
+        self.onset_detection_method = first.onset_detection_method
+        self.tolerance = None
+
+        self.num_workers = min(len(inputs), num_workers or os.cpu_count() or 1)
+
+        self.source_counters = [RawArray("q", len(STAT_NAMES)) for _ in self.sources]
+        self.capture_process = None
+        self.workers = []
+
+
+    @property
+    def profiler(self):
+        return self.trackers[0].profiler
+
+
+    def start_tracking(self):
+        audio_window_len = int(np.ceil(AUDIO_BUFFER_LENGTH * self.sample_rate / self.hop_size))
+        self.audio_rings = [ResultRingBuffer(audio_window_len, dtype=create_audio_dtype(self.hop_size)) for _ in self.inputs]
+
+        self.stop = Event()
+        self.finished = Event()
+        self.data_ready = Event()
+        self.controls = [Queue() for _ in range(self.num_workers)]
+
+        for counters in self.source_counters:
+            counters[:] = [0] * len(STAT_NAMES)
+
+        for i, tracker in enumerate(self.trackers):
+            tracker.analysis_results = ResultRingBuffer(tracker.analysis_window_len)
+            tracker.counters[:] = [0] * len(STAT_NAMES)
+            tracker.profiler.reset()
+            tracker.stop = self.stop
+            tracker.data_ready = self.data_ready
+            tracker.control = InputControl(self.controls[i % self.num_workers], i)
+            tracker.median_filter = StreamingMedianFilter(tracker.filter_window_len, tracker.analysis_window_len)
+            tracker.reset_history()
+
+        self.capture_process = Process(target=capture_process, args=(self.sources,
+                                                                     self.inputs,
+                                                                     self.sample_rate,
+                                                                     self.hop_size,
+                                                                     self.audio_rings,
+                                                                     self.source_counters,
+                                                                     self.stop,
+                                                                     self.finished))
+
+        # Inputs are dealt to the workers round-robin
+        self.workers = [Process(target=detection_worker, args=(list(range(w, len(self.inputs), self.num_workers)),
+                                                               self.sample_rate,
+                                                               self.hop_size,
+                                                               self.buffer_size,
+                                                               self.pitch_detection_method,
+                                                               self.onset_detection_method,
+                                                               self.silence_threshold,
+                                                               self.tolerance,
+                                                               self.audio_rings,
+                                                               [tracker.analysis_results for tracker in self.trackers],
+                                                               [tracker.counters for tracker in self.trackers],
+                                                               [tracker.profiler for tracker in self.trackers],
+                                                               self.controls[w],
+                                                               self.stop,
+                                                               self.finished,
+                                                               self.data_ready)) for w in range(self.num_workers)]
+
+        for worker in self.workers:
+            worker.start()
+        self.capture_process.start()
+
+        for tracker in self.trackers:
+            tracker.background_process = self.capture_process
+
+
+    def is_running(self):
+        return any(process.is_alive() for process in [self.capture_process] + self.workers if process is not None)
+
+
+    def wait_for_data(self, timeout=None):
+        # Waits until new results of any input were published, see PitchTracker.wait_for_data
+        ready = self.data_ready.wait(timeout)
+        self.data_ready.clear()
+
+        return ready
+
+
+    def stop_tracking(self):
+        self.stop.set()
+
+        self.capture_process.join()
+        for worker in self.workers:
+            worker.join()
+
+        self.capture_process = None
+        self.workers = []
+
+        for tracker in self.trackers:
+            tracker.close_results()
+
+        for audio_ring in self.audio_rings:
+            audio_ring.close()
+
+
+    def stats(self):
+        # Counters of the devices and of the workers, in total and per input. The
+        # counters of a device are shared by all its channels.
+        device_counters = [np.array(counters[:]) for counters in self.source_counters]
+        input_counters = [np.array(tracker.counters[:]) for tracker in self.trackers]
+
+        inputs = []
+        for (source_index, _), counters, tracker in zip(self.inputs, input_counters, self.trackers):
+            inputs.append(dict(zip(STAT_NAMES, (counters + device_counters[source_index]).tolist())))
+            inputs[-1]["hops"] = tracker.stats()["hops"]
+
+        result = dict(zip(STAT_NAMES, (np.sum(device_counters, axis=0) + np.sum(input_counters, axis=0)).tolist()))
+        result["hops"] = sum(stats["hops"] for stats in inputs)
+        result["inputs"] = inputs
+
+        return result
+
+
+    def profile(self):
+        # Stage timings of every input
+        return [tracker.profile() for tracker in self.trackers]
+
+
+    def reconfigure(self, command, value):
+        # Changes a setting of all inputs
+        if self.capture_process is not None:
+            for control in self.controls:
+                control.put((None, command, value))
+
+
+    def set_silence(self, silence_threshold):
+        self.silence_threshold = silence_threshold
+        for tracker in self.trackers:
+            tracker.silence_threshold = silence_threshold
+        self.reconfigure("silence_threshold", silence_threshold)
+
+
+    def set_pitch_detection_method(self, pitch_detection_method):
+        self.pitch_detection_method = pitch_detection_method
+        for tracker in self.trackers:
+            tracker.pitch_detection_method = pitch_detection_method
+        self.reconfigure("pitch_detection_method", pitch_detection_method)
+
+
+    def set_tolerance(self, tolerance):
+        self.tolerance = tolerance
+        for tracker in self.trackers:
+            tracker.tolerance = tolerance
+        self.reconfigure("tolerance", tolerance)
+
+
+def device_inputs(device_index, channels, callback_capture=True):
+    # Inputs for all channels of one device
+    source = create_microphone(device_index, callback_capture, channels)
+
+    return [(source, channel) for channel in range(channels)]
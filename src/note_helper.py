@@ -1,29 +1,47 @@
 import math
 import re
+import functools
+
+import numpy as np
 
 NOTE_NAMES = ["C", "C#", "D", "D#", "E", "F", "F#", "G", "G#", "A", "A#", "B"]            
 
 RE_NOTE_NAME = re.compile("([A-G]#?)(\d)")
 
 
-def frequency_to_note(freq, standard_pitch=440.0, rounding=True):
-    if freq == 0.0:
-        return -1
+@functools.lru_cache(maxsize=8)
+def get_c0(standard_pitch=440.0):
+    # Frequency of C0 for the given standard pitch (12-tone equal temperament)
+    return standard_pitch * math.pow(2.0, -4.75)
+
 
-    # 12-tone equal temperament
-    C0 = standard_pitch * math.pow(2.0, -4.75)            
-    value = 12 * math.log2(freq / C0)
+def frequencies_to_notes(frequencies, standard_pitch=440.0, rounding=True):
+    # Array version of frequency_to_note, frequencies without a pitch (<= 0 Hz) map to -1
+    frequencies = np.asarray(frequencies, dtype=np.float64)
+    has_pitch = frequencies > 0.0
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        values = 12.0 * np.log2(frequencies / get_c0(standard_pitch))
 
     if rounding:
-        value = round(value)
+        return np.where(has_pitch, np.rint(values), -1).astype(np.int64)
 
-    return value
+    return np.where(has_pitch, values, -1.0)
 
 
-def note_to_frequency(note, standard_pitch=440.0):
-    C0 = standard_pitch * math.pow(2.0, -4.75)   
+def notes_to_frequencies(notes, standard_pitch=440.0):
+    return get_c0(standard_pitch) * np.exp2(np.asarray(notes, dtype=np.float64) / 12.0)
+
 
-    return C0 * math.pow(2.0, note / 12.0)
+def frequency_to_note(freq, standard_pitch=440.0, rounding=True):
+    # Scalar version of frequencies_to_notes, so that both always agree
+    value = frequencies_to_notes(freq, standard_pitch, rounding)
+
+    return int(value) if rounding else float(value)
+
+
+def note_to_frequency(note, standard_pitch=440.0):
+    return float(notes_to_frequencies(note, standard_pitch))
 
 
 def note_name_to_value(note_name):
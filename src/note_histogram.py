@@ -0,0 +1,101 @@
+import numpy as np
+
+import note_helper
+
+
+class NoteHistogram():
+    """
+    Occurrence counts of the note values in a sliding window of pitches, kept
+    up to date by adding the hops that arrive and subtracting the ones that
+    leave the window.
+    """
+
+    NOTE_OFFSET = 256           # Notes from -256 up to 255 get their own bin
+    NUM_BINS = 512
+
+    def __init__(self, capacity, standard_pitch=440.0, highest_pitch=float("inf")):
+        self.capacity = capacity
+        self.standard_pitch = standard_pitch
+        self.highest_pitch = highest_pitch
+
+        # Bins of all samples and of the samples with a displayable pitch
+        self.counts = np.zeros(NoteHistogram.NUM_BINS, dtype=np.int64)
+        self.valid_counts = np.zeros(NoteHistogram.NUM_BINS, dtype=np.int64)
+
+        # Bin and validity of every sample in the window, indexed by sequence % capacity
+        self.bins = np.zeros(capacity, dtype=np.int64)
+        self.valid = np.zeros(capacity, dtype=bool)
+
+        self.first_sequence = 0
+        self.end_sequence = 0
+
+
+    def _classify(self, pitches):
+        notes = note_helper.frequencies_to_notes(pitches, self.standard_pitch)
+        bins = np.clip(notes + NoteHistogram.NOTE_OFFSET, 0, NoteHistogram.NUM_BINS - 1)
+        valid = (pitches > 0.0) & (pitches <= self.highest_pitch)
+
+        return bins, valid
+
+
+    def _add(self, sequences, pitches, sign):
+        if len(sequences) == 0:
+            return
+
+        slots = sequences % self.capacity
+
+        if sign > 0:
+            self.bins[slots], self.valid[slots] = self._classify(pitches)
+
+        bins = self.bins[slots]
+        self.counts += sign * np.bincount(bins, minlength=NoteHistogram.NUM_BINS)
+        self.valid_counts += sign * np.bincount(bins[self.valid[slots]], minlength=NoteHistogram.NUM_BINS)
+
+
+    def rebuild(self, sequence, pitches):
+        self.counts[:] = 0
+        self.valid_counts[:] = 0
+
+        self.first_sequence = sequence - len(pitches)
+        self.end_sequence = sequence
+
+        self._add(np.arange(self.first_sequence, sequence), pitches, 1)
+
+
+    def update(self, sequence, pitches, refresh_len=0):
+        # `pitches` is the window ending at `sequence`. Samples closer than `refresh_len`
+        # to either end of the window may have changed since the previous update
+        # (e.g. by filtering) and are re-counted.
+        pitches = np.asarray(pitches, dtype=np.float64)
+        first_sequence = sequence - len(pitches)
+
+        if not (self.first_sequence <= first_sequence <= self.end_sequence <= sequence):
+            self.rebuild(sequence, pitches)
+            return
+
+        # Samples that left the window
+        self._add(np.arange(self.first_sequence, first_sequence), None, -1)
+
+        # Samples to re-count, followed by the ones that are new
+        head_end = min(first_sequence + refresh_len, self.end_sequence)
+        tail_start = max(head_end, self.end_sequence - refresh_len)
+
+        changed = np.concatenate((np.arange(first_sequence, head_end),
+                                  np.arange(tail_start, self.end_sequence)))
+        self._add(changed, None, -1)
+
+        changed = np.concatenate((changed, np.arange(self.end_sequence, sequence)))
+        self._add(changed, pitches[changed - first_sequence], 1)
+
+        self.first_sequence = first_sequence
+        self.end_sequence = sequence
+
+
+    def note_range(self, min_occurrence):
+        # Lowest and highest displayable note occurring more than `min_occurrence` times
+        bins = np.flatnonzero((self.counts > min_occurrence) & (self.valid_counts > 0))
+
+        if len(bins) == 0:
+            return None
+
+        return int(bins[0]) - NoteHistogram.NOTE_OFFSET, int(bins[-1]) - NoteHistogram.NOTE_OFFSET
@@ -0,0 +1,211 @@
+import math
+
+from collections import namedtuple, deque
+
+import numpy as np
+
+import note_helper
+
+# A sung or played note. `start` and `end` are wall clock times (or seconds into a
+# file), `pitch` the median frequency in Hz, `note` the nearest note value (see
+# note_helper) and `cents` the deviation of the median from it. Vibrato rate is in Hz,
+# depth is the amplitude in cents; both are 0 for notes without vibrato.
+NoteEvent = namedtuple("NoteEvent", ["start", "end", "pitch", "note", "cents", "vibrato_rate", "vibrato_depth"])
+
+
+class NoteSegmenter():
+    """
+    Turns the stream of analyzed hops into note events. A note starts with a
+    voiced hop and ends when
+
+    - the input stays unvoiced for longer than `max_gap`,
+    - an onset is detected while the volume is `onset_rise` above its minimum
+      of the last ONSET_WINDOW (so that vibrato does not split notes), or
+    - the pitch stays more than `stability` cents away from the mean of the
+      note for `min_duration` (shorter excursions count as vibrato).
+
+    Notes shorter than `min_duration` are dropped. Every hop is handled in
+    constant time; the median and the vibrato are computed once per note, in
+    time linear in its length, so the cost per hop is O(1) amortized.
+    """
+
+    MIN_DURATION = 0.06         # in seconds
+    MAX_GAP = 0.03              # in seconds
+    STABILITY = 70.0            # in cents
+    VIBRATO_THRESHOLD = 5.0     # Deviations smaller than that (in cents) are not counted as vibrato
+    ONSET_RISE = 6.0            # in dB
+    ONSET_WINDOW = 0.1          # in seconds
+
+    def __init__(self, hop_size,
+                       sample_rate,
+                       standard_pitch=440.0,
+                       min_duration=MIN_DURATION,
+                       max_gap=MAX_GAP,
+                       stability=STABILITY,
+                       onset_rise=ONSET_RISE,
+                       min_confidence=0.0):
+
+        self.hop_time = hop_size / sample_rate
+        self.standard_pitch = standard_pitch
+        self.stability = stability
+        self.onset_rise = onset_rise
+        self.min_confidence = min_confidence
+        self.onset_window_hops = max(1, int(math.ceil(NoteSegmenter.ONSET_WINDOW / self.hop_time)))
+
+        self.min_hops = max(1, int(math.ceil(min_duration / self.hop_time)))
+        self.max_gap_hops = int(math.ceil(max_gap / self.hop_time))
+
+        self.c0 = note_helper.get_c0(standard_pitch)
+
+        self.reset()
+
+
+    def reset(self):
+        # Cents above C0 of the hops of the current note
+        self.cents = []
+        self.cents_sum = 0.0
+        self.start = None
+        self.end = None
+
+        # Hops away from the note that may turn out to be the next one
+        self.pending = []
+        self.unvoiced_hops = 0
+
+        # Increasing (hop, volume) pairs, the first one is the minimum of the onset window
+        self.recent_volumes = deque()
+        self.hop_count = 0
+
+
+    def _add(self, timestamp, cents):
+        if not self.cents:
+            self.start = timestamp - self.hop_time
+
+        self.cents.append(cents)
+        self.cents_sum += cents
+        self.end = timestamp
+
+
+    def _finish(self):
+        # Ends the current note and returns its event, or None if it was too short
+        cents = self.cents
+        start, end = self.start, self.end
+
+        self.cents = []
+        self.cents_sum = 0.0
+        self.pending = []
+        self.unvoiced_hops = 0
+
+        if len(cents) < self.min_hops:
+            return None
+
+        cents = np.asarray(cents)
+        median = float(np.median(cents))
+        note = int(round(median / 100.0))
+
+        # Vibrato: cycles of the deviation from the median, counted by its sign changes
+        deviation = cents - median
+        signs = np.sign(deviation[np.abs(deviation) >= NoteSegmenter.VIBRATO_THRESHOLD])
+        changes = int(np.count_nonzero(signs[1:] != signs[:-1]))
+
+        if changes >= 2:
+            vibrato_rate = changes / 2.0 / (len(cents) * self.hop_time)
+            vibrato_depth = math.sqrt(2.0) * float(np.std(deviation))
+        else:
+            vibrato_rate = 0.0
+            vibrato_depth = 0.0
+
+        return NoteEvent(start,
+                         end,
+                         self.c0 * math.pow(2.0, median / 1200.0),
+                         note,
+                         median - 100.0 * note,
+                         vibrato_rate,
+                         vibrato_depth)
+
+
+    def push(self, timestamp, pitch, volume, confidence=1.0, onset=0.0):
+        # Adds one hop, returns the events of the notes it ended
+        events = []
+
+        # Sliding minimum of the volume, O(1) amortized
+        while self.recent_volumes and self.recent_volumes[-1][1] >= volume:
+            self.recent_volumes.pop()
+        self.recent_volumes.append((self.hop_count, volume))
+        if self.recent_volumes[0][0] <= self.hop_count - self.onset_window_hops:
+            self.recent_volumes.popleft()
+        self.hop_count += 1
+
+        rise = volume - self.recent_volumes[0][1]
+
+        # An onset right after a pitch change belongs to the note that change started
+        if onset > 0.0 and rise >= self.onset_rise and len(self.cents) >= max(self.min_hops, self.onset_window_hops):
+            events.append(self._finish())
+
+        if not (pitch > 0.0 and confidence >= self.min_confidence):
+            if self.cents:
+                self.unvoiced_hops += 1
+                if self.unvoiced_hops > self.max_gap_hops:
+                    events.append(self._finish())
+
+            return [event for event in events if event is not None]
+
+        cents = 1200.0 * math.log2(pitch / self.c0)
+        self.unvoiced_hops = 0
+
+        if not self.cents:
+            self._add(timestamp, cents)
+        elif abs(cents - self.cents_sum / len(self.cents)) > self.stability:
+            self.pending.append((timestamp, cents))
+
+            # The pitch moved on, the pending hops start the next note unless they were
+            # part of the transition
+            if len(self.pending) >= self.min_hops:
+                pending = self.pending
+                events.append(self._finish())
+
+                for pending_timestamp, pending_cents in pending:
+                    if abs(pending_cents - cents) <= self.stability:
+                        self._add(pending_timestamp, pending_cents)
+        else:
+            # An excursion that came back belongs to the note
+            for pending_timestamp, pending_cents in self.pending:
+                self._add(pending_timestamp, pending_cents)
+            self.pending = []
+
+            self._add(timestamp, cents)
+
+        return [event for event in events if event is not None]
+
+
+    def update(self, timestamps, pitches, volumes, confidences, onsets):
+        # Adds a batch of hops (one array per column), returns the events of the notes it ended
+        events = []
+        for hop in zip(timestamps.tolist(), pitches.tolist(), volumes.tolist(), confidences.tolist(), onsets.tolist()):
+            events += self.push(*hop)
+
+        return events
+
+
+    def flush(self):
+        # Ends the current note, e.g. at the end of a file or before a discontinuity
+        if not self.cents:
+            self.reset()
+            return []
+
+        event = self._finish()
+        self.reset()
+
+        return [event] if event is not None else []
+
+
+def segment_notes(analysis_results, hop_size, sample_rate, standard_pitch=440.0):
+    # All note events of a complete analysis (e.g. of a file)
+    segmenter = NoteSegmenter(hop_size, sample_rate, standard_pitch)
+
+    events = segmenter.update(analysis_results["timestamp"],
+                              analysis_results["pitch"],
+                              analysis_results["volume"],
+                              analysis_results["confidence"],
+                              analysis_results["onset"])
+
+    return events + segmenter.flush()
@@ -1,17 +1,42 @@
 import sys 
 import math
 import numpy as np
-import pyaudio
-import aubio
 import time
-import copy
+import queue
 
-from multiprocessing import Process, Manager, Queue
+from collections import namedtuple, deque
+from multiprocessing import Process, Event, Queue, RawArray
 
 import note_helper
+from ring_buffer import ResultRingBuffer
+from median_filter import StreamingMedianFilter
+from profiling import StageProfiler
+from note_segmenter import NoteSegmenter
+from history_pyramid import HistoryPyramid
+from session_recording import SessionWriter, SessionReader, replay_process
+from audio_source import create_microphone, terminate_pyaudio, STAT_NAMES, GAP_HOPS
 
+# Pitch of the entries that stand in for hops lost before the analysis
+GAP_PITCH = -1.0
 
-def list_audio_devices():
+# Profiled stages, all but the last one run in the tracking process
+TRACKING_STAGES = ("audio_read", "pitch", "onset", "volume", "publish", "filter")
+
+# Note events kept by PitchTracker.update()
+MAX_NOTE_EVENTS = 1024
+
+
+_audio_devices = None
+
+
+def list_audio_devices(refresh=False):
+    # Enumerating devices is slow, so the result is cached until a refresh is requested
+    global _audio_devices
+
+    if _audio_devices is not None and not refresh:
+        return list(_audio_devices)
+
+    import pyaudio
     pA = pyaudio.PyAudio()
 
     result = []
@@ -22,87 +47,442 @@ def list_audio_devices():
         if (pA.get_device_info_by_host_api_device_index(0, i).get('maxInputChannels')) > 0:
             result.append((pA.get_device_info_by_host_api_device_index(0, i).get('name'), i))
 
-    return result
+    pA.terminate()
 
+    _audio_devices = result
 
-def tracking_process(sample_rate,
-                     hop_size,
-                     buffer_size,
-                     device_index,
-                     pitch_detection_method,
-                     onset_detection_method,
-                     silence_threshold,
-                     analysis_results,
-                     analysis_window_len,
-                     stop):
+    return list(result)
 
-    pA = pyaudio.PyAudio()
 
-    # Open microphone stream
-    mic = pA.open(format=pyaudio.paFloat32, 
-                  channels=1,
-                  rate=sample_rate, 
-                  input=True,
-                  frames_per_buffer=hop_size,
-                  input_device_index=device_index)
-
-    # Initialize pitch detection
-    pDetection = aubio.pitch(method=pitch_detection_method, 
-                                buf_size=buffer_size,
-                                hop_size=hop_size, 
-                                samplerate=sample_rate)
-
-    if onset_detection_method is not None:
-        oDetection = aubio.onset(method=onset_detection_method, 
-                                buf_size=buffer_size,
-                                hop_size=hop_size, 
-                                samplerate=sample_rate)    
-
-    # Set to Hz
-    pDetection.set_unit("Hz")
-    
-    # Amplitudes lower than that will be considered silence (in dB)
-    pDetection.set_silence(silence_threshold)
+class PitchDetector():
+    """
+    Interface of the pitch detection backends. A detector is fed consecutive hops
+    and looks at the last `buffer_size` samples for every one of them.
+    """
+
+    def set_silence(self, silence_threshold):
+        raise NotImplementedError()
+
+
+    def set_tolerance(self, tolerance):
+        raise NotImplementedError()
+
+
+    def detect_batch(self, hops):
+        # Returns arrays of the pitches (in Hz, 0 if unvoiced) and confidences of the (n, hop_size) `hops`
+        raise NotImplementedError()
+
+
+    def detect(self, samples):
+        pitches, confidences = self.detect_batch(samples[np.newaxis])
+        return pitches[0], confidences[0]
+
+
+class AubioDetector(PitchDetector):
+    """
+    One of aubio's pitch detection methods, called once per hop.
+    """
+
+    def __init__(self, method, buffer_size, hop_size, sample_rate, silence_threshold):
+        import aubio
+        self.pDetection = aubio.pitch(method=method, 
+                                      buf_size=buffer_size,
+                                      hop_size=hop_size, 
+                                      samplerate=sample_rate)
+
+        # Set to Hz
+        self.pDetection.set_unit("Hz")
+        
+        # Amplitudes lower than that will be considered silence (in dB)
+        self.pDetection.set_silence(silence_threshold)
+
+
+    def set_silence(self, silence_threshold):
+        self.pDetection.set_silence(silence_threshold)
+
+
+    def set_tolerance(self, tolerance):
+        self.pDetection.set_tolerance(tolerance)
+
+
+    def detect(self, samples):
+        pitch = self.pDetection(samples)[0]
+        return pitch, self.pDetection.get_confidence()
+
+
+    def detect_batch(self, hops):
+        pitches = np.zeros(len(hops))
+        confidences = np.zeros(len(hops))
+        for i, samples in enumerate(hops):
+            pitches[i], confidences[i] = self.detect(samples)
+
+        return pitches, confidences
 
-    while not stop.is_set():
-        data = mic.read(hop_size, exception_on_overflow=False)
 
-        samples = np.fromstring(data, dtype=aubio.float_type)
+class YinDetector(PitchDetector):
+    """
+    YIN in pure NumPy. The difference functions of all hops of a batch are
+    computed with one FFT over all their windows, so the Python overhead is
+    paid once per batch instead of once per hop. Meant for offline analysis
+    and for catching up after a stall, where many hops arrive at once.
+    """
+
+    TOLERANCE = 0.15        # Threshold of the cumulative mean normalized difference
+    MIN_LAG = 2             # in samples
+    CHUNK_HOPS = 16         # Hops transformed at once, larger chunks fall out of the cache
+
+    def __init__(self, buffer_size, hop_size, sample_rate, silence_threshold):
+        self.buffer_size = buffer_size
+        self.hop_size = hop_size
+        self.sample_rate = sample_rate
+        self.silence_threshold = silence_threshold
+        self.tolerance = YinDetector.TOLERANCE
+
+        # Lags 0 .. max_lag - 1 are compared over windows of max_lag samples
+        self.max_lag = buffer_size // 2
+        # Long enough for the correlation not to wrap around; 1.5 times a power of two
+        # for the usual buffer sizes, which pocketfft handles as fast as a power of two
+        self.fft_size = buffer_size + self.max_lag
+
+        # The samples of the previous hops that are still part of the next window
+        self.history = np.zeros(max(buffer_size - hop_size, 0))
+
+
+    def set_silence(self, silence_threshold):
+        self.silence_threshold = silence_threshold
+
+
+    def set_tolerance(self, tolerance):
+        self.tolerance = tolerance
+
+
+    def detect_batch(self, hops):
+        if len(hops) <= YinDetector.CHUNK_HOPS:
+            return self._detect_chunk(hops)
+
+        results = [self._detect_chunk(hops[i:i + YinDetector.CHUNK_HOPS]) for i in range(0, len(hops), YinDetector.CHUNK_HOPS)]
+        return np.concatenate([pitches for pitches, _ in results]), np.concatenate([confidences for _, confidences in results])
+
+
+    def _detect_chunk(self, hops):
+        num_hops = len(hops)
+        if num_hops == 0:
+            return np.zeros(0), np.zeros(0)
+
+        # The window of every hop ends with its last sample
+        signal = np.concatenate((self.history, np.asarray(hops, dtype=np.float64).ravel()))
+        ends = len(self.history) + self.hop_size * np.arange(1, num_hops + 1)
+        windows = np.lib.stride_tricks.sliding_window_view(signal, self.buffer_size)[ends - self.buffer_size]
+        self.history = signal[len(signal) - len(self.history):]
+
+        # Difference function d(lag) = E(0) + E(lag) - 2 r(lag), with the energies E of the
+        # windows starting at lag and the autocorrelation r computed via FFT
+        W = self.max_lag
+        spectrum = np.fft.rfft(windows, self.fft_size)
+        head_spectrum = np.fft.rfft(windows[:, :W], self.fft_size)
+        correlation = np.fft.irfft(spectrum * np.conj(head_spectrum), self.fft_size)[:, :W]
+
+        energy = np.concatenate((np.zeros((num_hops, 1)), np.cumsum(windows**2, axis=1)), axis=1)
+        lagged_energy = energy[:, W:2 * W] - energy[:, :W]
+        difference = np.maximum(lagged_energy[:, :1] + lagged_energy - 2.0 * correlation, 0.0)
+        difference[:, 0] = 0.0
+
+        # Cumulative mean normalized difference
+        lags = np.arange(W)
+        cumulative = np.cumsum(difference, axis=1)
+        normalized = np.ones_like(difference)
+        np.divide(difference * lags, cumulative, out=normalized, where=cumulative > 0.0)
+
+        # The first dip below the tolerance, at its local minimum
+        inner = normalized[:, YinDetector.MIN_LAG:W - 1]
+        candidates = (inner < self.tolerance) & (inner <= normalized[:, YinDetector.MIN_LAG + 1:W])
+        found = np.any(candidates, axis=1)
+        rows = np.arange(num_hops)
+        lag = np.where(found, np.argmax(candidates, axis=1), np.argmin(inner, axis=1)) + YinDetector.MIN_LAG
+
+        # Parabolic interpolation between the neighbouring lags
+        before, at, after = normalized[rows, lag - 1], normalized[rows, lag], normalized[rows, lag + 1]
+        curvature = before - 2.0 * at + after
+        shift = np.zeros(num_hops)
+        np.divide(before - after, 2.0 * curvature, out=shift, where=curvature > 0.0)
+
+        pitches = np.where(found, self.sample_rate / (lag + shift), 0.0)
+        confidences = np.clip(1.0 - at, 0.0, 1.0)
+
+        # Same silence gate as aubio, on the samples of the hop
+        volumes = 10 * np.log10(np.mean(np.square(hops, dtype=np.float64), axis=1))
+        pitches[volumes < self.silence_threshold] = 0.0
+
+        return pitches, confidences
+
+
+# Pitch detection methods with a backend of their own, all others are aubio methods
+PITCH_DETECTORS = {"numpy_yin": YinDetector}
+
+
+def create_pitch_detector(method, buffer_size, hop_size, sample_rate, silence_threshold):
+    if method in PITCH_DETECTORS:
+        return PITCH_DETECTORS[method](buffer_size, hop_size, sample_rate, silence_threshold)
+
+    return AubioDetector(method, buffer_size, hop_size, sample_rate, silence_threshold)
+
+
+class HopAnalyzer():
+
+    def __init__(self, sample_rate,
+                       hop_size,
+                       buffer_size,
+                       pitch_detection_method,
+                       onset_detection_method,
+                       silence_threshold):
+
+        self.sample_rate = sample_rate
+        self.hop_size = hop_size
+        self.buffer_size = buffer_size
+        self.silence_threshold = silence_threshold
+        self.tolerance = None
+
+        self.set_pitch_detection_method(pitch_detection_method)
 
-        pitch = pDetection(samples)[0]
         if onset_detection_method is not None:
-            onset = oDetection(samples)
+            import aubio
+            self.oDetection = aubio.onset(method=onset_detection_method, 
+                                          buf_size=buffer_size,
+                                          hop_size=hop_size, 
+                                          samplerate=sample_rate)
+        else:
+            self.oDetection = None
+
+
+    def set_pitch_detection_method(self, pitch_detection_method):
+        # Initialize pitch detection, see PITCH_DETECTORS
+        self.pitch_detector = create_pitch_detector(pitch_detection_method,
+                                                    self.buffer_size,
+                                                    self.hop_size,
+                                                    self.sample_rate,
+                                                    self.silence_threshold)
+
+        if self.tolerance is not None:
+            self.pitch_detector.set_tolerance(self.tolerance)
+
+
+    def set_silence(self, silence_threshold):
+        self.silence_threshold = silence_threshold
+        self.pitch_detector.set_silence(silence_threshold)
+
+
+    def set_tolerance(self, tolerance):
+        self.tolerance = tolerance
+        self.pitch_detector.set_tolerance(tolerance)
+
+
+    def __call__(self, samples):
+        pitch, confidence = self.pitch_detector.detect(samples)
+        if self.oDetection is not None:
+            onset = self.oDetection(samples)[0]
         else:
             onset = 0.0
-        confidence = pDetection.get_confidence()
 
         # Compute volume
         volume = 10 * np.log10(np.sum(samples**2)/len(samples))
 
-        analysis_results.append((time.time(), pitch, volume, confidence, onset))
+        return pitch, volume, confidence, onset
+
+
+    def analyze_batch(self, hops, profiler=None):
+        # Same as calling the analyzer for every row of `hops`, but with the volumes
+        # of all hops computed at once and the pitches detected in one call
+        if len(hops) == 0:
+            return []
+
+        start = time.perf_counter()
+        volumes = 10 * np.log10(np.mean(np.square(hops, dtype=np.float64), axis=1))
+        volume_time = time.perf_counter()
+
+        pitches, confidences = self.pitch_detector.detect_batch(hops)
+        pitch_time = time.perf_counter()
+
+        if profiler is not None:
+            profiler.record("volume", (volume_time - start) / len(hops))
+            profiler.record("pitch", (pitch_time - volume_time) / len(hops))
+
+        onsets = np.zeros(len(hops))
+        if self.oDetection is not None:
+            for i, samples in enumerate(hops):
+                start = time.perf_counter()
+                onsets[i] = self.oDetection(samples)[0]
+
+                if profiler is not None:
+                    profiler.record("onset", time.perf_counter() - start)
 
-        if (len(analysis_results) > analysis_window_len):
-            analysis_results.pop(0)
+        return list(zip(pitches.tolist(), volumes.tolist(), confidences.tolist(), onsets.tolist()))
+
+
+def tracking_process(sample_rate,
+                     hop_size,
+                     buffer_size,
+                     source,
+                     pitch_detection_method,
+                     onset_detection_method,
+                     silence_threshold,
+                     callback_capture,
+                     analysis_results,
+                     stats,
+                     profiler,
+                     recording_path,
+                     control,
+                     stop,
+                     data_ready):
+
+    # Audio and results are also written to a session file if requested
+    recorder = SessionWriter(recording_path, sample_rate, hop_size, buffer_size) if recording_path else None
+
+    # Open the audio input
+    mic = source
+    mic.open(sample_rate, hop_size, stats)
+
+    # Clock frame the next hop of the microphone should start at
+    expected_frame = 0
+
+    # A device switch drains the old microphone before the new one takes over
+    next_mic = None
+
+    # Timestamps stay increasing across device switches, whatever the clock of the new device says
+    last_timestamp = -np.inf
+    earliest_start_time = -np.inf
+
+    analyze_hop = HopAnalyzer(sample_rate, 
+                              hop_size, 
+                              buffer_size, 
+                              pitch_detection_method, 
+                              onset_detection_method, 
+                              silence_threshold)
+
+    while not stop.is_set() and not mic.exhausted:
+        # Apply settings changed by the main process
+        while True:
+            try:
+                command, value = control.get_nowait()
+            except queue.Empty:
+                break
+
+            if command == "silence_threshold":
+                analyze_hop.set_silence(value)
+            elif command == "tolerance":
+                analyze_hop.set_tolerance(value)
+            elif command == "pitch_detection_method":
+                analyze_hop.set_pitch_detection_method(value)
+            elif command == "device_index":
+                # Open the new stream first, so that a failure leaves the old one running
+                try:
+                    new_mic = create_microphone(value, callback_capture)
+                    new_mic.open(sample_rate, hop_size, stats)
+                except (IOError, OSError) as e:
+                    print("Could not open audio device {index}: {error}".format(index=value, error=e))
+                else:
+                    if next_mic is not None:
+                        next_mic.close()
+                    next_mic = new_mic
+
+        # All hops captured since the last iteration, usually one. They are
+        # timestamped from the sample clock of the stream.
+        # The read time includes waiting for the device.
+        start = time.perf_counter()
+        frame, hops = mic.read_hops(timeout=0.0 if next_mic is not None else 0.1)
+        profiler.record("audio_read", time.perf_counter() - start)
+
+        # Unknown before the first callback of a CallbackMicrophone, but then there is nothing to publish
+        start_time = max(mic.start_time, earliest_start_time) if mic.start_time is not None else None
+
+        # Frames lost in between are marked with gap entries, at most a window full
+        if frame >= expected_frame + hop_size:
+            num_gaps = (frame - expected_frame) // hop_size
+            stats[GAP_HOPS] += num_gaps
+
+            published = time.time()
+            gap_records = []
+            for i in range(max(0, num_gaps - analysis_results.window_len), num_gaps):
+                timestamp = start_time + (expected_frame + (i + 1) * hop_size) / sample_rate
+                gap_records.append((timestamp, GAP_PITCH, -np.inf, 0.0, 0.0, published))
+                analysis_results.append(gap_records[-1])
+                last_timestamp = timestamp
+
+            if recorder is not None:
+                recorder.append(np.zeros((len(gap_records), hop_size), dtype=np.float32), gap_records)
+
+            data_ready.set()
+
+        results = analyze_hop.analyze_batch(hops, profiler)
+
+        start = time.perf_counter()
+        published = time.time()
+        records = []
+        for i, (pitch, volume, confidence, onset) in enumerate(results):
+            timestamp = start_time + (frame + (i + 1) * hop_size) / sample_rate
+            records.append((timestamp, pitch, volume, confidence, onset, published))
+            analysis_results.append(records[-1])
+            last_timestamp = timestamp
+
+        if len(results) > 0:
+            profiler.record("publish", time.perf_counter() - start)
+
+            # Wakes up the UI if it waits for new results
+            data_ready.set()
+
+            if recorder is not None:
+                recorder.append(hops, records)
+
+        expected_frame = max(expected_frame, frame + len(hops) * hop_size)
+
+        # Everything the old microphone captured is published, the new one starts after it
+        if next_mic is not None and len(hops) == 0:
+            mic.close()
+            mic = next_mic
+            next_mic = None
+            expected_frame = 0
+            earliest_start_time = last_timestamp
+
+    if next_mic is not None:
+        next_mic.close()
+    mic.close()
+    terminate_pyaudio()
+    analysis_results.close()
+
+    if recorder is not None:
+        recorder.close()
+
+
+# Read-only column arrays of the current analysis window. `sequence` is the number of
+# hops written so far, i.e. the last entry is hop number sequence - 1.
+AnalysisSnapshot = namedtuple("AnalysisSnapshot", ["sequence", "timestamps", "pitches", "volumes", "confidences", "onsets", "publish_times"])
 
 
 class PitchTracker():
 
-    def __init__(self, device_index, 
+    def __init__(self, device_index=None, 
                        buffer_size=4096, 
                        sample_rate=44100,        
                        analysis_window=30,        # in seconds
                        filter_window=0.2,          # in seconds
                        silence_threshold=-50,     # in dB
-                       lowest_frequency=65.4064): # in Hz
+                       lowest_frequency=65.4064,  # in Hz
+                       callback_capture=True,     # If False, the microphone is read with blocking reads
+                       source=None,               # An AudioSource to use instead of the device
+                       onset_detection_method=None,  # aubio onset method, None disables onset detection
+                       standard_pitch=440.0,      # in Hz, for the note events
+                       pitch_detection_method="default"):  # aubio method or one of PITCH_DETECTORS
 
         self.device_index = device_index
+        self.source = source
         self.sample_rate = sample_rate
         self.buffer_size = buffer_size
         self.silence_threshold = silence_threshold
+        self.callback_capture = callback_capture
 
         # Pitch detection parameters
-        self.pitch_detection_method = "default"
-        self.onset_detection_method = None
+        self.pitch_detection_method = pitch_detection_method
+        self.onset_detection_method = onset_detection_method
+        self.tolerance = None
         self.hop_size = int(math.ceil((1 / lowest_frequency) * sample_rate))
 
         if (self.hop_size > self.buffer_size):
@@ -116,61 +496,262 @@ class PitchTracker():
         if (self.filter_window_len > self.analysis_window_len):
             raise ValueError("Filter window length must be smaller than analysis length!")        
 
-        self.manager = Manager()     
-
-
-    def start_tracking(self):
-        self.analysis_results = self.manager.list()    
-        self.stop = self.manager.Event()   
+        self.analysis_results = None
+        self.results_sequence = 0
+        self.background_process = None
+
+        # (result buffer, snapshot) of the last snapshot(), reused until a hop is published
+        self.cached_snapshot = None
+
+        # Counters of the tracking process, see stats()
+        self.counters = RawArray("q", len(STAT_NAMES))
+
+        # Stage timings, see profile()
+        self.profiler = StageProfiler(TRACKING_STAGES)
+
+        # Note events and the downsampled history beyond the analysis window, see update()
+        self.note_segmenter = NoteSegmenter(self.hop_size, self.sample_rate, standard_pitch)
+        self.note_events = deque(maxlen=MAX_NOTE_EVENTS)
+        self.history = HistoryPyramid(self.hop_size / self.sample_rate)
+        self.events_sequence = 0
+        self.update_sequence = None
+
+
+    def start_tracking(self, recording_path=None):
+        # If `recording_path` is given, the session is recorded to that file (see session_recording)
+        self.analysis_results = ResultRingBuffer(self.analysis_window_len)
+        self.counters[:] = [0] * len(STAT_NAMES)
+        self.profiler.reset()
+        self.stop = Event()
+        self.data_ready = Event()
+        self.control = Queue()
+        if self.tolerance is not None:
+            self.control.put(("tolerance", self.tolerance))
+        self.median_filter = StreamingMedianFilter(self.filter_window_len, self.analysis_window_len)
+        self.reset_history()
         
         self.background_process = Process(target=tracking_process, args=(self.sample_rate,
                                                                          self.hop_size,
                                                                          self.buffer_size,
-                                                                         self.device_index,
+                                                                         self.source if self.source is not None else create_microphone(self.device_index, self.callback_capture),
                                                                          self.pitch_detection_method,
                                                                          self.onset_detection_method,
                                                                          self.silence_threshold,
+                                                                         self.callback_capture,
                                                                          self.analysis_results, 
-                                                                         self.analysis_window_len,
-                                                                         self.stop))             
+                                                                         self.counters,
+                                                                         self.profiler,
+                                                                         recording_path,
+                                                                         self.control,
+                                                                         self.stop,
+                                                                         self.data_ready))             
         self.background_process.start()       
 
 
+    def start_replay(self, path, speed=1.0, start_time=None):
+        # Plays back the results of a recorded session instead of tracking live input,
+        # starting at the hop captured at `start_time` (wall clock time)
+        if not (speed > 0.0 and math.isfinite(speed)):
+            raise ValueError("Replay speed must be greater than 0!")
+
+        reader = SessionReader(path)
+        if (reader.sample_rate, reader.hop_size) != (self.sample_rate, self.hop_size):
+            raise ValueError("The recording uses a sample rate of {sample_rate} Hz and a hop size of {hop_size}!".format(sample_rate=reader.sample_rate,
+                                                                                                                        hop_size=reader.hop_size))
+
+        self.analysis_results = ResultRingBuffer(self.analysis_window_len)
+        self.counters[:] = [0] * len(STAT_NAMES)
+        self.profiler.reset()
+        self.stop = Event()
+        self.data_ready = Event()
+        self.control = Queue()
+        self.median_filter = StreamingMedianFilter(self.filter_window_len, self.analysis_window_len)
+        self.reset_history()
+
+        self.background_process = Process(target=replay_process, args=(path,
+                                                                        speed,
+                                                                        start_time,
+                                                                        self.analysis_results,
+                                                                        self.stop,
+                                                                        self.data_ready))
+        self.background_process.start()
+
+
+    def is_running(self):
+        # False once the tracking process ended, e.g. because a finite source was exhausted
+        return self.background_process is not None and self.background_process.is_alive()
+
+
+    def latest_sequence(self):
+        # Number of hops published so far, without taking a snapshot
+        if self.background_process is None:
+            return self.results_sequence
+
+        return self.analysis_results.sequence
+
+
+    def wait_for_data(self, timeout=None):
+        # Waits until new results were published since the previous call, or until `timeout`
+        # seconds passed. Returns False on a timeout.
+        ready = self.data_ready.wait(timeout)
+        self.data_ready.clear()
+
+        return ready
+
+
     def stop_tracking(self):
         self.stop.set()
         self.background_process.join()
+        self.close_results()
+
+
+    def close_results(self):
+        # Keeps the final snapshot, which the results are read from once tracking stopped
+        self.snapshot()
+        self.background_process = None
+        self.analysis_results.close()
 
     
-    def get_analysis_results(self):
+    def snapshot(self):
+        # Several calls per frame (update() and rendering) share one bulk transfer
+        if self.cached_snapshot is not None:
+            ring, snapshot = self.cached_snapshot
+            if ring is self.analysis_results and (self.background_process is None or snapshot.sequence == ring.sequence):
+                return snapshot
+
+        self.results_sequence, analysis_results = self.analysis_results.snapshot()
+
         # Perform filtering on the signal
-        if (self.filter_window_len > 0) and (len(self.analysis_results) >= self.filter_window_len):
-            timestamps, pitches, volumes, confidences, onsets = list(map(list, zip(*self.analysis_results)))
+        if (self.filter_window_len > 0) and (len(analysis_results) >= self.filter_window_len):
+            start = time.perf_counter()
 
-            filtered_pitches = copy.copy(pitches)
+            # Gaps are not smoothed over, nor do they take part in the medians of their neighbours
+            analysis_results["pitch"] = self.median_filter(self.results_sequence, analysis_results["pitch"])
 
-            MAX_FACTOR = 1.5
-            for i in range((self.filter_window_len), (len(pitches) - self.filter_window_len)):
-                reference = pitches[(i - self.filter_window_len):(i + self.filter_window_len)]
+            self.profiler.record("filter", time.perf_counter() - start)
 
-                median = np.median(reference)
+        columns = [analysis_results[name] for name in analysis_results.dtype.names]
+        for column in columns:
+            column.flags.writeable = False
 
-                if pitches[i] < median/MAX_FACTOR or pitches[i] > median * MAX_FACTOR:
-                    filtered_pitches[i] = median
+        snapshot = AnalysisSnapshot(self.results_sequence, *columns)
+        self.cached_snapshot = (self.analysis_results, snapshot)
 
-            filtered_analysis_results = list(zip(timestamps, filtered_pitches, volumes, confidences, onsets))
-            
-            return filtered_analysis_results
-        else:
-            return self.analysis_results
+        return snapshot
+
+
+    def stats(self):
+        # Counters of lost input since tracking started, plus the number of hops analyzed
+        result = dict(zip(STAT_NAMES, self.counters[:]))
+        result["hops"] = self.analysis_results.sequence if self.background_process is not None else self.results_sequence
+
+        return result
+
+
+    def get_new_results(self, since=0, final=False):
+        # Results from hop number `since` on whose filtered pitch will not change anymore,
+        # i.e. all but the last filter_window_len hops, or all of them if `final` (once the
+        # tracker has stopped). The `sequence` of the result is the hop number to pass on
+        # the next call. Hops that already left the analysis window are skipped.
+        snapshot = self.snapshot()
+
+        first_sequence = snapshot.sequence - len(snapshot.pitches)
+        end_sequence = snapshot.sequence if final else max(first_sequence, snapshot.sequence - self.filter_window_len)
+        start_sequence = min(max(since, first_sequence), end_sequence)
+
+        selection = slice(start_sequence - first_sequence, end_sequence - first_sequence)
+
+        return AnalysisSnapshot(end_sequence, *(column[selection] for column in snapshot[1:]))
+
+
+    def update(self):
+        # Segments the hops finalized since the previous call into note events, adds them
+        # to the history and returns the new events. Must be called at least once per
+        # analysis window, a note is cut where hops were skipped. Cheap if nothing was published.
+        if self.latest_sequence() == self.update_sequence:
+            return []
+
+        results = self.get_new_results(self.events_sequence)
+        self.update_sequence = self.results_sequence
+
+        events = []
+        if results.sequence - len(results.pitches) > self.events_sequence:
+            events += self.note_segmenter.flush()
+
+        self.events_sequence = results.sequence
+
+        events += self.note_segmenter.update(results.timestamps, results.pitches, results.volumes, results.confidences, results.onsets)
+        self.note_events.extend(events)
+
+        self.history.update(results.timestamps, results.pitches, results.volumes)
+
+        return events
+
+
+    def get_note_events(self, since=0.0):
+        # Events of the notes that ended at or after `since` (wall clock time), oldest first.
+        # Only the last MAX_NOTE_EVENTS are kept.
+        return [event for event in self.note_events if event.end >= since]
+
+
+    def reset_history(self):
+        self.note_segmenter.reset()
+        self.note_events.clear()
+        self.history.reset()
+        self.events_sequence = 0
+        self.update_sequence = None
+
+
+    def profile(self):
+        # Rolling percentiles of the stage timings (in milliseconds)
+        return self.profiler.summary()
+
+
+    def get_analysis_results(self):
+        snapshot = self.snapshot()
+
+        return list(zip(snapshot.timestamps.tolist(), 
+                        snapshot.pitches.tolist(), 
+                        snapshot.volumes.tolist(), 
+                        snapshot.confidences.tolist(), 
+                        snapshot.onsets.tolist()))
+
+
+    def reconfigure(self, command, value):
+        # Changes a setting of the running tracking process without restarting it
+        if self.background_process is not None:
+            self.control.put((command, value))
 
 
     def change_device(self, device_index):
-        self.stop_tracking()
         self.device_index = device_index
-        self.start_tracking()
+        self.reconfigure("device_index", device_index)
 
 
     def set_silence(self, silence_threshold):
-        self.stop_tracking()
         self.silence_threshold = silence_threshold
-        self.start_tracking()
\ No newline at end of file
+        self.reconfigure("silence_threshold", silence_threshold)
+
+
+    def set_pitch_detection_method(self, pitch_detection_method):
+        self.pitch_detection_method = pitch_detection_method
+        self.reconfigure("pitch_detection_method", pitch_detection_method)
+
+
+    def set_tolerance(self, tolerance):
+        self.tolerance = tolerance
+        self.reconfigure("tolerance", tolerance)
+
+if __name__ == "__main__":
+    # python -m pitch_tracker analyze <files>
+    # python -m pitch_tracker stream [options]
+    # python -m pitch_tracker serve [options]
+    if len(sys.argv) > 1 and sys.argv[1] == "analyze":
+        import analyze
+        analyze.main(sys.argv[2:])
+    elif len(sys.argv) > 1 and sys.argv[1] == "stream":
+        import headless
+        headless.main(sys.argv[2:])
+    elif len(sys.argv) > 1 and sys.argv[1] == "serve":
+        import publisher
+        publisher.main(sys.argv[2:])
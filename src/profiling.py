@@ -0,0 +1,120 @@
+import time
+import json
+
+import numpy as np
+
+from multiprocessing import RawArray
+
+
+def latency_percentiles(durations):
+    # durations in seconds, result in milliseconds
+    durations = 1000.0 * np.asarray(durations)
+
+    if len(durations) == 0:
+        return {}
+
+    return {"mean": float(np.mean(durations)),
+            "p50": float(np.percentile(durations, 50)),
+            "p90": float(np.percentile(durations, 90)),
+            "p99": float(np.percentile(durations, 99)),
+            "max": float(np.max(durations))}
+
+
+class StageProfiler():
+    """
+    Keeps the durations of the last `history_len` runs of every stage, so that
+    rolling percentiles can be computed on demand. Recording a duration is a
+    single array write.
+
+    The durations live in shared memory, so a profiler passed to a child
+    process can be written there and read from the parent. Every stage must
+    only be recorded by one process.
+    """
+
+    def __init__(self, stages, history_len=512):
+        self.stages = tuple(stages)
+        self.history_len = history_len
+
+        self.raw_durations = RawArray("d", len(self.stages) * history_len)
+        self.raw_counts = RawArray("q", len(self.stages))
+
+        self._create_views()
+
+
+    def _create_views(self):
+        self.indices = {stage: i for i, stage in enumerate(self.stages)}
+        self.durations = np.frombuffer(self.raw_durations, dtype=np.float64).reshape(len(self.stages), self.history_len)
+        self.counts = np.frombuffer(self.raw_counts, dtype=np.int64)
+
+
+    def __getstate__(self):
+        return {"stages": self.stages,
+                "history_len": self.history_len,
+                "raw_durations": self.raw_durations,
+                "raw_counts": self.raw_counts}
+
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._create_views()
+
+
+    def record(self, stage, duration):
+        # duration in seconds
+        i = self.indices[stage]
+        count = self.counts[i]
+        self.durations[i, count % self.history_len] = duration
+        self.counts[i] = count + 1
+
+
+    def reset(self):
+        self.counts[:] = 0
+
+
+    def stage_durations(self, stage):
+        # Durations of the stage in the history, oldest first
+        i = self.indices[stage]
+        count = int(self.counts[i])
+
+        if count <= self.history_len:
+            return self.durations[i, :count].copy()
+
+        return np.roll(self.durations[i], -(count % self.history_len))
+
+
+    def summary(self):
+        # Rolling percentiles (in milliseconds) and the total number of runs of every stage
+        result = {}
+        for stage in self.stages:
+            result[stage] = latency_percentiles(self.stage_durations(stage))
+            result[stage]["count"] = int(self.counts[self.indices[stage]])
+
+        return result
+
+
+class ProfileLog():
+    """
+    Appends the summaries of a set of profilers to a JSON lines file every
+    `interval` seconds.
+    """
+
+    def __init__(self, path, interval=5.0):
+        self.path = path
+        self.interval = interval
+        self.last_write = time.monotonic()
+
+
+    def update(self, summaries):
+        # `summaries` maps names to callables returning the summary to log
+        now = time.monotonic()
+        if now - self.last_write < self.interval:
+            return
+
+        self.last_write = now
+
+        entry = {"timestamp": time.time()}
+        for name, summary in summaries.items():
+            entry[name] = summary()
+
+        with open(self.path, "at") as f:
+            f.write(json.dumps(entry) + "\n")
@@ -0,0 +1,176 @@
+import sys
+import os
+import stat
+import json
+import asyncio
+import argparse
+import multiprocessing
+
+import numpy as np
+
+from pitch_tracker import PitchTracker
+from settings import read_settings, CONFIG_PATH
+import frame_format
+
+DEFAULT_PORT = 5800
+QUEUE_SIZE = 64             # Pending batches per client before the oldest ones are dropped
+POLL_INTERVAL = 0.02        # in seconds
+HANDSHAKE_TIMEOUT = 1.0     # in seconds
+
+
+class Subscriber():
+    """
+    A connected client: a bounded queue of frame batches and the task that
+    sends them. When the client cannot keep up, the oldest batches are dropped
+    so that it always catches up with the live stream.
+    """
+
+    def __init__(self, writer, encode, queue_size=QUEUE_SIZE):
+        self.writer = writer
+        self.encode = encode
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped_frames = 0
+
+
+    def put(self, frames):
+        if self.queue.full():
+            self.dropped_frames += len(self.queue.get_nowait())
+
+        self.queue.put_nowait(frames)
+
+
+    async def send(self):
+        while True:
+            batches = [await self.queue.get()]
+
+            # Everything that is pending goes out in one write
+            while not self.queue.empty():
+                batches.append(self.queue.get_nowait())
+
+            self.writer.write(self.encode(np.concatenate(batches)))
+            await self.writer.drain()
+
+
+class PitchPublisher():
+    """
+    Fans the finalized frames of one PitchTracker out to any number of clients
+    over TCP or a Unix socket.
+
+    A client may send a JSON line right after connecting, e.g.
+    {"format": "binary", "history": 5.0}, to select the encoding (see
+    frame_format.ENCODERS, default NDJSON) and to receive the last `history`
+    seconds of the analysis window before the live frames.
+    """
+
+    def __init__(self, pitch_tracker, standard_pitch=440.0, queue_size=QUEUE_SIZE):
+        self.pitch_tracker = pitch_tracker
+        self.standard_pitch = standard_pitch
+        self.queue_size = queue_size
+
+        self.next_sequence = 0
+        self.subscribers = set()
+
+
+    async def poll(self):
+        while True:
+            results = self.pitch_tracker.get_new_results(self.next_sequence)
+            self.next_sequence = results.sequence
+
+            if len(results.pitches) > 0 and self.subscribers:
+                frames = frame_format.results_to_frames(results, self.standard_pitch)
+                for subscriber in self.subscribers:
+                    subscriber.put(frames)
+
+            await asyncio.sleep(POLL_INTERVAL)
+
+
+    def history(self, duration):
+        # Frames of the last `duration` seconds that were already published
+        num_hops = int(duration * self.pitch_tracker.sample_rate / self.pitch_tracker.hop_size)
+        results = self.pitch_tracker.get_new_results(max(0, self.next_sequence - num_hops))
+
+        # Newer frames will be part of the next live batch
+        num_frames = len(results.pitches) - (results.sequence - self.next_sequence)
+
+        return frame_format.results_to_frames(results, self.standard_pitch)[:max(0, num_frames)]
+
+
+    async def handle_client(self, reader, writer):
+        try:
+            line = await asyncio.wait_for(reader.readline(), HANDSHAKE_TIMEOUT)
+            request = json.loads(line) if line.strip() else {}
+        except (asyncio.TimeoutError, ValueError):
+            request = {}
+
+        encode = frame_format.ENCODERS.get(request.get("format"), frame_format.encode_ndjson)
+        subscriber = Subscriber(writer, encode, self.queue_size)
+
+        history = float(request.get("history", 0.0))
+        if history > 0.0:
+            frames = self.history(history)
+            if len(frames) > 0:
+                subscriber.put(frames)
+
+        self.subscribers.add(subscriber)
+        try:
+            await subscriber.send()
+        except ConnectionError:
+            pass
+        finally:
+            self.subscribers.discard(subscriber)
+            writer.close()
+
+
+    async def serve(self, host=None, port=DEFAULT_PORT, path=None):
+        # Listens on the Unix socket `path` if given, on TCP otherwise
+        if path is not None:
+            # Left over from a previous run
+            if os.path.exists(path) and stat.S_ISSOCK(os.stat(path).st_mode):
+                os.unlink(path)
+
+            server = await asyncio.start_unix_server(self.handle_client, path)
+        else:
+            server = await asyncio.start_server(self.handle_client, host, port)
+
+        async with server:
+            await asyncio.gather(server.serve_forever(), self.poll())
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Publishes the pitch frames of one capture to many local clients")
+    parser.add_argument("--host", default="127.0.0.1", help="TCP address to listen on")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="TCP port to listen on")
+    parser.add_argument("--unix", default=None, help="Listen on this Unix socket instead of TCP")
+    parser.add_argument("--queue-size", type=int, default=QUEUE_SIZE, help="Pending batches per client before the oldest ones are dropped")
+    parser.add_argument("--device", type=int, default=None, help="Input device index (default: from the configuration)")
+    parser.add_argument("--config", default=CONFIG_PATH, help="Configuration file")
+    args = parser.parse_args(argv)
+
+    settings = read_settings(args.config)
+    device_index = settings["device_index"] if args.device is None else args.device
+
+    pitch_tracker = PitchTracker(device_index=device_index,
+                                 analysis_window=settings["analysis_window"],
+                                 filter_window=settings["filter_window"],
+                                 silence_threshold=settings["silence_threshold"],
+                                 onset_detection_method=settings["onset_detection_method"],
+                                 pitch_detection_method=settings["pitch_detection_method"],
+                                 standard_pitch=settings["standard_pitch"])
+
+    publisher = PitchPublisher(pitch_tracker, settings["standard_pitch"], args.queue_size)
+
+    pitch_tracker.start_tracking()
+
+    try:
+        asyncio.run(publisher.serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pitch_tracker.stop_tracking()
+
+
+if __name__ == "__main__":
+    # Pyinstaller fix
+    multiprocessing.freeze_support()
+
+    main(sys.argv[1:])
@@ -0,0 +1,143 @@
+import os
+
+import numpy as np
+
+from multiprocessing import shared_memory
+
+
+# `timestamp` is the capture time of the last sample of the hop, `published` the
+# time the result was written (both wall clock time in seconds)
+RESULT_DTYPE = np.dtype([("timestamp", np.float64),
+                         ("pitch", np.float64),
+                         ("volume", np.float64),
+                         ("confidence", np.float64),
+                         ("onset", np.float64),
+                         ("published", np.float64)])
+
+# Header slots (int64)
+SEQUENCE = 0        # Total number of records ever written
+WRITE_INDEX = 1     # Slot the next record will be written to
+HEADER_LEN = 8      # Leaves room for future counters
+
+
+class ResultRingBuffer():
+    """
+    Fixed-capacity single-producer ring buffer in shared memory.
+
+    Every record is written twice, at slot i and at slot i + capacity, so the
+    most recent `window_len` records are always one contiguous slice of the
+    data array. Readers can therefore get a zero-copy view of the window
+    without taking a lock. The writer never waits for the readers; a reader
+    that needs a consistent copy checks the sequence counter before and after
+    copying and retries if the writer lapped the slack area in between.
+    """
+
+    def __init__(self, window_len, slack=None, dtype=RESULT_DTYPE, name=None):
+        self.window_len = int(window_len)
+        self.slack = int(slack) if slack is not None else max(64, self.window_len // 4)
+        self.capacity = self.window_len + self.slack
+        self.dtype = np.dtype(dtype)
+
+        header_size = HEADER_LEN * np.dtype(np.int64).itemsize
+        data_size = 2 * self.capacity * self.dtype.itemsize
+
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=header_size + data_size)
+            self.owner_pid = os.getpid()
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            self.owner_pid = None
+
+        self._map()
+
+        if self.owner_pid is not None:
+            self.header[:] = 0
+
+
+    def _map(self):
+        self.header = np.ndarray((HEADER_LEN,), dtype=np.int64, buffer=self.shm.buf)
+        self.data = np.ndarray((2 * self.capacity,), dtype=self.dtype, buffer=self.shm.buf,
+                               offset=self.header.nbytes)
+
+
+    # Only the name of the segment is sent to other processes, they attach to it
+    def __getstate__(self):
+        return {"window_len": self.window_len,
+                "slack": self.slack,
+                "dtype": self.dtype,
+                "name": self.shm.name}
+
+
+    def __setstate__(self, state):
+        self.__init__(state["window_len"], state["slack"], state["dtype"], state["name"])
+
+
+    @property
+    def sequence(self):
+        return int(self.header[SEQUENCE])
+
+
+    def __len__(self):
+        return min(self.sequence, self.window_len)
+
+
+    def append(self, record):
+        index = int(self.header[WRITE_INDEX])
+
+        self.data[index] = record
+        self.data[index + self.capacity] = record
+
+        # Publish the record only after it has been fully written
+        self.header[WRITE_INDEX] = (index + 1) % self.capacity
+        self.header[SEQUENCE] += 1
+
+
+    def _window_slice(self, sequence):
+        count = min(sequence, self.window_len)
+        end = sequence % self.capacity + self.capacity
+
+        return slice(end - count, end)
+
+
+    def view(self):
+        # Zero-copy, read-only view of the current window. May be overwritten by
+        # the writer while it is being used, see snapshot() for a consistent copy.
+        view = self.data[self._window_slice(self.sequence)]
+        view.flags.writeable = False
+
+        return view
+
+
+    def snapshot(self):
+        while True:
+            sequence = self.sequence
+            result = self.data[self._window_slice(sequence)].copy()
+
+            # The oldest copied slot is reused after `slack` further writes
+            if self.sequence - sequence < self.slack:
+                return sequence, result
+
+
+    def read_since(self, sequence):
+        # Copy of the records written since `sequence`, at most a window full. Returns
+        # the sequence number to pass on the next call and the records.
+        while True:
+            end_sequence = self.sequence
+            count = min(end_sequence - sequence, self.window_len)
+
+            end = end_sequence % self.capacity + self.capacity
+            result = self.data[end - count:end].copy()
+
+            if self.sequence - end_sequence < self.slack:
+                return end_sequence, result
+
+
+    def close(self):
+        # Drop all views before releasing the mapping
+        self.header = None
+        self.data = None
+        self.shm.close()
+
+        # Forked children inherit the object as is, only the creator may unlink
+        if self.owner_pid == os.getpid():
+            self.shm.unlink()
@@ -0,0 +1,219 @@
+import os
+import time
+import queue
+import threading
+
+import numpy as np
+
+from ring_buffer import RESULT_DTYPE
+
+# File layout: a header followed by fixed-size chunks of HOPS_PER_CHUNK hops.
+# Every chunk holds the number of valid hops, the raw audio of its hops and
+# one column per analysis result field, so hop i is always found in chunk
+# i // HOPS_PER_CHUNK without reading anything else. Only the last chunk may
+# be partially filled.
+
+MAGIC = b"PTSESS01"
+HOPS_PER_CHUNK = 256
+
+HEADER_DTYPE = np.dtype([("magic", "S8"),
+                         ("sample_rate", "<i8"),
+                         ("hop_size", "<i8"),
+                         ("buffer_size", "<i8"),
+                         ("hops_per_chunk", "<i8")])
+HEADER_SIZE = 64
+
+
+def create_chunk_dtype(hop_size, hops_per_chunk):
+    return np.dtype([("num_hops", "<i8"),
+                     ("audio", "<f4", (hops_per_chunk * hop_size,))] +
+                    [(name, RESULT_DTYPE[name].newbyteorder("<"), (hops_per_chunk,)) for name in RESULT_DTYPE.names])
+
+
+class SessionWriter():
+    """
+    Appends audio and analysis results to a session file. append() only
+    queues the data, the chunks are assembled and written by a background
+    thread so that the caller never waits for the disk.
+    """
+
+    def __init__(self, path, sample_rate, hop_size, buffer_size, hops_per_chunk=HOPS_PER_CHUNK):
+        self.hop_size = hop_size
+        self.hops_per_chunk = hops_per_chunk
+        self.chunk_dtype = create_chunk_dtype(hop_size, hops_per_chunk)
+
+        header = np.zeros(1, dtype=HEADER_DTYPE)
+        header[0] = (MAGIC, sample_rate, hop_size, buffer_size, hops_per_chunk)
+
+        self.file = open(path, "wb")
+        self.file.write(header.tobytes().ljust(HEADER_SIZE, b"\0"))
+
+        self.chunk = np.zeros((), dtype=self.chunk_dtype)
+        self.queue = queue.Queue()
+
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+
+    def append(self, audio, records):
+        # `audio` has one row of samples per record, it is copied before returning
+        self.queue.put((np.array(audio, dtype=np.float32), records))
+
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+
+            audio, records = item
+            for samples, record in zip(audio, records):
+                self._add(samples, record)
+
+        # The last chunk is written even if it is not full
+        if self.chunk["num_hops"] > 0:
+            self.file.write(self.chunk.tobytes())
+
+        self.file.close()
+
+
+    def _add(self, samples, record):
+        i = int(self.chunk["num_hops"])
+
+        self.chunk["audio"][i * self.hop_size:(i + 1) * self.hop_size] = samples
+        for name, value in zip(RESULT_DTYPE.names, record):
+            self.chunk[name][i] = value
+
+        self.chunk["num_hops"] = i + 1
+
+        if i + 1 == self.hops_per_chunk:
+            self.file.write(self.chunk.tobytes())
+            self.chunk[...] = 0
+
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+
+
+class SessionReader():
+    """
+    Memory-mapped access to a session file. Hops are addressed by their
+    index in the recording.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            header = np.frombuffer(f.read(HEADER_SIZE)[:HEADER_DTYPE.itemsize], dtype=HEADER_DTYPE)
+
+        if len(header) == 0 or header[0]["magic"] != MAGIC:
+            raise ValueError("'{path}' is not a session recording".format(path=path))
+
+        self.sample_rate = int(header[0]["sample_rate"])
+        self.hop_size = int(header[0]["hop_size"])
+        self.buffer_size = int(header[0]["buffer_size"])
+        self.hops_per_chunk = int(header[0]["hops_per_chunk"])
+
+        chunk_dtype = create_chunk_dtype(self.hop_size, self.hops_per_chunk)
+        num_chunks = (os.path.getsize(path) - HEADER_SIZE) // chunk_dtype.itemsize
+
+        if num_chunks > 0:
+            self.chunks = np.memmap(path, dtype=chunk_dtype, mode="r", offset=HEADER_SIZE, shape=(num_chunks,))
+            self.num_hops = (num_chunks - 1) * self.hops_per_chunk + int(self.chunks[-1]["num_hops"])
+        else:
+            self.chunks = np.zeros(0, dtype=chunk_dtype)
+            self.num_hops = 0
+
+
+    def __len__(self):
+        return self.num_hops
+
+
+    def _ranges(self, start, end):
+        # (chunk, first, last) for every chunk overlapping hops [start, end)
+        start = max(0, start)
+        end = min(end, self.num_hops)
+
+        for chunk in range(start // self.hops_per_chunk, (end - 1) // self.hops_per_chunk + 1 if end > start else 0):
+            first = max(start - chunk * self.hops_per_chunk, 0)
+            last = min(end - chunk * self.hops_per_chunk, self.hops_per_chunk)
+            yield chunk, first, last
+
+
+    def results(self, start, end):
+        ranges = list(self._ranges(start, end))
+        results = np.zeros(sum(last - first for _, first, last in ranges), dtype=RESULT_DTYPE)
+
+        position = 0
+        for chunk, first, last in ranges:
+            for name in RESULT_DTYPE.names:
+                results[name][position:position + last - first] = self.chunks[chunk][name][first:last]
+            position += last - first
+
+        return results
+
+
+    def audio(self, start, end):
+        hop_size = self.hop_size
+
+        return np.concatenate([self.chunks[chunk]["audio"][first * hop_size:last * hop_size]
+                               for chunk, first, last in self._ranges(start, end)] or [np.zeros(0, dtype=np.float32)])
+
+
+    def timestamp(self, index):
+        return float(self.chunks[index // self.hops_per_chunk]["timestamp"][index % self.hops_per_chunk])
+
+
+    def find(self, timestamp):
+        # Index of the first hop captured at or after `timestamp`. Gaps are recorded
+        # as hops as well, so the chunk can be computed from the hop duration. Clock
+        # drift or a device switch may move it by a chunk, the hop is then found by
+        # bisecting the timestamps of that chunk.
+        if self.num_hops == 0:
+            return 0
+
+        hop_time = self.hop_size / self.sample_rate
+        index = int(round((timestamp - self.timestamp(0)) / hop_time))
+        chunk = min(max(index, 0), self.num_hops - 1) // self.hops_per_chunk
+
+        # The chunk whose first hop is the last one before `timestamp` (or the first chunk)
+        while chunk > 0 and self.timestamp(chunk * self.hops_per_chunk) >= timestamp:
+            chunk -= 1
+        while (chunk + 1) * self.hops_per_chunk < self.num_hops and self.timestamp((chunk + 1) * self.hops_per_chunk) < timestamp:
+            chunk += 1
+
+        num_hops = min(self.hops_per_chunk, self.num_hops - chunk * self.hops_per_chunk)
+        timestamps = self.chunks[chunk]["timestamp"][:num_hops]
+
+        return chunk * self.hops_per_chunk + int(np.searchsorted(timestamps, timestamp, side="left"))
+
+
+def replay_process(path, speed, start_time, analysis_results, stop, data_ready):
+    # Feeds the results of a recording into the ring buffer like tracking_process would,
+    # `speed` times as fast as they were recorded
+    reader = SessionReader(path)
+
+    start = 0 if start_time is None else reader.find(start_time)
+
+    # What precedes the start point fills the window right away
+    for record in reader.results(start - analysis_results.window_len, start):
+        analysis_results.append(record)
+    data_ready.set()
+
+    hop_time = reader.hop_size / reader.sample_rate / speed
+    replay_start = time.monotonic()
+    position = start
+
+    while not stop.is_set() and position < len(reader):
+        due = start + int((time.monotonic() - replay_start) / hop_time)
+
+        records = reader.results(position, due)
+        for record in records:
+            analysis_results.append(record)
+        if len(records) > 0:
+            data_ready.set()
+        position = max(position, min(due, len(reader)))
+
+        time.sleep(min(hop_time, 0.1))
+
+    analysis_results.close()
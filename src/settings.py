@@ -0,0 +1,68 @@
+import os
+import configparser
+
+CONFIG_PATH = "config.cfg"
+
+
+def read_settings(path=CONFIG_PATH):
+    # Defaults, overridden by the configuration file if it exists
+    settings = {
+        # Audio
+        "device_index": 0,
+        "standard_pitch": 440.0,
+        "analysis_window": 10.0,
+        "filter_window": 0.2,
+        "silence_threshold": -60.0,
+        "pitch_detection_method": "default",
+        "onset_detection_method": None,
+        "input_channels": 1,
+        "additional_device_indices": [],
+
+        # Graphics
+        "offset_x": 0,
+        "offset_y": 0,
+        "default_width": 1024,
+        "default_height": 768,
+        "target_fps": 60,
+        "adaptive_fps": False,
+        "start_in_fullscreen": False,
+        "multi_input_layout": "overlay",
+
+        # Debug
+        "profile_log": None,
+        "profile_log_interval": 5.0,
+    }
+
+    if not os.path.exists(path):
+        return settings
+
+    config = configparser.ConfigParser()
+    config.read(path)
+
+    audio_settings = config['audio']
+    settings["device_index"] = int(audio_settings['InputDeviceId'])
+    settings["standard_pitch"] = float(audio_settings['StandardPitch'])
+    settings["analysis_window"] = float(audio_settings['AnalysisWindow'])
+    settings["filter_window"] = float(audio_settings['FilterWindow'])
+    settings["silence_threshold"] = float(audio_settings['SilenceThreshold'])
+    settings["pitch_detection_method"] = audio_settings.get('PitchDetection', settings["pitch_detection_method"])
+    settings["onset_detection_method"] = audio_settings.get('OnsetDetection', settings["onset_detection_method"]) or None
+    settings["input_channels"] = audio_settings.getint('InputChannels', settings["input_channels"])
+    settings["additional_device_indices"] = [int(index) for index in audio_settings.get('AdditionalInputDeviceIds', '').split(",") if index.strip()]
+
+    graphics_settings = config['graphics']
+    settings["offset_x"] = int(graphics_settings['OffsetX'])
+    settings["offset_y"] = int(graphics_settings['OffsetY'])
+    settings["default_width"] = int(graphics_settings['DefaultWidth'])
+    settings["default_height"] = int(graphics_settings['DefaultHeight'])
+    settings["target_fps"] = int(graphics_settings['TargetFPS'])
+    settings["adaptive_fps"] = graphics_settings.getboolean('AdaptiveFPS', settings["adaptive_fps"])
+    settings["start_in_fullscreen"] = graphics_settings.getboolean('StartInFullscreen')
+    settings["multi_input_layout"] = graphics_settings.get('MultiInputLayout', settings["multi_input_layout"])
+
+    if config.has_section('debug'):
+        debug_settings = config['debug']
+        settings["profile_log"] = debug_settings.get('ProfileLog', '') or None
+        settings["profile_log_interval"] = debug_settings.getfloat('ProfileLogInterval', settings["profile_log_interval"])
+
+    return settings
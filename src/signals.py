@@ -0,0 +1,92 @@
+import numpy as np
+
+# Synthetic test signals. Every generator returns the samples together with the
+# ground truth frequency of every sample (0 where there is no pitch).
+
+AMPLITUDE = 0.3
+
+
+def tone(frequencies, sample_rate, amplitude=AMPLITUDE):
+    phase = 2.0 * np.pi * np.cumsum(frequencies) / sample_rate
+    samples = amplitude * np.sin(phase)
+    samples[frequencies <= 0.0] = 0.0
+
+    return samples.astype(np.float32)
+
+
+def silence(duration, sample_rate):
+    num_samples = int(duration * sample_rate)
+
+    return np.zeros(num_samples, dtype=np.float32), np.zeros(num_samples)
+
+
+def sine_sweep(duration, sample_rate, low_frequency=82.41, high_frequency=1046.5):
+    t = np.arange(int(duration * sample_rate)) / sample_rate
+
+    # Exponential sweep, so that every note gets the same amount of time
+    frequencies = low_frequency * np.power(high_frequency / low_frequency, t / duration)
+
+    return tone(frequencies, sample_rate), frequencies
+
+
+def vibrato(duration, sample_rate, frequency=220.0, rate=5.5, depth=50.0):
+    # depth is given in cents
+    t = np.arange(int(duration * sample_rate)) / sample_rate
+
+    frequencies = frequency * np.power(2.0, depth * np.sin(2.0 * np.pi * rate * t) / 1200.0)
+
+    return tone(frequencies, sample_rate), frequencies
+
+
+def noise_bursts(duration, sample_rate, frequency=330.0, burst_length=0.25, period=1.0, seed=0):
+    t = np.arange(int(duration * sample_rate)) / sample_rate
+
+    frequencies = np.full(len(t), frequency)
+    in_burst = np.mod(t, period) < burst_length
+    frequencies[in_burst] = 0.0
+
+    samples = tone(frequencies, sample_rate)
+
+    rng = np.random.default_rng(seed)
+    samples[in_burst] = (AMPLITUDE * rng.standard_normal(np.count_nonzero(in_burst))).astype(np.float32)
+
+    return samples, frequencies
+
+
+def melody(duration, sample_rate, note_length=0.5):
+    # A short tune with a rest, repeated to fill `duration`
+    notes = [220.0, 246.94, 277.18, 293.66, 329.63, 0.0, 329.63, 220.0]
+    note_samples = int(note_length * sample_rate)
+    num_samples = int(duration * sample_rate)
+
+    frequencies = np.resize(np.repeat(notes, note_samples), num_samples)
+
+    return tone(frequencies, sample_rate), frequencies
+
+
+SIGNALS = {
+    "sine_sweep": sine_sweep,
+    "vibrato": vibrato,
+    "noise_bursts": noise_bursts,
+    "silence": silence,
+    "melody": melody,
+}
+
+
+def hop_ground_truth(frequencies, hop_size, buffer_size):
+    # The detector looks at the last `buffer_size` samples when a hop is complete.
+    # A hop is considered voiced if that whole buffer is voiced, the reference
+    # frequency is the one in the middle of the buffer.
+    num_hops = len(frequencies) // hop_size
+
+    hop_ends = (np.arange(num_hops) + 1) * hop_size
+    buffer_starts = np.maximum(hop_ends - buffer_size, 0)
+
+    voiced = frequencies > 0.0
+    unvoiced_count = np.concatenate(([0], np.cumsum(~voiced)))
+    fully_voiced = (unvoiced_count[hop_ends] - unvoiced_count[buffer_starts]) == 0
+    fully_voiced &= hop_ends >= buffer_size
+
+    centers = (buffer_starts + hop_ends) // 2
+
+    return np.where(fully_voiced, frequencies[centers], 0.0)
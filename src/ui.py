@@ -0,0 +1,1031 @@
+import math
+import functools
+import time
+
+import numpy as np
+
+import pygame
+import pygame.freetype
+import pygame.gfxdraw
+from pygame._sdl2.video import Window
+
+import note_helper
+import interpolation
+from note_histogram import NoteHistogram
+from decimation import decimate_min_max
+from profiling import StageProfiler, ProfileLog
+from latency import LatencyMonitor
+
+# def draw_line(surface, color, x0, x1, thickness=1):
+#     center_L1 = (np.array(x0) + np.array(x1)) / 2
+#     length = np.linalg.norm(np.array(x0) - np.array(x1))
+#     angle = math.atan2(x0[1] - x1[1], x0[0] - x1[0])
+
+#     UL = (center_L1[0] + (length / 2) * math.cos(angle) - (thickness / 2) * math.sin(angle),
+#         center_L1[1] + (thickness / 2) * math.cos(angle) + (length / 2) * math.sin(angle))
+#     UR = (center_L1[0] - (length / 2) * math.cos(angle) - (thickness / 2) * math.sin(angle),
+#         center_L1[1] + (thickness / 2) * math.cos(angle) - (length / 2) * math.sin(angle))
+#     BL = (center_L1[0] + (length / 2) * math.cos(angle) + (thickness / 2) * math.sin(angle),
+#         center_L1[1] - (thickness / 2) * math.cos(angle) + (length / 2) * math.sin(angle))
+#     BR = (center_L1[0] - (length / 2) * math.cos(angle) + (thickness / 2) * math.sin(angle),
+#         center_L1[1] - (thickness / 2) * math.cos(angle) - (length / 2) * math.sin(angle))    
+
+#     pygame.gfxdraw.aapolygon(surface, (UL, UR, BR, BL), color)
+#     pygame.gfxdraw.filled_polygon(surface, (UL, UR, BR, BL), color)
+
+
+# def draw_lines(surface, color, closed, coords, thickness=1):
+#     if len(coords) < 2:
+#         return
+
+#     for i in range(1, len(coords)):
+#         draw_line(surface, color, coords[i-1], coords[i], thickness)
+
+#     if closed:
+#         draw_line(surface, color, coords[-1], coords[0], thickness)
+
+
+@functools.lru_cache(maxsize=16)
+def get_font(size):
+    return pygame.freetype.SysFont('Sans', size)
+
+
+@functools.lru_cache(maxsize=512)
+def render_label(text, color, font_size):
+    # Returns the rendered glyphs and their bounding rect
+    return get_font(font_size).render(text, color)
+
+
+class PitchTrackerGraph:
+
+    HIGHEST_PITCH_TO_DISPLAY = 2000.0   # in Hz 
+
+    ANIMATION_DURATION = 0.5            # in seconds
+
+    DEFAULT_FONT_SIZE = 18 # doesn't really matter, since it will be computed on-the-fly
+    TEXT_MARGIN = 0.2
+    MIN_FONT_SIZE = 16
+    MAX_FONT_SIZE = 32
+
+    MIN_OCCURENCE_AGAINST_OUTLIERS = 10 # Outlier detection to prevent erratic scaling behaviour
+
+    BACKGROUND_COLOR = (32, 32, 32)    
+    NOTE_LINE_COLOR = (160, 160, 160)
+    SHARP_NOTE_LINE_COLOR = (96, 96, 96)
+    C_NOTE_LINE_COLOR = (255, 255, 255)
+    FOREGROUND_LINE_COLOR = (255, 165, 0)
+
+    # Curves of several inputs, the first one is the only one with a single input
+    CURVE_COLORS = (FOREGROUND_LINE_COLOR,
+                    (0, 191, 255),
+                    (124, 252, 0),
+                    (255, 105, 180),
+                    (255, 255, 0),
+                    (186, 85, 211),
+                    (64, 224, 208),
+                    (255, 99, 71))
+
+    EXPONENTIAL_SCALING = False         # If False, notes will be spaced equally for all frequencies
+
+    SCROLLING = True                    # If True, only newly arrived samples are drawn while the camera is stable
+
+    INCREMENTAL_CAMERA_BOUNDS = True    # If True, note occurrences are updated with new samples instead of recounted
+
+    DECIMATION_THRESHOLD = 2.0          # Curves with more samples per pixel column are reduced to their min/max per column
+
+    PROFILED_STAGES = ("camera_bounds", "grid", "curve")
+
+    ZOOM_FACTOR = 2.0                   # Change of the visible duration per zoom step
+    MAX_VISIBLE_DURATION = 4 * 3600.0   # in seconds
+
+
+    def __init__(self, screen, bounds, standard_pitch, first_color=0):
+        # The curves use CURVE_COLORS from `first_color` on
+        self.screen = screen
+        self.bounds = bounds
+        self.surface = pygame.Surface(self.bounds[2:4])
+        self.standard_pitch = standard_pitch
+
+        text_rect = get_font(PitchTrackerGraph.DEFAULT_FONT_SIZE).get_rect("W")      
+        self.default_font_height = text_rect.height   
+
+        # Pre-rendered note names and lines, only redrawn when the camera or the size changes
+        self.grid_surface = pygame.Surface(self.bounds[2:4])
+        self.grid_key = None
+        self.note_column_end = 0
+
+        # One pitch curve per input, all with the same horizontal scale
+        self.curve_layers = []
+        self.curve_dx = 0.0
+        self.first_color = first_color
+
+        # Seconds shown, None for the analysis window. Longer durations are drawn from the history pyramid.
+        self.visible_duration = None
+
+        # How often per second new results change the picture, see PitchTrackerUI.frame_rate
+        self.content_rate = None
+
+        lowest_note = note_helper.note_name_to_value("E2")
+        self.lowest_note_on_display = lowest_note
+        self.lowest_note_on_display_target = self.lowest_note_on_display
+        self.lowest_frequency_on_display = note_helper.note_to_frequency(lowest_note, self.standard_pitch)
+        self.lowest_frequency_on_display_previous = self.lowest_frequency_on_display
+        self.lowest_frequency_on_display_target = self.lowest_frequency_on_display
+
+        highest_note = note_helper.note_name_to_value("E4")
+        self.highest_note_on_display = highest_note
+        self.highest_note_on_display_target = self.highest_note_on_display
+        self.highest_frequency_on_display = note_helper.note_to_frequency(highest_note, self.standard_pitch)
+        self.highest_frequency_on_display_previous = self.highest_frequency_on_display
+        self.highest_frequency_on_display_target = self.highest_frequency_on_display
+
+        self.camera_lerp = 0.0
+
+        self.note_histogram = None
+
+        self.profiler = StageProfiler(PitchTrackerGraph.PROFILED_STAGES)
+
+        self.snapshot = None
+        self.snapshot_time = None
+
+
+    def resize(self, size):
+        self.bounds = (*self.bounds[0:2], *size[0:2])
+        self.surface = pygame.Surface(self.bounds[2:4])        
+        self.grid_surface = pygame.Surface(self.bounds[2:4])
+        self.grid_key = None
+
+        for layer in self.curve_layers:
+            layer.resize(self.bounds[2:4])
+
+
+    def get_curve_layers(self, num_curves):
+        while len(self.curve_layers) < num_curves:
+            color = PitchTrackerGraph.CURVE_COLORS[(self.first_color + len(self.curve_layers)) % len(PitchTrackerGraph.CURVE_COLORS)]
+            self.curve_layers.append(CurveLayer(self.bounds[2:4], color))
+
+        return self.curve_layers[:num_curves]
+
+
+    def note_value_to_y_coord(self, note):
+        frequency = note_helper.note_to_frequency(note, self.standard_pitch)
+
+        return self.frequency_to_y_coord(frequency)
+
+
+    def frequency_to_y_coord(self, freq):
+        _, surface_height = self.surface.get_size()
+
+        low  = self.lowest_frequency_on_display
+        high = self.highest_frequency_on_display
+
+        if not PitchTrackerGraph.EXPONENTIAL_SCALING:
+            low = note_helper.frequency_to_note(low, self.standard_pitch, False)
+            high = note_helper.frequency_to_note(high, self.standard_pitch, False)
+            freq = note_helper.frequency_to_note(freq, self.standard_pitch, False)
+
+        range_frequencies_on_display = high - low
+
+        if range_frequencies_on_display == 0:
+            return 0
+
+        return surface_height - (surface_height *  (freq - low) / range_frequencies_on_display)
+
+
+    def frequencies_to_y_coords(self, frequencies):
+        # Array version of frequency_to_y_coord. The result is undefined for 0 Hz.
+        _, surface_height = self.surface.get_size()
+
+        low  = self.lowest_frequency_on_display
+        high = self.highest_frequency_on_display
+
+        frequencies = np.asarray(frequencies, dtype=np.float64)
+
+        if not PitchTrackerGraph.EXPONENTIAL_SCALING:
+            low = note_helper.frequency_to_note(low, self.standard_pitch, False)
+            high = note_helper.frequency_to_note(high, self.standard_pitch, False)
+            frequencies = note_helper.frequencies_to_notes(frequencies, self.standard_pitch, False)
+
+        range_frequencies_on_display = high - low
+
+        if range_frequencies_on_display == 0:
+            return np.zeros(len(frequencies))
+
+        return surface_height - (surface_height *  (frequencies - low) / range_frequencies_on_display)
+
+
+    def update_camera_bounds(self, pitches, sequence=None, refresh_len=0):
+        if PitchTrackerGraph.INCREMENTAL_CAMERA_BOUNDS and sequence is not None:
+            # Only the hops entering and leaving the window (and the last `refresh_len`
+            # ones, which may still change) are counted again
+            if self.note_histogram is None or self.note_histogram.capacity < len(pitches):
+                self.note_histogram = NoteHistogram(2 * len(pitches), 
+                                                    self.standard_pitch, 
+                                                    PitchTrackerGraph.HIGHEST_PITCH_TO_DISPLAY)
+                self.note_histogram.rebuild(sequence, pitches)
+            else:
+                self.note_histogram.update(sequence, pitches, refresh_len)
+
+            note_range = self.note_histogram.note_range(PitchTrackerGraph.MIN_OCCURENCE_AGAINST_OUTLIERS)
+            if note_range is None:
+                return
+
+            lowest_note, highest_note = note_range
+        else:
+            if len(pitches) == 0:
+                return
+
+            note_values = note_helper.frequencies_to_notes(pitches, self.standard_pitch)
+
+            offset = note_values.min()
+            occurrences = np.bincount(note_values - offset)[note_values - offset]
+
+            candidates = pitches[(pitches > 0.0) & 
+                                 (pitches <= PitchTrackerGraph.HIGHEST_PITCH_TO_DISPLAY) & 
+                                 (occurrences > PitchTrackerGraph.MIN_OCCURENCE_AGAINST_OUTLIERS)]
+
+            if len(candidates) == 0 or not candidates.max() > candidates.min():
+                return
+
+            lowest_note = note_helper.frequency_to_note(candidates.min(), self.standard_pitch)
+            highest_note = note_helper.frequency_to_note(candidates.max(), self.standard_pitch)
+
+        new_lowest_pitch = lowest_note - 1
+        new_highest_pitch = highest_note + 1
+
+        if (new_lowest_pitch != self.lowest_note_on_display_target) or (new_highest_pitch != self.highest_note_on_display_target):
+            self.lowest_frequency_on_display_previous = self.lowest_frequency_on_display
+            self.highest_frequency_on_display_previous = self.highest_frequency_on_display
+
+            self.lowest_frequency_on_display_target = note_helper.note_to_frequency(new_lowest_pitch)
+            self.highest_frequency_on_display_target = note_helper.note_to_frequency(new_highest_pitch)
+
+            self.lowest_note_on_display_target = note_helper.frequency_to_note(self.lowest_frequency_on_display_target)
+            self.highest_note_on_display_target = note_helper.frequency_to_note(self.highest_frequency_on_display_target)        
+
+            self.camera_lerp = 0.0    
+
+
+    def update_camera(self, delta_t):
+        self.camera_lerp += delta_t / PitchTrackerGraph.ANIMATION_DURATION   
+        if self.camera_lerp > 1.0:
+            self.camera_lerp = 1.0
+
+        self.lowest_frequency_on_display = interpolation.interp(self.lowest_frequency_on_display_previous, 
+                                                                self.lowest_frequency_on_display_target, 
+                                                                self.camera_lerp, interpolation.ease_in_out_expo)     
+
+        self.highest_frequency_on_display = interpolation.interp(self.highest_frequency_on_display_previous, 
+                                                                 self.highest_frequency_on_display_target, 
+                                                                 self.camera_lerp, interpolation.ease_in_out_expo)  
+
+        self.lowest_note_on_display = note_helper.frequency_to_note(self.lowest_frequency_on_display)
+        self.highest_note_on_display = note_helper.frequency_to_note(self.highest_frequency_on_display)
+
+        self.num_notes_on_display = self.highest_note_on_display - self.lowest_note_on_display 
+
+
+    def run(self, delta_t):
+        self.update_camera(delta_t)        
+
+
+    def zoom(self, steps, analysis_duration):
+        # Positive steps zoom out. Zooming in stops at the analysis window.
+        duration = (self.visible_duration or analysis_duration) * PitchTrackerGraph.ZOOM_FACTOR**steps
+        duration = min(duration, PitchTrackerGraph.MAX_VISIBLE_DURATION)
+
+        self.visible_duration = duration if duration > analysis_duration * (1.0 + 1e-6) else None
+
+
+    def render_grid(self):
+        self.grid_surface.fill(PitchTrackerGraph.BACKGROUND_COLOR)
+
+        surface_width, surface_height = self.grid_surface.get_size()
+
+        # Font scaling
+        space_per_note = 0.5 * surface_height / self.num_notes_on_display
+        font_scaling = space_per_note / self.default_font_height
+        new_font_size = PitchTrackerGraph.DEFAULT_FONT_SIZE * font_scaling
+        if new_font_size < PitchTrackerGraph.MIN_FONT_SIZE:
+            new_font_size = PitchTrackerGraph.MIN_FONT_SIZE
+        if new_font_size > PitchTrackerGraph.MAX_FONT_SIZE:
+            new_font_size = PitchTrackerGraph.MAX_FONT_SIZE
+        # Whole point sizes only, so that the label cache is actually hit
+        new_font_size = int(round(new_font_size))
+
+        # Draw note names
+        note_column_end = 0
+        names_y_coords_and_colors = []
+        for i in range(self.num_notes_on_display):
+            y = self.note_value_to_y_coord(self.lowest_note_on_display + i)
+            note_name = note_helper.value_to_note_name(self.lowest_note_on_display + i)
+
+            color = PitchTrackerGraph.NOTE_LINE_COLOR
+            if "#" in note_name:
+                color = PitchTrackerGraph.SHARP_NOTE_LINE_COLOR
+            elif "C" in note_name:
+                color = PitchTrackerGraph.C_NOTE_LINE_COLOR            
+
+            names_y_coords_and_colors.append((note_name, y, color))
+
+            label, text_rect = render_label(note_name, color, new_font_size)
+
+            text_position = PitchTrackerGraph.TEXT_MARGIN * text_rect.width
+
+            if y >= 0 and y < surface_height:
+                dest = (text_position, y - text_rect.height // 2)
+                if dest[1] >= 0:
+                    self.grid_surface.blit(label, dest)
+
+                note_column_end = max(note_column_end, text_position + (1.0 + PitchTrackerGraph.TEXT_MARGIN) * text_rect.width)
+
+        # Draw note lines
+        for note_name, y, color in names_y_coords_and_colors:
+            pygame.draw.line(self.grid_surface, 
+                             color, 
+                             (note_column_end, y), 
+                             (surface_width - 1, y))
+
+        self.note_column_end = note_column_end
+
+
+    def render(self, pitch_tracker):
+        self.render_overlay([pitch_tracker])
+
+
+    def render_overlay(self, pitch_trackers):
+        # Draws the curves of all trackers over one grid. The trackers must use the same
+        # hop size and analysis window.
+        # The last snapshot of the first tracker and when it was taken, for latency measurements
+        if self.visible_duration is not None:
+            self.render_history(pitch_trackers)
+            return
+
+        self.snapshot_time = time.time()
+        snapshots = [pitch_tracker.snapshot() for pitch_tracker in pitch_trackers]
+        self.snapshot = snapshots[0]
+
+        if all(len(snapshot.pitches) == 0 for snapshot in snapshots):
+            return
+
+        surface_width, surface_height = self.surface.get_size()
+
+        start = time.perf_counter()
+        if len(snapshots) == 1:
+            self.update_camera_bounds(self.snapshot.pitches, self.snapshot.sequence, pitch_trackers[0].filter_window_len)
+        else:
+            # The incremental histogram follows a single sequence, several inputs are counted exactly
+            self.update_camera_bounds(np.concatenate([snapshot.pitches for snapshot in snapshots]))
+        self.profiler.record("camera_bounds", time.perf_counter() - start)
+
+        self.blit_grid()
+
+        start = time.perf_counter()
+        self.curve_dx = (surface_width - self.note_column_end) / pitch_trackers[0].analysis_window_len
+        self.content_rate = self.curve_dx * pitch_trackers[0].sample_rate / pitch_trackers[0].hop_size
+
+        for layer, pitch_tracker, snapshot in zip(self.get_curve_layers(len(snapshots)), pitch_trackers, snapshots):
+            if len(snapshot.pitches) > 0:
+                self.render_curve(layer, snapshot, pitch_tracker.filter_window_len)
+
+        self.profiler.record("curve", time.perf_counter() - start)
+
+        self.screen.blit(self.surface, (self.bounds[0:2]))        
+
+
+    def blit_grid(self):
+        surface_width, surface_height = self.surface.get_size()
+
+        grid_key = (surface_width, 
+                    surface_height, 
+                    self.lowest_frequency_on_display, 
+                    self.highest_frequency_on_display, 
+                    self.camera_lerp)
+        start = time.perf_counter()
+        if grid_key != self.grid_key:
+            self.render_grid()
+            self.grid_key = grid_key
+
+        self.surface.blit(self.grid_surface, (0, 0))
+        self.profiler.record("grid", time.perf_counter() - start)
+
+
+    def render_history(self, pitch_trackers):
+        # Draws the last visible_duration seconds from the level of the history pyramids
+        # with about one bucket per pixel column, so the cost does not depend on the duration.
+        # The view moves in steps of one bucket, the curves are only redrawn when it did.
+        self.snapshot = None
+
+        surface_width, surface_height = self.surface.get_size()
+        plot_width = max(1, surface_width - self.note_column_end)
+
+        level = pitch_trackers[0].history.select_level(self.visible_duration, plot_width)
+        self.content_rate = 1.0 / pitch_trackers[0].history.bucket_duration(level)
+
+        latest = [pitch_tracker.history.latest_timestamp(level) for pitch_tracker in pitch_trackers]
+        latest = [timestamp for timestamp in latest if timestamp is not None]
+        if not latest:
+            return
+
+        end_time = max(latest)
+        start_time = end_time - self.visible_duration
+
+        histories = [pitch_tracker.history.buckets(level, start_time) for pitch_tracker in pitch_trackers]
+
+        start = time.perf_counter()
+        self.update_camera_bounds(np.concatenate([buckets["median_pitch"] for buckets in histories]))
+        self.profiler.record("camera_bounds", time.perf_counter() - start)
+
+        self.blit_grid()
+
+        start = time.perf_counter()
+        dx = plot_width / self.visible_duration
+        for layer, buckets in zip(self.get_curve_layers(len(histories)), histories):
+            key = ("history", self.grid_key, self.visible_duration, level, end_time, len(buckets))
+            if key != layer.key:
+                layer.surface.fill(PitchTrackerGraph.BACKGROUND_COLOR)
+                self.draw_history(layer, buckets, start_time, dx)
+                layer.key = key
+
+            self.surface.blit(layer.surface, 
+                              (self.note_column_end, 0), 
+                              (self.note_column_end, 0, plot_width, surface_height))
+
+        self.profiler.record("curve", time.perf_counter() - start)
+
+        self.screen.blit(self.surface, (self.bounds[0:2]))
+
+
+    def draw_history(self, layer, buckets, start_time, dx):
+        if len(buckets) > 0:
+            xs = self.note_column_end + (buckets["timestamp"] - start_time) * dx
+            voiced = (buckets["voiced"] >= 0.5) & (buckets["median_pitch"] <= PitchTrackerGraph.HIGHEST_PITCH_TO_DISPLAY)
+
+            # The pitch range of every bucket, and its median as the curve
+            lows = self.frequencies_to_y_coords(np.where(voiced, buckets["min_pitch"], 1.0))
+            highs = self.frequencies_to_y_coords(np.where(voiced, buckets["max_pitch"], 1.0))
+            for x, low, high in zip(xs[voiced].tolist(), lows[voiced].tolist(), highs[voiced].tolist()):
+                pygame.draw.line(layer.surface, layer.color, (x, low), (x, high))
+
+            points = np.column_stack((xs, self.frequencies_to_y_coords(np.where(voiced, buckets["median_pitch"], 1.0))))
+            self.draw_runs(layer.surface, layer.color, points, voiced)
+
+
+    def render_curve(self, layer, snapshot, filter_window_len):
+        # Only samples the median filter will not touch anymore go onto the curve surface,
+        # the most recent ones are drawn directly every frame
+        surface_width, surface_height = self.surface.get_size()
+
+        pitches = snapshot.pitches
+        end_sequence = snapshot.sequence
+        first_sequence = end_sequence - len(pitches)
+        final_sequence = max(first_sequence, end_sequence - filter_window_len)
+
+        origin = first_sequence * self.curve_dx - self.note_column_end
+        scroll = int(math.floor(origin - layer.origin))
+
+        can_scroll = (PitchTrackerGraph.SCROLLING and
+                      layer.key == self.grid_key and
+                      first_sequence <= layer.drawn_until <= final_sequence and
+                      0 <= scroll < surface_width)
+
+        if can_scroll:
+            # Shift the existing curve to the left and only draw what is new
+            if scroll > 0:
+                layer.surface.scroll(-scroll, 0)
+                layer.surface.fill(PitchTrackerGraph.BACKGROUND_COLOR, 
+                                   (surface_width - scroll, 0, scroll, surface_height))
+                layer.origin += scroll
+
+            layer.last_point = self.draw_curve(layer.surface, 
+                                               layer,
+                                               pitches[layer.drawn_until - first_sequence:final_sequence - first_sequence], 
+                                               layer.drawn_until, 
+                                               layer.last_point,
+                                               window_start=first_sequence)
+        else:
+            layer.surface.fill(PitchTrackerGraph.BACKGROUND_COLOR)
+            layer.origin = origin
+            layer.key = self.grid_key
+
+            layer.last_point = self.draw_curve(layer.surface, 
+                                               layer,
+                                               pitches[:final_sequence - first_sequence], 
+                                               first_sequence,
+                                               window_start=first_sequence)
+
+        layer.drawn_until = final_sequence
+
+        self.surface.blit(layer.surface, 
+                          (self.note_column_end, 0), 
+                          (self.note_column_end, 0, surface_width - self.note_column_end, surface_height))
+
+        self.draw_curve(self.surface, 
+                        layer,
+                        pitches[final_sequence - first_sequence:], 
+                        final_sequence, 
+                        layer.last_point)
+
+
+    def draw_curve(self, surface, layer, pitches, first_sequence, previous_point=None, window_start=None):
+        # Draws the pitches of consecutive samples starting at `first_sequence` in the color
+        # of `layer`, connected to `previous_point`. Returns the last point, or None if the
+        # curve ends in a break. Finalized samples pass the start of the analysis window as
+        # `window_start` and are decimated through the cache of the layer (see CurveLayer).
+        if len(pitches) == 0:
+            return previous_point
+
+        pitches = np.asarray(pitches)
+        sequences = first_sequence + np.arange(len(pitches))
+
+        # The unfinalized tail is only filter_window_len samples long and is drawn as it is
+        if window_start is not None and self.curve_dx * PitchTrackerGraph.DECIMATION_THRESHOLD < 1.0:
+            sequences, pitches = layer.decimate(pitches, first_sequence, self.curve_dx, window_start)
+
+            if len(pitches) == 0:
+                return None
+
+        valid = is_valid_pitch(pitches)
+
+        xs = sequences * self.curve_dx - layer.origin
+        ys = self.frequencies_to_y_coords(pitches)
+        points = np.column_stack((xs, ys))
+
+        return self.draw_runs(surface, layer.color, points, valid, previous_point)
+
+
+    def draw_runs(self, surface, color, points, valid, previous_point=None):
+        # Connects the consecutive valid points, the first run to `previous_point`.
+        # Returns the last point, or None if the line ends in a break.
+
+        # Start and end indices of all runs of valid samples
+        edges = np.flatnonzero(np.diff(np.concatenate(([0], valid.view(np.int8), [0]))))
+
+        for start, end in zip(edges[0::2], edges[1::2]):
+            coords = points[start:end].tolist()
+            if start == 0 and previous_point is not None:
+                coords.insert(0, previous_point)
+
+            if len(coords) > 1: 
+                pygame.draw.aalines(surface, 
+                                    color, 
+                                    False,
+                                    coords)    
+
+        if len(valid) > 0 and valid[-1]:
+            return tuple(points[-1])
+
+        return None
+
+
+def is_valid_pitch(pitches):
+    return (pitches > 0.0) & (pitches <= PitchTrackerGraph.HIGHEST_PITCH_TO_DISPLAY)
+
+
+class CurveLayer:
+    """
+    Pitch curve of one input in canvas coordinates: sample s is drawn at
+    x = s * curve_dx - origin. Finalized samples are kept on `surface`, which
+    is scrolled instead of redrawn while the camera is stable.
+
+    When there are several samples per pixel column, the decimated finalized
+    samples are cached by their absolute column floor(s * curve_dx), which does
+    not depend on the origin. Only the last, possibly partial column and the
+    samples after it are decimated again when new samples are finalized.
+    """
+
+    def __init__(self, size, color):
+        self.color = color
+        self.key = None
+        self.origin = 0.0
+        self.drawn_until = 0
+        self.last_point = None
+
+        self.reset_decimation(None, 0)
+
+        self.resize(size)
+
+
+    def reset_decimation(self, curve_dx, sequence):
+        self.decimation_dx = curve_dx
+        self.decimation_start = sequence
+        self.decimation_end = sequence
+
+        # Kept samples of the complete columns and the last one
+        self.kept_sequences = np.zeros(0, dtype=np.int64)
+        self.kept_pitches = np.zeros(0)
+
+        # All samples of the last column, it may still grow, after the sample before it
+        self.partial_start = sequence
+        self.partial_pitches = np.zeros(0)
+        self.partial_previous = np.zeros(0)
+
+
+    def decimate(self, pitches, first_sequence, curve_dx, window_start):
+        # Decimated finalized `pitches` starting at `first_sequence`, as (sequences, pitches).
+        # Samples before `window_start` are not needed anymore.
+        end = first_sequence + len(pitches)
+
+        if curve_dx != self.decimation_dx or not (self.decimation_start <= first_sequence <= self.decimation_end):
+            self.reset_decimation(curve_dx, first_sequence)
+
+        if end > self.decimation_end:
+            # The sample before the last column tells whether it starts within a gap
+            samples = np.concatenate((self.partial_previous, self.partial_pitches, pitches[self.decimation_end - first_sequence:]))
+            sequences = self.partial_start - len(self.partial_previous) + np.arange(len(samples))
+            columns = np.floor(sequences * curve_dx).astype(np.int64)
+            keep = decimate_min_max(columns, samples, is_valid_pitch(samples))
+            keep = keep[sequences[keep] >= self.partial_start]
+
+            # The kept samples of the last column are replaced
+            complete = np.searchsorted(self.kept_sequences, self.partial_start)
+            self.kept_sequences = np.concatenate((self.kept_sequences[:complete], sequences[keep]))
+            self.kept_pitches = np.concatenate((self.kept_pitches[:complete], samples[keep]))
+
+            last_column = np.searchsorted(columns, columns[-1])
+            self.partial_start = int(sequences[last_column])
+            self.partial_pitches = samples[last_column:]
+            self.partial_previous = samples[max(0, last_column - 1):last_column]
+            self.decimation_end = end
+
+        if window_start > self.decimation_start:
+            expired = np.searchsorted(self.kept_sequences, window_start)
+            self.kept_sequences = self.kept_sequences[expired:]
+            self.kept_pitches = self.kept_pitches[expired:]
+            self.decimation_start = min(window_start, self.partial_start)
+
+        start, stop = np.searchsorted(self.kept_sequences, (first_sequence, end))
+        return self.kept_sequences[start:stop], self.kept_pitches[start:stop]
+
+
+    def resize(self, size):
+        # Everything in the background color is transparent when blitted over the grid
+        self.surface = pygame.Surface(size)
+        self.surface.set_colorkey(PitchTrackerGraph.BACKGROUND_COLOR)
+        self.surface.fill(PitchTrackerGraph.BACKGROUND_COLOR)
+        self.key = None
+
+
+class Menu:
+
+    def __init__(self, size):
+        self.size = size
+
+
+    def resize(self, new_size):
+        pass
+
+
+    def update(self, events):
+        pass
+
+
+    def render(self, surface):
+        pass
+
+
+class PerformanceOverlay:
+    """
+    Frame time and the per-stage costs of the profilers, refreshed a few times
+    per second so that reading the text does not need a steady eye.
+    """
+
+    REFRESH_INTERVAL = 0.5              # in seconds
+    FONT_SIZE = 14
+    MARGIN = 8
+    TEXT_COLOR = (255, 255, 255)
+    BACKGROUND_COLOR = (0, 0, 0, 160)
+
+    def __init__(self, profilers):
+        # `profilers` maps titles to StageProfiler instances
+        self.profilers = profilers
+        self.surface = None
+        self.last_refresh = None
+
+
+    def format_lines(self):
+        lines = ["{stage:<16}{p50:>8}{p99:>8}{max:>8}".format(stage="ms", p50="p50", p99="p99", max="max")]
+        for title, profiler in self.profilers.items():
+            lines.append(title)
+            for stage, summary in profiler.summary().items():
+                if summary["count"] == 0:
+                    continue
+
+                lines.append("  {stage:<14}{p50:>8.2f}{p99:>8.2f}{max:>8.2f}".format(stage=stage, **summary))
+
+        return lines
+
+
+    def refresh(self):
+        font = get_font(PerformanceOverlay.FONT_SIZE)
+        labels = [font.render(line, PerformanceOverlay.TEXT_COLOR)[0] for line in self.format_lines()]
+
+        line_height = font.get_sized_height()
+        width = max(label.get_width() for label in labels) + 2 * PerformanceOverlay.MARGIN
+        height = len(labels) * line_height + 2 * PerformanceOverlay.MARGIN
+
+        self.surface = pygame.Surface((width, height), pygame.SRCALPHA)
+        self.surface.fill(PerformanceOverlay.BACKGROUND_COLOR)
+
+        for i, label in enumerate(labels):
+            self.surface.blit(label, (PerformanceOverlay.MARGIN, PerformanceOverlay.MARGIN + i * line_height))
+
+
+    def render(self, surface):
+        now = time.monotonic()
+        if self.last_refresh is None or now - self.last_refresh >= PerformanceOverlay.REFRESH_INTERVAL:
+            self.refresh()
+            self.last_refresh = now
+
+        surface.blit(self.surface, (0, 0))
+
+
+class PitchTrackerUI:
+    BACKGROUND_COLOR = (64, 64, 64)
+
+    MENU_WIDTH_PERCENTAGE = 0.5
+    MENU_HEIGHT_PERCENTAGE = 0.5
+
+    PROFILED_STAGES = ("frame", "render", "display_update")
+
+    IDLE_TIMEOUT = 0.1          # Longest wait for new results before checking for window events (in seconds)
+    MIN_ADAPTIVE_FPS = 10
+
+    def __init__(self, 
+                 pitch_tracker, 
+                 offset, 
+                 resolution, 
+                 target_fps, 
+                 standard_pitch, 
+                 analysis_window, 
+                 start_in_fullscreen,
+                 adaptive_fps=False,
+                 profile_log=None,
+                 profile_log_interval=5.0,
+                 multi_input_layout="overlay",
+                 version="",
+                 launch_time=None,
+                 exit_after_first_pitch=False):
+        # The tracker is started by the caller, so that the audio process comes up while the window is created
+        pygame.init()
+
+        # A MultiPitchTracker has one tracker per input
+        self.pitch_tracker = pitch_tracker
+        self.pitch_trackers = getattr(pitch_tracker, "trackers", [pitch_tracker])
+
+        self.offset = offset
+        self.default_resolution = resolution
+        self.target_fps = target_fps
+        self.adaptive_fps = adaptive_fps
+        self.standard_pitch = standard_pitch
+        self.analysis_window = analysis_window
+
+        # Startup timings (in seconds since launch_time), see benchmark.py --startup
+        self.launch_time = launch_time if launch_time is not None else time.time()
+        self.exit_after_first_pitch = exit_after_first_pitch
+        self.time_to_first_pixel = None
+        self.time_to_first_pitch = None
+
+        # Determine the resolution of the display
+        info = pygame.display.Info()
+        self.max_resolution = (info.current_w, info.current_h)
+
+        self.screen = pygame.display.set_mode(self.default_resolution, pygame.RESIZABLE)
+        self.previous_resolution = self.default_resolution
+        self.is_fullscreen = False
+
+        pygame.display.set_caption("Pitch Tracker - " + version if version else "Pitch Tracker")
+
+        icon = pygame.image.load("resources/icon.png")
+        pygame.display.set_icon(icon)
+
+        # Several inputs are either drawn over one grid or in one graph each
+        screen_width, screen_height = pygame.display.get_surface().get_size()
+        self.stacked = multi_input_layout == "stack" and len(self.pitch_trackers) > 1
+        num_graphs = len(self.pitch_trackers) if self.stacked else 1
+        self.graphs = [PitchTrackerGraph(self.screen, (0, 0, screen_width, screen_height), self.standard_pitch, i) for i in range(num_graphs)]
+        self.pitch_tracker_graph = self.graphs[0]
+        self.layout_graphs((screen_width, screen_height))
+
+        self.menu = Menu(size=(int(screen_width * PitchTrackerUI.MENU_WIDTH_PERCENTAGE), 
+                               int(screen_height * PitchTrackerUI.MENU_HEIGHT_PERCENTAGE)))
+
+        self.clock = pygame.time.Clock()
+
+        # Stage timings, shown with F3 and optionally logged to a JSON lines file
+        self.profiler = StageProfiler(PitchTrackerUI.PROFILED_STAGES)
+        self.latency_monitor = LatencyMonitor(self.pitch_tracker)
+        self.performance_overlay = PerformanceOverlay({"ui": self.profiler,
+                                                       "graph": self.pitch_tracker_graph.profiler,
+                                                       "tracker": self.pitch_tracker.profiler,
+                                                       "latency": self.latency_monitor.profiler})
+        self.profile_log = ProfileLog(profile_log, profile_log_interval) if profile_log else None
+
+        self.show_menu = False
+        self.show_performance_overlay = False
+        self.running = True
+
+        # Sequence numbers of the trackers when the last frame was drawn
+        self.drawn_sequences = None
+
+        if start_in_fullscreen:
+            self.toggle_fullscreen()
+        else:
+            # Set initial window position using the offset specified in the configuration 
+            self.reposition_window()
+
+        self.main_loop()
+
+    
+    def set_silence_threshold(self, silence_threshold):
+        self.silence_threshold = silence_threshold
+        self.pitch_tracker.set_silence(self.silence_threshold)
+
+
+    def set_audio_device(self, index):
+        # Only a single input can be switched to another device
+        if len(self.pitch_trackers) == 1:
+            self.pitch_tracker.change_device(index)
+
+
+    def reposition_window(self):
+        actual_size = self.screen.get_size()
+        window = Window.from_display_module()
+        window.position = (self.max_resolution[0] // 2 - actual_size[0] // 2 + self.offset[0], 
+                           self.max_resolution[1] // 2 - actual_size[1] // 2 + self.offset[1])
+
+
+    def toggle_fullscreen(self):
+        # pygame.display.toggle_fullscreen()
+        if self.is_fullscreen:
+            self.screen = pygame.display.set_mode(self.previous_resolution, pygame.RESIZABLE)  
+            self.resize(self.previous_resolution)
+        else:
+            self.previous_resolution = self.screen.get_size()
+            self.screen = pygame.display.set_mode(self.max_resolution, pygame.NOFRAME)  
+            self.resize(self.max_resolution)
+    
+        # NOTE this uses an experimental API to reposition the window
+        self.reposition_window()
+
+        self.is_fullscreen = not self.is_fullscreen
+
+    def zoom(self, steps):
+        # Positive steps show a longer part of the history
+        for graph in self.graphs:
+            graph.zoom(steps, self.analysis_window)
+
+
+    def layout_graphs(self, size):
+        # Stacked graphs split the height of the window
+        for i, graph in enumerate(self.graphs):
+            top = size[1] * i // len(self.graphs)
+            bottom = size[1] * (i + 1) // len(self.graphs)
+
+            graph.bounds = (0, top, size[0], bottom - top)
+            graph.resize((size[0], bottom - top))
+
+
+    def resize(self, size):
+        self.layout_graphs(size)
+        self.menu.resize((int(size[0] * PitchTrackerUI.MENU_WIDTH_PERCENTAGE), 
+                          int(size[1] * PitchTrackerUI.MENU_HEIGHT_PERCENTAGE)))        
+
+
+    def exit(self):
+        if self.is_fullscreen:
+            self.toggle_fullscreen()          
+        self.pitch_tracker.stop_tracking()
+        self.running = False          
+
+
+    def frame_rate(self):
+        # The target FPS, or in adaptive mode as often as new results move the curves by a pixel
+        if not self.adaptive_fps:
+            return self.target_fps
+
+        rates = [graph.content_rate for graph in self.graphs if graph.content_rate is not None]
+        if not rates:
+            return self.target_fps
+
+        return int(min(max(max(rates), PitchTrackerUI.MIN_ADAPTIVE_FPS), self.target_fps))
+
+
+    def needs_redraw(self, events, sequences):
+        # Only new results, a moving camera, window events and the overlays change the picture
+        return (len(events) > 0 or
+                sequences != self.drawn_sequences or
+                any(graph.camera_lerp < 1.0 for graph in self.graphs) or
+                self.show_menu or
+                self.show_performance_overlay)
+
+
+    def record_startup(self, now):
+        # Called after every presented frame until the first voiced hop was drawn
+        if self.time_to_first_pitch is not None:
+            return
+
+        if self.time_to_first_pixel is None:
+            self.time_to_first_pixel = now - self.launch_time
+
+        snapshot = self.pitch_tracker_graph.snapshot
+        if snapshot is not None and np.any(snapshot.pitches > 0.0):
+            self.time_to_first_pitch = now - self.launch_time
+            print("time_to_first_pixel: {:.3f} s".format(self.time_to_first_pixel))
+            print("time_to_first_pitch: {:.3f} s".format(self.time_to_first_pitch))
+
+            if self.exit_after_first_pitch:
+                self.exit()
+
+
+    def main_loop(self):
+        last_time = pygame.time.get_ticks()
+        # Loop iterations without changes present nothing, frame times are measured between presented frames
+        last_present_time = None
+        while self.running:
+            current_time = pygame.time.get_ticks()
+            self.delta_t = (current_time - last_time) / 1000.0
+            last_time = current_time
+
+            for graph in self.graphs:
+                graph.run(self.delta_t)
+
+            events = pygame.event.get()
+            for event in events:
+                if event.type == pygame.QUIT:
+                    self.exit()  
+                if (event.type == pygame.KEYDOWN):
+                    if event.key == pygame.K_ESCAPE:
+                        # self.show_menu = not self.show_menu
+                        self.exit()
+                    elif event.key == pygame.K_F11:
+                        self.toggle_fullscreen()
+                    elif event.key == pygame.K_F3:
+                        self.show_performance_overlay = not self.show_performance_overlay
+                    elif event.key in (pygame.K_MINUS, pygame.K_KP_MINUS):
+                        self.zoom(1)
+                    elif event.key in (pygame.K_PLUS, pygame.K_EQUALS, pygame.K_KP_PLUS):
+                        self.zoom(-1)
+                if event.type == pygame.MOUSEWHEEL:
+                    self.zoom(-event.y)
+                if event.type == pygame.VIDEORESIZE:
+                    self.resize((event.w, event.h))
+
+            # The trackers are stopped already
+            if not self.running:
+                break
+
+            self.menu.update(events)
+
+            # Note events and history of what was finalized since the last frame
+            for pitch_tracker in self.pitch_trackers:
+                pitch_tracker.update()
+
+            # Nothing changed: sleep until the tracker publishes new results instead of redrawing
+            sequences = [pitch_tracker.latest_sequence() for pitch_tracker in self.pitch_trackers]
+            if not self.needs_redraw(events, sequences):
+                self.pitch_tracker.wait_for_data(PitchTrackerUI.IDLE_TIMEOUT)
+                continue
+
+            self.drawn_sequences = sequences
+
+            start = time.perf_counter()
+            self.screen.fill(PitchTrackerUI.BACKGROUND_COLOR)
+            if self.stacked:
+                for graph, pitch_tracker in zip(self.graphs, self.pitch_trackers):
+                    graph.render(pitch_tracker)
+            else:
+                self.pitch_tracker_graph.render_overlay(self.pitch_trackers)
+            self.profiler.record("render", time.perf_counter() - start)
+
+            if self.show_menu:
+                self.menu.render(self.screen)
+
+            if self.show_performance_overlay:
+                self.performance_overlay.render(self.screen)
+
+            self.clock.tick(self.frame_rate())
+
+            start = time.perf_counter()
+            pygame.display.update()
+            present_time = time.perf_counter()
+            self.profiler.record("display_update", present_time - start)
+
+            self.record_startup(time.time())
+
+            self.latency_monitor.record(self.pitch_tracker_graph.snapshot, 
+                                        self.pitch_tracker_graph.snapshot_time, 
+                                        time.time())
+
+            if last_present_time is not None:
+                self.profiler.record("frame", present_time - last_present_time)
+            last_present_time = present_time
+
+            if self.profile_log is not None:
+                self.profile_log.update({"ui": self.profiler.summary,
+                                         "graph": self.pitch_tracker_graph.profiler.summary,
+                                         "tracker": self.pitch_tracker.profile,
+                                         "latency": self.latency_monitor.summary,
+                                         "stats": self.pitch_tracker.stats})
+
+        pygame.quit()
@@ -0,0 +1,138 @@
+import wave
+
+import numpy as np
+import pytest
+
+import audio_source
+from audio_source import STAT_NAMES, BUFFER_OVERRUNS, DROPPED_FRAMES, FileSource, CallbackMicrophone
+
+SAMPLE_RATE = 44100
+HOP_SIZE = 512
+
+
+def write_wav(path, samples):
+    with wave.open(str(path), "wb") as output:
+        output.setnchannels(1)
+        output.setsampwidth(2)
+        output.setframerate(SAMPLE_RATE)
+        output.writeframes((np.asarray(samples) * 32767).astype(np.int16).tobytes())
+
+
+@pytest.mark.parametrize("loop", [False, True])
+def test_file_source(tmp_path, loop):
+    pytest.importorskip("aubio")
+
+    path = tmp_path / "tone.wav"
+    write_wav(path, np.full(3 * HOP_SIZE + 100, 0.5))
+
+    source = FileSource(str(path), paced=False, loop=loop)
+    source.open(SAMPLE_RATE, HOP_SIZE, [0] * len(STAT_NAMES))
+    frame, hops = source.read_hops()
+    source.close()
+
+    assert frame == 0
+    assert hops.shape == ((FileSource.MAX_UNPACED_HOPS if loop else 3), HOP_SIZE)
+    assert source.exhausted != loop
+
+
+def test_empty_file_ends_when_looping(tmp_path):
+    pytest.importorskip("aubio")
+
+    path = tmp_path / "empty.wav"
+    write_wav(path, [])
+
+    source = FileSource(str(path), paced=False, loop=True)
+    source.open(SAMPLE_RATE, HOP_SIZE, [0] * len(STAT_NAMES))
+    frame, hops = source.read_hops()
+    source.close()
+
+    assert len(hops) == 0
+    assert source.exhausted
+
+
+class FakeStream():
+
+    def get_input_latency(self):
+        return 0.0
+
+
+    def stop_stream(self):
+        pass
+
+
+    def close(self):
+        pass
+
+
+class FakePyAudio():
+    paFloat32 = 1
+    paInputOverflow = 2
+    paInputUnderflow = 4
+    paContinue = 0
+
+    def open(self, **kwargs):
+        return FakeStream()
+
+
+@pytest.fixture
+def microphone(monkeypatch):
+    # A CallbackMicrophone whose callback is called by the test instead of PortAudio
+    monkeypatch.setattr(audio_source, "pyaudio", FakePyAudio)
+    monkeypatch.setattr(audio_source, "get_pyaudio", FakePyAudio)
+
+    microphone = CallbackMicrophone(0)
+    microphone.open(SAMPLE_RATE, HOP_SIZE, [0] * len(STAT_NAMES))
+
+    return microphone
+
+
+def test_backlog_is_limited(microphone):
+    num_frames = int(0.9 * microphone.capacity) // HOP_SIZE * HOP_SIZE
+    microphone.write(np.arange(num_frames, dtype=np.float32)[:, np.newaxis])
+
+    # The oldest hops are dropped, the returned ones are not overwritten by the next writes
+    frame, hops = microphone.read_hops(timeout=0.0)
+    max_backlog = int(CallbackMicrophone.MAX_BACKLOG * microphone.capacity)
+
+    assert len(hops) * HOP_SIZE <= max_backlog
+    assert frame + len(hops) * HOP_SIZE == num_frames
+    assert np.array_equal(hops.ravel(), np.arange(frame, num_frames))
+    assert microphone.stats[BUFFER_OVERRUNS] == 1
+    assert microphone.stats[DROPPED_FRAMES] == frame
+
+    microphone.write(np.zeros((microphone.capacity - max_backlog, 1), dtype=np.float32))
+    assert np.array_equal(hops.ravel(), np.arange(frame, num_frames))
+
+
+def run_callbacks(microphone, adc_times, frame_count=HOP_SIZE):
+    for adc_time in adc_times:
+        microphone.callback(np.zeros(frame_count, dtype=np.float32).tobytes(), frame_count, {"input_buffer_adc_time": adc_time}, 0)
+
+
+def test_adc_clock_drift_and_jitter(microphone):
+    # 0.1 % drift of the ADC clock and jitter of a few frames for 20 minutes are absorbed
+    rng = np.random.default_rng(0)
+    num_callbacks = int(1200 * SAMPLE_RATE / HOP_SIZE)
+    adc_times = 5.0 + np.arange(num_callbacks) * HOP_SIZE / SAMPLE_RATE * 1.001 + rng.uniform(-3.0, 3.0, num_callbacks) / SAMPLE_RATE
+
+    # Before the stream runs, the ADC time is reported as 0
+    run_callbacks(microphone, [0.0, 0.0])
+    run_callbacks(microphone, adc_times)
+
+    assert microphone.missing_frames == 0
+    assert len(microphone.gaps) == 0
+
+
+def test_adc_time_jump_is_a_gap(microphone):
+    hop_time = HOP_SIZE / SAMPLE_RATE
+
+    # Three buffers are lost between the fourth and fifth callback
+    run_callbacks(microphone, 1.0 + np.arange(4) * hop_time)
+    run_callbacks(microphone, 1.0 + np.arange(7, 10) * hop_time)
+
+    frame, hops = microphone.read_hops(timeout=0.0)
+    assert (frame, len(hops)) == (0, 4)
+
+    frame, hops = microphone.read_hops(timeout=0.0)
+    assert (frame, len(hops)) == (7 * HOP_SIZE, 3)
+    assert microphone.stats[DROPPED_FRAMES] == 3 * HOP_SIZE
@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+
+from decimation import decimate_min_max
+
+
+def reference_decimation(columns, values, valid):
+    # One group per column and run of valid samples, keeping its minimum and maximum,
+    # plus every invalid sample that ends a run or starts the curve
+    keep = set()
+    group = []
+    for i in range(len(values)):
+        if valid[i] and group and columns[i] == columns[group[0]]:
+            group.append(i)
+            continue
+
+        if group:
+            group_values = [values[j] for j in group]
+            keep.add(group[int(np.argmin(group_values))])
+            keep.add(group[int(np.argmax(group_values))])
+
+        group = [i] if valid[i] else []
+        if not valid[i] and (i == 0 or valid[i - 1]):
+            keep.add(i)
+
+    if group:
+        group_values = [values[j] for j in group]
+        keep.add(group[int(np.argmin(group_values))])
+        keep.add(group[int(np.argmax(group_values))])
+
+    return np.array(sorted(keep), dtype=np.int64)
+
+
+@pytest.mark.parametrize("samples_per_column", [0.5, 1.0, 3.0, 40.0])
+def test_matches_reference(samples_per_column):
+    rng = np.random.default_rng(int(samples_per_column * 10))
+    num_samples = 2000
+
+    values = rng.uniform(100.0, 400.0, num_samples)
+    valid = rng.random(num_samples) > 0.1
+    columns = np.floor(np.arange(num_samples) / samples_per_column).astype(np.int64)
+
+    assert np.array_equal(decimate_min_max(columns, values, valid), reference_decimation(columns, values, valid))
+
+
+def test_edge_cases():
+    assert len(decimate_min_max([], [], [])) == 0
+    assert np.array_equal(decimate_min_max([0, 0, 0], [1.0, 2.0, 3.0], [False] * 3), [0])
+    assert np.array_equal(decimate_min_max([0, 0, 0, 0], [5.0, 1.0, 9.0, 5.0], [True] * 4), [1, 2])
+
+
+def test_curve_layer_cache_matches_full_decimation():
+    # The cache of the graph decimates incrementally by absolute pixel column
+    pytest.importorskip("pygame")
+    from ui import CurveLayer, is_valid_pitch
+
+    rng = np.random.default_rng(0)
+    curve_dx = 0.167
+    window_len = 3000
+
+    raw = rng.uniform(100.0, 400.0, 20000)
+    raw[rng.random(len(raw)) < 0.1] = 0.0
+
+    layer = CurveLayer((64, 64), (255, 255, 255))
+
+    drawn_until = 0
+    sequence = window_len
+    while sequence < len(raw):
+        sequence = min(len(raw), sequence + int(rng.integers(0, 8)))
+        first_sequence = sequence - window_len
+        pitches = raw[first_sequence:sequence]
+
+        # Only what is new, or everything now and then, like scrolling and full redraws do
+        if rng.random() < 0.1 or drawn_until < first_sequence:
+            start = first_sequence
+        else:
+            start = drawn_until
+        sequences, kept = layer.decimate(pitches[start - first_sequence:], start, curve_dx, first_sequence)
+        drawn_until = sequence
+
+        window_sequences = first_sequence + np.arange(window_len)
+        columns = np.floor(window_sequences * curve_dx).astype(np.int64)
+        keep = decimate_min_max(columns, pitches, is_valid_pitch(pitches))
+        expected = window_sequences[keep]
+        expected = expected[expected >= start]
+
+        # The column cut by the left edge of the window keeps what was decimated before the cut
+        first_column = columns[0]
+        assert np.array_equal(sequences[np.floor(sequences * curve_dx) > first_column],
+                              expected[np.floor(expected * curve_dx) > first_column])
+        assert np.array_equal(kept, raw[sequences])
@@ -0,0 +1,64 @@
+import json
+
+import numpy as np
+import pytest
+
+from ring_buffer import RESULT_DTYPE
+from pitch_tracker import AnalysisSnapshot, GAP_PITCH
+import frame_format
+
+
+@pytest.fixture
+def results():
+    results = np.zeros(5, dtype=RESULT_DTYPE)
+    results["timestamp"] = 1700000000.0 + np.arange(5) * 0.015
+    results["pitch"] = [440.0, 445.0, 0.0, GAP_PITCH, 261.6256]
+    results["volume"] = [-20.0, -21.5, -70.0, -np.inf, -30.0]
+    results["confidence"] = [0.99, 0.9, 0.0, 0.0, 0.95]
+
+    return results
+
+
+def test_results_to_frames(results):
+    frames = frame_format.results_to_frames(results, 440.0)
+
+    assert frame_format.FRAME_DTYPE.itemsize == 26
+    assert frames.dtype == frame_format.FRAME_DTYPE
+    assert np.array_equal(frames["timestamp"], results["timestamp"])
+    assert frames["note"].tolist() == [57, 57, -1, -1, 48]
+    assert frames["cents"][[0, 1, 4]] == pytest.approx([0.0, 1200.0 * np.log2(445.0 / 440.0), 0.0], abs=1e-3)
+    assert np.all(np.isnan(frames["cents"][[2, 3]]))
+
+    # Snapshots of the tracker give the same frames
+    snapshot = AnalysisSnapshot(5, *(results[name] for name in RESULT_DTYPE.names))
+    assert frame_format.encode_binary(frame_format.results_to_frames(snapshot, 440.0)) == frame_format.encode_binary(frames)
+
+
+def test_binary_round_trip(results):
+    frames = frame_format.results_to_frames(results, 440.0)
+    data = frame_format.encode_binary(frames)
+
+    assert len(data) == 26 * len(frames)
+
+    decoded = frame_format.decode_binary(data)
+    for name in frame_format.FRAME_DTYPE.names:
+        assert np.array_equal(decoded[name], frames[name], equal_nan=True)
+
+    # Streams can be cut at any frame boundary
+    assert np.array_equal(np.concatenate((frame_format.decode_binary(data[:52]), frame_format.decode_binary(data[52:])))["timestamp"], frames["timestamp"])
+
+
+def test_ndjson(results):
+    frames = frame_format.results_to_frames(results, 440.0)
+    lines = frame_format.encode_ndjson(frames).decode("utf-8").splitlines()
+
+    assert len(lines) == len(frames)
+
+    decoded = [json.loads(line) for line in lines]
+    assert [frame["note"] for frame in decoded] == ["A4", "A4", None, None, "C4"]
+    assert [frame["pitch"] for frame in decoded] == [440.0, 445.0, None, None, pytest.approx(261.626, abs=1e-3)]
+    assert decoded[1]["cents"] == pytest.approx(19.56, abs=0.01)
+    assert decoded[3]["volume"] is None
+    assert [frame["timestamp"] for frame in decoded] == pytest.approx(results["timestamp"].tolist(), abs=1e-6)
+
+    assert frame_format.encode_ndjson(frames[:0]) == b""
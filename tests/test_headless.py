@@ -0,0 +1,34 @@
+import io
+
+import numpy as np
+
+from audio_source import SignalSource
+from pitch_tracker import PitchTracker
+from headless import FrameStream
+import frame_format
+
+SAMPLE_RATE = 44100
+DURATION = 1.5
+
+
+def test_finite_source_emits_every_hop():
+    pitch_tracker = PitchTracker(sample_rate=SAMPLE_RATE,
+                                 filter_window=0.2,
+                                 source=SignalSource("melody", DURATION, loop=False, paced=False))
+    output = io.BytesIO()
+    stream = FrameStream(pitch_tracker, output, frame_format.encode_binary, batch_size=7)
+
+    pitch_tracker.start_tracking()
+    try:
+        stream.run(duration=10.0)
+    finally:
+        pitch_tracker.stop_tracking()
+
+    frames = frame_format.decode_binary(output.getvalue())
+    snapshot = pitch_tracker.snapshot()
+
+    # The last filter window is emitted once the source ended, with its final filtered pitches
+    assert pitch_tracker.filter_window_len > 1
+    assert len(frames) == int(DURATION * SAMPLE_RATE) // pitch_tracker.hop_size
+    assert np.array_equal(frames["timestamp"], snapshot.timestamps)
+    assert np.array_equal(frames["pitch"], snapshot.pitches.astype(np.float32))
@@ -0,0 +1,107 @@
+import numpy as np
+
+from history_pyramid import HistoryPyramid, HISTORY_DTYPE
+
+HOP_TIME = 0.015
+
+
+def reference_bucket(buckets):
+    # One bucket merged from a list of (timestamp, min, max, median, voiced, volume) tuples
+    voiced = [bucket for bucket in buckets if bucket[4] > 0.0]
+
+    return (buckets[-1][0],
+            min(bucket[1] for bucket in voiced) if voiced else 0.0,
+            max(bucket[2] for bucket in voiced) if voiced else 0.0,
+            float(np.median([bucket[3] for bucket in voiced])) if voiced else 0.0,
+            sum(bucket[4] for bucket in buckets) / len(buckets),
+            max(bucket[5] for bucket in buckets))
+
+
+def reference_levels(timestamps, pitches, volumes, base_hops, factor, num_levels):
+    # Every level merged from complete groups of the level below
+    below = [(t, max(p, 0.0), max(p, 0.0), max(p, 0.0), float(p > 0.0), v) for t, p, v in zip(timestamps, pitches, volumes)]
+
+    levels = []
+    for level in range(num_levels):
+        n = base_hops if level == 0 else factor
+        below = [reference_bucket(below[i:i + n]) for i in range(0, len(below) - n + 1, n)]
+        levels.append(np.array(below, dtype=HISTORY_DTYPE))
+
+    return levels
+
+
+def random_hops(num_hops, seed=0):
+    rng = np.random.default_rng(seed)
+
+    timestamps = (np.arange(num_hops) + 1) * HOP_TIME
+    pitches = rng.uniform(80.0, 800.0, num_hops)
+    pitches[rng.random(num_hops) < 0.3] = 0.0
+    pitches[rng.random(num_hops) < 0.05] = -1.0
+    volumes = rng.uniform(-60.0, 0.0, num_hops)
+
+    return timestamps, pitches, volumes
+
+
+def test_levels_match_reference():
+    rng = np.random.default_rng(1)
+    timestamps, pitches, volumes = random_hops(3000)
+
+    pyramid = HistoryPyramid(HOP_TIME, base_hops=4, factor=3, level_len=10000, num_levels=4)
+
+    # Hops arrive in batches of any size
+    start = 0
+    while start < len(pitches):
+        end = min(len(pitches), start + int(rng.integers(0, 40)))
+        pyramid.update(timestamps[start:end], pitches[start:end], volumes[start:end])
+        start = end
+
+    for level, expected in enumerate(reference_levels(timestamps, pitches, volumes, 4, 3, 4)):
+        buckets = pyramid.buckets(level, -np.inf)
+
+        assert len(buckets) == len(expected)
+        for name in HISTORY_DTYPE.names:
+            assert np.allclose(buckets[name], expected[name]), name
+
+        assert pyramid.latest_timestamp(level) == expected["timestamp"][-1]
+
+
+def test_bounded_levels():
+    timestamps, pitches, volumes = random_hops(2000)
+
+    pyramid = HistoryPyramid(HOP_TIME, base_hops=2, factor=2, level_len=50, num_levels=3)
+    pyramid.update(timestamps, pitches, volumes)
+
+    # Only the last level_len buckets are kept, oldest first
+    for level, expected in enumerate(reference_levels(timestamps, pitches, volumes, 2, 2, 3)):
+        buckets = pyramid.buckets(level, -np.inf)
+
+        assert np.array_equal(buckets["timestamp"], expected["timestamp"][-50:])
+        assert np.array_equal(buckets["max_pitch"], expected["max_pitch"][-50:])
+
+    pyramid.reset()
+    assert pyramid.latest_timestamp(0) is None
+    assert len(pyramid.buckets(0, -np.inf)) == 0
+
+
+def test_range_selection():
+    pyramid = HistoryPyramid(HOP_TIME, base_hops=4, factor=4, num_levels=3)
+    assert pyramid.bucket_duration(2) == 4 * 16 * HOP_TIME
+
+    # Zooming out moves to coarser levels, with at most max_buckets buckets in view
+    assert pyramid.select_level(10 * 4 * HOP_TIME, 10) == 0
+    assert pyramid.select_level(11 * 4 * HOP_TIME, 10) == 1
+    assert pyramid.select_level(10 * 16 * HOP_TIME, 10) == 1
+    assert pyramid.select_level(41 * 16 * HOP_TIME, 10) == 2
+    assert pyramid.select_level(1e9, 10) == 2
+
+    timestamps, pitches, volumes = random_hops(400)
+    pyramid.update(timestamps, pitches, volumes)
+
+    # The buckets that end after the start of the visible range
+    start_time = timestamps[200]
+    for level in range(3):
+        everything = pyramid.buckets(level, -np.inf)
+        visible = pyramid.buckets(level, start_time)
+
+        assert np.all(visible["timestamp"] > start_time)
+        assert np.array_equal(visible, everything[everything["timestamp"] > start_time])
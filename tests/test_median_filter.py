@@ -0,0 +1,92 @@
+import numpy as np
+import pytest
+
+from median_filter import median_filter, StreamingMedianFilter, SlidingMedian, MAX_FACTOR
+
+
+def reference_filter(pitches, filter_window_len):
+    # The loop PitchTracker used before the filter was vectorized
+    filtered_pitches = pitches.copy()
+    for i in range(filter_window_len, len(pitches) - filter_window_len):
+        median = np.median(pitches[i - filter_window_len:i + filter_window_len])
+        if pitches[i] < median / MAX_FACTOR or pitches[i] > median * MAX_FACTOR:
+            filtered_pitches[i] = median
+
+    return filtered_pitches
+
+
+def random_pitches(rng, num_samples):
+    # Voiced stretches with octave errors and unvoiced hops in between
+    pitches = rng.uniform(100.0, 400.0, num_samples)
+    pitches[rng.random(num_samples) < 0.2] = 0.0
+    pitches[rng.random(num_samples) < 0.05] *= 2.0
+
+    return pitches
+
+
+@pytest.mark.parametrize("filter_window_len", [1, 3, 8])
+def test_vectorized_matches_loop(filter_window_len):
+    rng = np.random.default_rng(filter_window_len)
+    pitches = random_pitches(rng, 500)
+
+    assert np.array_equal(median_filter(pitches, filter_window_len), reference_filter(pitches, filter_window_len))
+
+
+def test_sliding_median():
+    rng = np.random.default_rng(0)
+    values = rng.integers(0, 20, 300).astype(np.float64)
+
+    median = SlidingMedian()
+    for i, value in enumerate(values):
+        median.add(value)
+        if i >= 9:
+            assert median.median() == np.median(values[i - 9:i + 1])
+            median.remove(values[i - 9])
+
+
+@pytest.mark.parametrize("filter_window_len,analysis_window_len", [(1, 50), (5, 200), (14, 600)])
+def test_streaming_matches_vectorized(filter_window_len, analysis_window_len):
+    # The window advances by irregular steps, as it does between frames
+    rng = np.random.default_rng(analysis_window_len)
+    pitches = random_pitches(rng, 3000)
+
+    streaming = StreamingMedianFilter(filter_window_len, analysis_window_len)
+    sequence = 0
+    while sequence < len(pitches):
+        sequence = min(len(pitches), sequence + int(rng.integers(0, 40)))
+        window = pitches[max(0, sequence - analysis_window_len):sequence]
+
+        assert np.array_equal(streaming(sequence, window), median_filter(window, filter_window_len))
+
+
+def test_restart():
+    # Skipped samples and a restarted stream start the filter over
+    rng = np.random.default_rng(1)
+    pitches = random_pitches(rng, 400)
+
+    streaming = StreamingMedianFilter(3, 100)
+    streaming(150, pitches[50:150])
+
+    assert np.array_equal(streaming(350, pitches[250:350]), median_filter(pitches[250:350], 3))
+    assert np.array_equal(streaming(80, pitches[:80]), median_filter(pitches[:80], 3))
+
+
+def test_gaps_are_not_filtered():
+    # Gap entries (negative pitches) neither change nor take part in the medians of their neighbours
+    pitches = np.array([200.0] * 20 + [-1.0] * 6 + [220.0] * 20)
+
+    filtered = median_filter(pitches, 5)
+    assert np.array_equal(filtered, pitches)
+
+    rng = np.random.default_rng(2)
+    pitches = random_pitches(rng, 2000)
+    for start in rng.integers(0, len(pitches), 10):
+        pitches[start:start + rng.integers(1, 12)] = -1.0
+
+    filtered = median_filter(pitches, 4)
+    assert np.array_equal(filtered[pitches < 0.0], pitches[pitches < 0.0])
+
+    streaming = StreamingMedianFilter(4, 300)
+    for sequence in range(0, len(pitches) + 1, 7):
+        window = pitches[max(0, sequence - 300):sequence]
+        assert np.array_equal(streaming(sequence, window), median_filter(window, 4))
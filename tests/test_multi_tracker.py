@@ -0,0 +1,110 @@
+import time
+import queue
+import pickle
+import threading
+
+import numpy as np
+
+import signals
+from audio_source import SignalSource, STAT_NAMES
+from ring_buffer import ResultRingBuffer
+from profiling import StageProfiler
+from pitch_tracker import HopAnalyzer, GAP_PITCH, TRACKING_STAGES
+from multi_tracker import MultiPitchTracker, InputControl, create_audio_dtype, detection_worker
+
+SAMPLE_RATE = 44100
+HOP_SIZE = 675
+BUFFER_SIZE = 4096
+DURATION = 1.0
+SILENCE_THRESHOLD = -50.0
+
+
+def signal_hops(signal):
+    samples, _ = signals.SIGNALS[signal](DURATION, SAMPLE_RATE)
+    num_hops = len(samples) // HOP_SIZE
+
+    return samples[:num_hops * HOP_SIZE].reshape(num_hops, HOP_SIZE)
+
+
+def reference_pitches(hops, silence_threshold=SILENCE_THRESHOLD):
+    # What a single tracker detects, the detector state carries over from hop to hop
+    analyzer = HopAnalyzer(SAMPLE_RATE, HOP_SIZE, BUFFER_SIZE, "default", None, silence_threshold)
+
+    return np.array([pitch for pitch, _, _, _ in analyzer.analyze_batch(hops)])
+
+
+def test_inputs_get_their_own_results():
+    inputs = [(SignalSource(signal, DURATION, loop=False, paced=False), 0) for signal in ("sine_sweep", "melody", "vibrato")]
+    tracker = MultiPitchTracker(inputs, filter_window=0.0, silence_threshold=SILENCE_THRESHOLD, num_workers=2)
+
+    tracker.start_tracking()
+
+    # Inputs are dealt to the workers round-robin, commands of an input are tagged with it
+    assert [input_tracker.control.input_index for input_tracker in tracker.trackers] == [0, 1, 2]
+    assert [input_tracker.control.control for input_tracker in tracker.trackers] == [tracker.controls[0], tracker.controls[1], tracker.controls[0]]
+
+    deadline = time.time() + 20.0
+    while tracker.is_running() and time.time() < deadline:
+        time.sleep(0.01)
+    tracker.stop_tracking()
+
+    stats = tracker.stats()
+    for i, signal in enumerate(("sine_sweep", "melody", "vibrato")):
+        expected = reference_pitches(signal_hops(signal))
+
+        assert np.array_equal(tracker.trackers[i].snapshot().pitches, expected)
+        assert stats["inputs"][i]["hops"] == len(expected)
+
+    assert stats["hops"] == sum(input_stats["hops"] for input_stats in stats["inputs"])
+
+
+def test_commands_reach_their_input():
+    audio_dtype = create_audio_dtype(HOP_SIZE)
+    hops = [signal_hops("sine_sweep"), signal_hops("melody")]
+
+    audio_rings = [ResultRingBuffer(200, dtype=audio_dtype) for _ in hops]
+    analysis_results = [ResultRingBuffer(200) for _ in hops]
+
+    for audio_ring, input_hops in zip(audio_rings, hops):
+        for i, samples in enumerate(input_hops):
+            audio_ring.append(((i + 1) * HOP_SIZE / SAMPLE_RATE, False, samples))
+
+    # A gap of the first input comes out as a gap of its own
+    audio_rings[0].append(((len(hops[0]) + 1) * HOP_SIZE / SAMPLE_RATE, True, 0.0))
+
+    # Only the second input is silenced, the signals are at about -13.5 dB
+    control = queue.Queue()
+    InputControl(control, 1).put(("silence_threshold", -10.0))
+
+    finished = threading.Event()
+    finished.set()
+
+    # The worker closes the buffers it was given, so it gets its own mappings
+    detection_worker([0, 1],
+                     SAMPLE_RATE,
+                     HOP_SIZE,
+                     BUFFER_SIZE,
+                     "default",
+                     None,
+                     SILENCE_THRESHOLD,
+                     None,
+                     pickle.loads(pickle.dumps(audio_rings)),
+                     pickle.loads(pickle.dumps(analysis_results)),
+                     [[0] * len(STAT_NAMES) for _ in hops],
+                     [StageProfiler(TRACKING_STAGES) for _ in hops],
+                     control,
+                     threading.Event(),
+                     finished,
+                     threading.Event())
+
+    _, first = analysis_results[0].snapshot()
+    _, second = analysis_results[1].snapshot()
+
+    assert np.array_equal(first["pitch"][:-1], reference_pitches(hops[0]))
+    assert first["pitch"][-1] == GAP_PITCH
+    assert np.count_nonzero(reference_pitches(hops[1])) > 0
+    assert np.array_equal(second["pitch"], reference_pitches(hops[1], -10.0))
+    assert np.count_nonzero(second["pitch"]) == 0
+
+    for ring in audio_rings + analysis_results:
+        ring.close()
@@ -0,0 +1,65 @@
+import numpy as np
+
+import note_helper
+from note_histogram import NoteHistogram
+
+HIGHEST_PITCH = 1500.0
+
+
+def reference_counts(pitches):
+    # Full recount of the window
+    notes = note_helper.frequencies_to_notes(pitches)
+    bins = np.clip(notes + NoteHistogram.NOTE_OFFSET, 0, NoteHistogram.NUM_BINS - 1)
+    valid = (pitches > 0.0) & (pitches <= HIGHEST_PITCH)
+
+    return (np.bincount(bins, minlength=NoteHistogram.NUM_BINS),
+            np.bincount(bins[valid], minlength=NoteHistogram.NUM_BINS))
+
+
+def test_incremental_matches_bincount():
+    rng = np.random.default_rng(0)
+    window_len = 200
+    refresh_len = 5
+
+    raw = rng.uniform(60.0, 2000.0, 5000)
+    raw[rng.random(len(raw)) < 0.2] = 0.0
+
+    histogram = NoteHistogram(window_len, highest_pitch=HIGHEST_PITCH)
+
+    sequence = 0
+    while sequence < len(raw):
+        sequence = min(len(raw), sequence + int(rng.integers(0, 30)))
+        pitches = raw[max(0, sequence - window_len):sequence].copy()
+
+        # The samples near the ends of the window may change between updates, like filtered ones do
+        pitches[-refresh_len:] *= rng.choice([1.0, 2.0])
+
+        histogram.update(sequence, pitches, refresh_len)
+        counts, valid_counts = reference_counts(pitches)
+
+        assert np.array_equal(histogram.counts, counts)
+        assert np.array_equal(histogram.valid_counts, valid_counts)
+
+
+def test_rebuild_after_skip():
+    rng = np.random.default_rng(1)
+    raw = rng.uniform(100.0, 400.0, 1000)
+
+    histogram = NoteHistogram(100, highest_pitch=HIGHEST_PITCH)
+    histogram.update(100, raw[:100])
+
+    # More than a window skipped, and a restart
+    for sequence in (600, 50):
+        pitches = raw[max(0, sequence - 100):sequence]
+        histogram.update(sequence, pitches)
+        assert np.array_equal(histogram.counts, reference_counts(pitches)[0])
+
+
+def test_note_range():
+    histogram = NoteHistogram(100, highest_pitch=HIGHEST_PITCH)
+    pitches = np.array([220.0] * 10 + [440.0] * 10 + [330.0] + [0.0] * 10 + [3000.0] * 10)
+    histogram.update(len(pitches), pitches)
+
+    # 330 Hz occurs too rarely, unvoiced and too high pitches are not displayable
+    assert histogram.note_range(1) == (note_helper.frequency_to_note(220.0), note_helper.frequency_to_note(440.0))
+    assert histogram.note_range(20) is None
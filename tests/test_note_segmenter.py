@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+from ring_buffer import RESULT_DTYPE
+from note_helper import frequency_to_note
+from note_segmenter import NoteSegmenter, segment_notes
+
+HOP_SIZE = 256
+SAMPLE_RATE = 16000
+HOP_TIME = HOP_SIZE / SAMPLE_RATE
+
+
+def hops(pitch, duration, volume=-20.0, vibrato_rate=0.0, vibrato_depth=0.0):
+    # Analysis results of a held pitch (0 for silence), in cents of vibrato around it
+    times = np.arange(int(round(duration / HOP_TIME))) * HOP_TIME
+    results = np.zeros(len(times), dtype=RESULT_DTYPE)
+
+    if pitch > 0.0:
+        results["pitch"] = pitch * np.power(2.0, vibrato_depth * np.sin(2.0 * np.pi * vibrato_rate * times) / 1200.0)
+        results["confidence"] = 1.0
+    results["volume"] = volume if pitch > 0.0 else -80.0
+
+    return results
+
+
+def song(*parts):
+    results = np.concatenate(parts)
+    results["timestamp"] = (np.arange(len(results)) + 1) * HOP_TIME
+
+    return results
+
+
+def test_notes_gaps_and_vibrato():
+    results = song(hops(440.0, 0.5),
+                   hops(0.0, 0.2),
+                   hops(523.25, 0.6, vibrato_rate=6.0, vibrato_depth=30.0),
+                   hops(659.26, 0.3),
+                   hops(0.0, 0.1),
+                   hops(880.0, 0.02))
+
+    events = segment_notes(results, HOP_SIZE, SAMPLE_RATE)
+
+    # The last blip is too short to be a note
+    assert [event.note for event in events] == [frequency_to_note(f) for f in (440.0, 523.25, 659.26)]
+    assert [event.start for event in events] == pytest.approx([0.0, 0.7, 1.3], abs=2 * HOP_TIME)
+    assert [event.end for event in events] == pytest.approx([0.5, 1.3, 1.6], abs=2 * HOP_TIME)
+    assert [event.pitch for event in events] == pytest.approx([440.0, 523.25, 659.26], rel=3e-3)
+
+    assert events[0].vibrato_rate == 0.0
+    assert events[1].vibrato_rate == pytest.approx(6.0, rel=0.1)
+    assert events[1].vibrato_depth == pytest.approx(30.0, rel=0.1)
+
+
+def test_onset_splits_repeated_note():
+    quiet = hops(440.0, 0.3, volume=-40.0)
+    loud = hops(440.0, 0.3, volume=-20.0)
+    loud["onset"][0] = 1.0
+
+    events = segment_notes(song(quiet, loud), HOP_SIZE, SAMPLE_RATE)
+
+    assert [event.note for event in events] == [frequency_to_note(440.0)] * 2
+    assert events[1].start == pytest.approx(0.3, abs=2 * HOP_TIME)
+
+
+def test_streaming_matches_complete_analysis():
+    rng = np.random.default_rng(0)
+
+    parts = []
+    for _ in range(40):
+        pitch = 0.0 if rng.random() < 0.3 else 110.0 * 2.0 ** rng.uniform(0.0, 3.0)
+        parts.append(hops(pitch, rng.uniform(0.01, 0.4), volume=rng.uniform(-40.0, -10.0), vibrato_rate=5.0, vibrato_depth=rng.uniform(0.0, 40.0)))
+        parts[-1]["onset"][0] = rng.random() < 0.5
+    results = song(*parts)
+
+    segmenter = NoteSegmenter(HOP_SIZE, SAMPLE_RATE)
+    events = []
+    start = 0
+    while start < len(results):
+        chunk = results[start:start + int(rng.integers(1, 50))]
+        events += segmenter.update(chunk["timestamp"], chunk["pitch"], chunk["volume"], chunk["confidence"], chunk["onset"])
+        start += len(chunk)
+    events += segmenter.flush()
+
+    assert len(events) > 10
+    assert events == segment_notes(results, HOP_SIZE, SAMPLE_RATE)
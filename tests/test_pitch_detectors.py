@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+import signals
+from pitch_tracker import YinDetector, HopAnalyzer
+from benchmark import run_detection, pitch_error
+
+SAMPLE_RATE = 44100
+HOP_SIZE = 512
+BUFFER_SIZE = 2048
+SILENCE_THRESHOLD = -60.0
+
+
+@pytest.fixture(scope="module")
+def sweep():
+    # As long as in the benchmark, so that the pitch barely moves within one buffer
+    samples, frequencies = signals.sine_sweep(10.0, SAMPLE_RATE)
+    return samples, signals.hop_ground_truth(frequencies, HOP_SIZE, BUFFER_SIZE)
+
+
+def test_matches_aubio_yin(sweep):
+    pytest.importorskip("aubio")
+    samples, ground_truth = sweep
+
+    pitches, _ = run_detection(samples, SAMPLE_RATE, HOP_SIZE, BUFFER_SIZE, "numpy_yin", SILENCE_THRESHOLD, batch_size=64)
+    reference, _ = run_detection(samples, SAMPLE_RATE, HOP_SIZE, BUFFER_SIZE, "yin", SILENCE_THRESHOLD)
+
+    # Same algorithm, so the same hops are voiced and the pitches agree to a fraction of a cent.
+    # Aubio already reports pitches while its buffer is still filling up, those are skipped.
+    full = np.arange(len(pitches)) >= BUFFER_SIZE // HOP_SIZE - 1
+    assert np.array_equal(pitches[full] > 0.0, reference[full] > 0.0)
+    voiced = full & (reference > 0.0)
+    assert np.max(np.abs(1200.0 * np.log2(pitches[voiced] / reference[voiced]))) < 1.0
+
+    error = pitch_error(pitches, ground_truth)
+    assert error["voiced_recall"] > 0.95
+    assert error["gross_error_rate"] == 0.0
+    assert error["median_error_cents"] < 5.0
+
+
+@pytest.mark.filterwarnings("ignore:divide by zero")
+@pytest.mark.parametrize("signal", ["vibrato", "noise_bursts", "silence", "melody"])
+def test_batches_match_single_hops(signal):
+    samples, _ = signals.SIGNALS[signal](1.0, SAMPLE_RATE)
+
+    pitches, _ = run_detection(samples, SAMPLE_RATE, HOP_SIZE, BUFFER_SIZE, "numpy_yin", SILENCE_THRESHOLD)
+    batched, _ = run_detection(samples, SAMPLE_RATE, HOP_SIZE, BUFFER_SIZE, "numpy_yin", SILENCE_THRESHOLD, batch_size=37)
+
+    assert np.allclose(batched, pitches, rtol=0.0, atol=1e-9)
+
+
+def test_chunking_is_independent():
+    samples, _ = signals.melody(1.0, SAMPLE_RATE)
+    num_hops = len(samples) // HOP_SIZE
+    hops = samples[:num_hops * HOP_SIZE].reshape(num_hops, HOP_SIZE)
+
+    whole = YinDetector(BUFFER_SIZE, HOP_SIZE, SAMPLE_RATE, SILENCE_THRESHOLD).detect_batch(hops)
+
+    detector = YinDetector(BUFFER_SIZE, HOP_SIZE, SAMPLE_RATE, SILENCE_THRESHOLD)
+    parts = [detector.detect_batch(hops[i:i + 5]) for i in range(0, num_hops, 5)]
+
+    assert np.allclose(np.concatenate([pitches for pitches, _ in parts]), whole[0], rtol=0.0, atol=1e-9)
+    assert np.allclose(np.concatenate([confidences for _, confidences in parts]), whole[1], rtol=0.0, atol=1e-9)
+
+
+def test_analyze_batch_matches_call():
+    samples, _ = signals.vibrato(0.5, SAMPLE_RATE)
+    num_hops = len(samples) // HOP_SIZE
+    hops = samples[:num_hops * HOP_SIZE].reshape(num_hops, HOP_SIZE)
+
+    single = HopAnalyzer(SAMPLE_RATE, HOP_SIZE, BUFFER_SIZE, "numpy_yin", None, SILENCE_THRESHOLD)
+    batched = HopAnalyzer(SAMPLE_RATE, HOP_SIZE, BUFFER_SIZE, "numpy_yin", None, SILENCE_THRESHOLD)
+
+    results = np.array(batched.analyze_batch(hops))
+    expected = np.array([single(hop) for hop in hops], dtype=np.float64)
+
+    # Pitch, confidence and onset are identical, the volume of a single hop is summed in float32
+    assert np.allclose(results[:, [0, 2, 3]], expected[:, [0, 2, 3]], rtol=0.0, atol=1e-9)
+    assert np.allclose(results[:, 1], expected[:, 1], rtol=0.0, atol=1e-3)
@@ -0,0 +1,88 @@
+import time
+
+import numpy as np
+
+from audio_source import SignalSource
+from pitch_tracker import PitchTracker, GAP_PITCH
+
+SAMPLE_RATE = 44100
+DURATION = 1.0
+
+
+def run_to_end(pitch_tracker, timeout=10.0):
+    # Tracks a finite source until it is exhausted
+    pitch_tracker.start_tracking()
+
+    deadline = time.time() + timeout
+    while pitch_tracker.is_running() and time.time() < deadline:
+        time.sleep(0.01)
+
+    pitch_tracker.stop_tracking()
+
+
+def test_results_after_stop():
+    pitch_tracker = PitchTracker(sample_rate=SAMPLE_RATE,
+                                 source=SignalSource("sine_sweep", DURATION, loop=False, paced=False))
+    run_to_end(pitch_tracker)
+
+    num_hops = int(DURATION * SAMPLE_RATE) // pitch_tracker.hop_size
+
+    # The final results stay readable once the ring is closed
+    snapshot = pitch_tracker.snapshot()
+    assert snapshot.sequence == num_hops
+    assert pitch_tracker.latest_sequence() == num_hops
+    assert pitch_tracker.stats()["hops"] == num_hops
+
+    results = pitch_tracker.get_analysis_results()
+    assert len(results) == num_hops
+    assert np.array_equal([pitch for _, pitch, _, _, _ in results], snapshot.pitches)
+
+    final = pitch_tracker.get_new_results(10, final=True)
+    assert final.sequence == num_hops
+    assert np.array_equal(final.pitches, snapshot.pitches[10:])
+    assert np.count_nonzero(final.pitches > 0.0) > num_hops // 2
+
+    pitch_tracker.update()
+    assert pitch_tracker.get_new_results(final=False).sequence == num_hops - pitch_tracker.filter_window_len
+
+
+class SkippingSource(SignalSource):
+    # Loses `skipped_hops` hops of input after the first read, like an overflowing device
+    def __init__(self, skipped_hops, **kwargs):
+        super().__init__(**kwargs)
+        self.skipped_hops = skipped_hops
+
+
+    def open(self, sample_rate, hop_size, stats):
+        super().open(sample_rate, hop_size, stats)
+        self.skipped = False
+
+
+    def read_hops(self, timeout=None):
+        frame, hops = super().read_hops(timeout)
+
+        if not self.skipped:
+            self.frame_clock += self.skipped_hops * self.hop_size
+            self.skipped = True
+
+        return frame, hops
+
+
+def test_lost_input_is_a_gap():
+    pitch_tracker = PitchTracker(sample_rate=SAMPLE_RATE,
+                                 source=SkippingSource(5, signal="sine_sweep", duration=2 * DURATION, loop=False, paced=False))
+    run_to_end(pitch_tracker)
+
+    # Unpaced sources return MAX_UNPACED_HOPS hops per read
+    snapshot = pitch_tracker.snapshot()
+    first_read = SignalSource.MAX_UNPACED_HOPS
+
+    assert np.array_equal(np.flatnonzero(snapshot.pitches == GAP_PITCH), np.arange(first_read, first_read + 5))
+    assert pitch_tracker.stats()["gap_hops"] == 5
+
+    # The gap keeps the clock, the timestamps advance by one hop throughout
+    assert np.allclose(np.diff(snapshot.timestamps), pitch_tracker.hop_size / SAMPLE_RATE)
+
+    # The median filter neither smooths over the gap nor spreads it
+    assert np.all(snapshot.pitches[first_read - 5:first_read] > 0.0)
+    assert np.all(snapshot.pitches[first_read + 5:first_read + 10] > 0.0)
@@ -0,0 +1,114 @@
+import pickle
+
+import numpy as np
+import pytest
+
+from ring_buffer import ResultRingBuffer
+
+
+def record(i):
+    return (i, 100.0 + i, -20.0, 0.5, 0.0, i)
+
+
+@pytest.fixture
+def ring():
+    ring = ResultRingBuffer(10, slack=4)
+    yield ring
+    ring.close()
+
+
+def test_window_after_lapping(ring):
+    # The buffer wraps around several times, the window is always the last records in order
+    for i in range(100):
+        ring.append(record(i))
+
+        sequence, snapshot = ring.snapshot()
+        expected = np.arange(max(0, i - 9), i + 1)
+
+        assert sequence == i + 1
+        assert np.array_equal(snapshot["timestamp"], expected)
+        assert np.array_equal(ring.view()["timestamp"], expected)
+        assert len(ring) == len(expected)
+
+
+def test_read_since(ring):
+    for i in range(25):
+        ring.append(record(i))
+
+    sequence, records = ring.read_since(20)
+    assert sequence == 25
+    assert np.array_equal(records["timestamp"], np.arange(20, 25))
+
+    # A reader that fell behind by more than the window only gets the window
+    sequence, records = ring.read_since(3)
+    assert np.array_equal(records["timestamp"], np.arange(15, 25))
+
+    sequence, records = ring.read_since(25)
+    assert len(records) == 0
+
+
+class LappingRing(ResultRingBuffer):
+    # Lets the writer lap the slack area while the first copy is taken
+    laps = 1
+
+    @property
+    def sequence(self):
+        sequence = int(self.header[0])
+        self.reads = getattr(self, "reads", 0) + 1
+
+        if self.reads == 2 and self.laps > 0:
+            self.laps -= 1
+            for i in range(sequence, sequence + self.slack):
+                self.append(record(i))
+
+            return int(self.header[0])
+
+        return sequence
+
+
+def test_torn_snapshot_is_retried():
+    ring = LappingRing(10, slack=4)
+    try:
+        for i in range(30):
+            ring.append(record(i))
+
+        ring.reads = 0
+        sequence, snapshot = ring.snapshot()
+
+        # The copy taken while the writer lapped it was thrown away
+        assert sequence == 34
+        assert np.array_equal(snapshot["timestamp"], np.arange(24, 34))
+        assert ring.reads > 2
+    finally:
+        ring.close()
+
+
+def test_attach_by_name(ring):
+    for i in range(12):
+        ring.append(record(i))
+
+    # Other processes get the name of the segment and map the same memory
+    reader = pickle.loads(pickle.dumps(ring))
+    try:
+        assert np.array_equal(reader.snapshot()[1], ring.snapshot()[1])
+
+        ring.append(record(12))
+        assert reader.sequence == 13
+        assert reader.view()["timestamp"][-1] == 12
+    finally:
+        reader.close()
+
+
+def test_custom_dtype():
+    dtype = np.dtype([("value", np.int32), ("samples", np.float32, (4,))])
+    ring = ResultRingBuffer(3, slack=2, dtype=dtype)
+    try:
+        for i in range(7):
+            ring.append((i, np.full(4, i, dtype=np.float32)))
+
+        _, snapshot = ring.snapshot()
+        assert snapshot.dtype == dtype
+        assert np.array_equal(snapshot["value"], [4, 5, 6])
+        assert np.array_equal(snapshot["samples"][:, 0], [4, 5, 6])
+    finally:
+        ring.close()
@@ -0,0 +1,150 @@
+import time
+import pickle
+import threading
+
+import numpy as np
+import pytest
+
+from ring_buffer import RESULT_DTYPE, ResultRingBuffer
+from session_recording import SessionWriter, SessionReader, replay_process
+from pitch_tracker import PitchTracker
+
+SAMPLE_RATE = 44100
+HOP_SIZE = 512
+BUFFER_SIZE = 2048
+HOPS_PER_CHUNK = 64
+HOP_TIME = HOP_SIZE / SAMPLE_RATE
+
+
+def make_session(num_hops, seed=0):
+    # Audio and results of a session with jittered timestamps and a jump like after a device switch
+    rng = np.random.default_rng(seed)
+
+    audio = rng.uniform(-1.0, 1.0, (num_hops, HOP_SIZE)).astype(np.float32)
+
+    records = np.zeros(num_hops, dtype=RESULT_DTYPE)
+    records["timestamp"] = 1000.0 + np.cumsum(HOP_TIME * rng.uniform(0.9, 1.1, num_hops))
+    records["timestamp"][num_hops // 2:] += 0.5
+    records["pitch"] = rng.uniform(-1.0, 500.0, num_hops)
+    records["volume"] = rng.uniform(-60.0, 0.0, num_hops)
+    records["published"] = records["timestamp"] + 0.001
+
+    return audio, records
+
+
+def write_session(path, audio, records, rng=None):
+    writer = SessionWriter(str(path), SAMPLE_RATE, HOP_SIZE, BUFFER_SIZE, HOPS_PER_CHUNK)
+
+    # Appended in batches of any size, like the tracking process does
+    rng = rng if rng is not None else np.random.default_rng(1)
+    start = 0
+    while start < len(records):
+        end = min(len(records), start + int(rng.integers(1, 100)))
+        writer.append(audio[start:end], [tuple(record) for record in records[start:end]])
+        start = end
+
+    writer.close()
+
+
+@pytest.mark.parametrize("num_hops", [1, HOPS_PER_CHUNK, 5 * HOPS_PER_CHUNK + 17])
+def test_round_trip(tmp_path, num_hops):
+    audio, records = make_session(num_hops)
+    write_session(tmp_path / "session.rec", audio, records)
+
+    reader = SessionReader(str(tmp_path / "session.rec"))
+
+    assert (reader.sample_rate, reader.hop_size, reader.buffer_size) == (SAMPLE_RATE, HOP_SIZE, BUFFER_SIZE)
+    assert len(reader) == num_hops
+    assert np.array_equal(reader.results(0, num_hops), records)
+    assert np.array_equal(reader.audio(0, num_hops), audio.ravel())
+
+    # Ranges across chunk boundaries, clipped to the recording
+    assert np.array_equal(reader.results(-10, 70), records[:70])
+    assert np.array_equal(reader.results(num_hops - 3, num_hops + 10), records[num_hops - 3:])
+    assert np.array_equal(reader.audio(60, 70), audio[60:70].ravel())
+    assert len(reader.results(5, 5)) == 0
+
+
+def test_find(tmp_path):
+    audio, records = make_session(5 * HOPS_PER_CHUNK + 17)
+    write_session(tmp_path / "session.rec", audio, records)
+
+    reader = SessionReader(str(tmp_path / "session.rec"))
+    timestamps = records["timestamp"]
+
+    queries = np.concatenate((timestamps, timestamps - 1e-6, timestamps + 1e-6, [timestamps[0] - 10.0, timestamps[-1] + 10.0],
+                              np.random.default_rng(2).uniform(timestamps[0] - 1.0, timestamps[-1] + 1.0, 500)))
+    for timestamp in queries:
+        assert reader.find(timestamp) == np.searchsorted(timestamps, timestamp, side="left")
+
+
+def test_empty_recording(tmp_path):
+    path = tmp_path / "empty.rec"
+    SessionWriter(str(path), SAMPLE_RATE, HOP_SIZE, BUFFER_SIZE, HOPS_PER_CHUNK).close()
+
+    reader = SessionReader(str(path))
+    assert len(reader) == 0
+    assert reader.find(1000.0) == 0
+    assert len(reader.results(0, 10)) == 0
+
+    # main rejects it before anything is started
+    import main
+    with pytest.raises(SystemExit):
+        main.main(["main", "--replay", str(path)])
+
+    (tmp_path / "other.rec").write_bytes(b"not a recording")
+    with pytest.raises(ValueError):
+        SessionReader(str(tmp_path / "other.rec"))
+
+
+def test_replay_pacing(tmp_path):
+    audio, records = make_session(200)
+    write_session(tmp_path / "session.rec", audio, records)
+
+    ring = ResultRingBuffer(300)
+    stop = threading.Event()
+    data_ready = threading.Event()
+
+    # The replay closes its ring when it is done, so it gets its own mapping of the buffer
+    speed = 4.0
+    start = time.monotonic()
+    replay = threading.Thread(target=replay_process, args=(str(tmp_path / "session.rec"), speed, None, pickle.loads(pickle.dumps(ring)), stop, data_ready))
+    replay.start()
+
+    time.sleep(0.2)
+    sequence = ring.sequence
+    replay.join(timeout=10.0)
+    duration = time.monotonic() - start
+
+    # Hops are published as they become due, not all at once
+    due = 0.2 / (HOP_TIME / speed)
+    assert 0.5 * due < sequence < 1.5 * due
+
+    expected = 200 * HOP_TIME / speed
+    assert expected <= duration < expected + 1.0
+
+    _, replayed = ring.snapshot()
+    assert np.array_equal(replayed, records)
+    ring.close()
+
+
+def test_replay_start_and_speed(tmp_path):
+    audio, records = make_session(200)
+    write_session(tmp_path / "session.rec", audio, records)
+
+    # Replaying from a point in the recording fills the window with what precedes it right away
+    ring = ResultRingBuffer(50)
+    stop = threading.Event()
+    stop.set()
+    replay_process(str(tmp_path / "session.rec"), 1.0, records["timestamp"][120], pickle.loads(pickle.dumps(ring)), stop, threading.Event())
+
+    sequence, replayed = ring.snapshot()
+    assert sequence == 50
+    assert np.array_equal(replayed, records[70:120])
+    ring.close()
+
+    # The speed is checked before the recording is opened
+    pitch_tracker = PitchTracker()
+    for speed in (0.0, -1.0, float("inf")):
+        with pytest.raises(ValueError):
+            pitch_tracker.start_replay(str(tmp_path / "missing.rec"), speed)